@@ -0,0 +1,167 @@
+"""
+Concurrent checkouts of one product against a development database
+(POSTGRES_* settings). A product with enough stock is created, then every
+thread sells it in a loop through SalesService on its own connection.
+Reports throughput, latency percentiles and how many checkouts were
+refused with a 503 (stock row locked past STOCK_LOCK_TIMEOUT).
+
+    python benchmarks/checkout_benchmark.py [--threads 50] [--sales 20] [--hold 0]
+
+--hold N keeps the product row locked from another connection for the
+first N seconds, so checkouts run into the lock timeout.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException  # noqa: E402
+
+from config.database import connect_postgres  # noqa: E402
+from models.sales import CreateSaleRequest  # noqa: E402
+from repositories.product_repositories import ProductRepository  # noqa: E402
+from repositories.sales_repositories import SalesRepository  # noqa: E402
+from services.pricing_service import PricingService  # noqa: E402
+from services.sales_service import SalesService  # noqa: E402
+
+PRICE = 1.0
+
+
+def create_product(stock: int) -> int:
+    """A throwaway product in store 1; its sales are left in place"""
+    conn = connect_postgres()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO products (name, price, stock, store_id) "
+                "VALUES (%s, %s, %s, 1) RETURNING id",
+                (f"benchmark-{uuid.uuid4().hex[:8]}", PRICE, stock),
+            )
+            product_id = cursor.fetchone()[0]
+        conn.commit()
+        return product_id
+    finally:
+        conn.close()
+
+
+def find_user() -> dict:
+    conn = connect_postgres()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM users WHERE store_id = 1 ORDER BY id LIMIT 1")
+            row = cursor.fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        sys.exit("Register a user in store 1 first")
+    return {"id": row[0], "store_id": 1}
+
+
+def hold_lock(product_id: int, seconds: float, ready: threading.Event):
+    conn = connect_postgres()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM products WHERE id = %s FOR UPDATE", (product_id,))
+            ready.set()
+            time.sleep(seconds)
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def run_checkouts(product_ids: list, user: dict, threads: int, sales: int, group_commit: bool):
+    """
+    `threads` workers each submitting `sales` one-line checkouts; worker i
+    sells product_ids[i % len(product_ids)].
+    :return: (elapsed seconds, latencies in seconds, {status code: count})
+    """
+    carts = [
+        CreateSaleRequest(
+            items=[{"product_id": product_id, "quantity": 1, "price": PRICE}],
+            total=PRICE,
+            payment_method="cash",
+        )
+        for product_id in product_ids
+    ]
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    start_gate = threading.Barrier(threads + 1)
+
+    def worker(sale):
+        conn = connect_postgres()
+        service = SalesService(
+            SalesRepository(conn),
+            PricingService(ProductRepository(conn)),
+            group_commit=group_commit,
+        )
+        try:
+            start_gate.wait()
+            for _ in range(sales):
+                started = time.perf_counter()
+                try:
+                    service.create_sale(sale, user)
+                    status = 200
+                except HTTPException as e:
+                    status = e.status_code
+                except Exception as e:
+                    status = type(e).__name__
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            conn.close()
+
+    workers = [
+        threading.Thread(target=worker, args=(carts[i % len(carts)],)) for i in range(threads)
+    ]
+    for thread in workers:
+        thread.start()
+    start_gate.wait()
+    started = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - started, latencies, statuses
+
+
+def report(label: str, elapsed: float, latencies: list, statuses: dict):
+    latencies = sorted(latencies)
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+
+    print(
+        f"{label}: {len(latencies)} checkouts in {elapsed:.2f}s "
+        f"({len(latencies) / elapsed:,.0f}/s), p50 {pct(50):.1f} ms, "
+        f"p95 {pct(95):.1f} ms, p99 {pct(99):.1f} ms, statuses {statuses}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=50)
+    parser.add_argument("--sales", type=int, default=20, help="checkouts per thread")
+    parser.add_argument("--hold", type=float, default=0, help="seconds to hold the row lock")
+    args = parser.parse_args()
+
+    user = find_user()
+    product_id = create_product(args.threads * args.sales)
+    if args.hold:
+        ready = threading.Event()
+        threading.Thread(
+            target=hold_lock, args=(product_id, args.hold, ready), daemon=True
+        ).start()
+        ready.wait()
+    elapsed, latencies, statuses = run_checkouts(
+        [product_id], user, args.threads, args.sales, group_commit=False
+    )
+    report(f"{args.threads} threads, one product", elapsed, latencies, statuses)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Checkout throughput with SALES_GROUP_COMMIT off and on, against a
+development database (POSTGRES_* settings). N threads call
+SalesService.create_sale in a loop, each on its own product (--shared
+makes them all sell the same one), first one commit per sale, then
+through the group committer.
+
+    python benchmarks/group_commit_benchmark.py [--threads 32] [--sales 50] [--shared]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.checkout_benchmark import (  # noqa: E402
+    create_product,
+    find_user,
+    report,
+    run_checkouts,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--sales", type=int, default=50, help="checkouts per thread")
+    parser.add_argument("--shared", action="store_true", help="all threads sell one product")
+    args = parser.parse_args()
+
+    user = find_user()
+    for group_commit in (False, True):
+        if args.shared:
+            product_ids = [create_product(args.threads * args.sales)]
+        else:
+            product_ids = [create_product(args.sales) for _ in range(args.threads)]
+        elapsed, latencies, statuses = run_checkouts(
+            product_ids, user, args.threads, args.sales, group_commit
+        )
+        report(
+            f"group commit {'on' if group_commit else 'off'}, {args.threads} threads",
+            elapsed,
+            latencies,
+            statuses,
+        )
+
+
+if __name__ == "__main__":
+    main()
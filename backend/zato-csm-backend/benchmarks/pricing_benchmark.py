@@ -0,0 +1,63 @@
+"""
+Prices a 100-line cart with PricingService, no database needed.
+
+    python benchmarks/pricing_benchmark.py [--lines 100] [--runs 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.pricing_service import PricingService  # noqa: E402
+
+
+class _Catalog:
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def find_pricing(self, product_ids):
+        return {pid: self.catalog[pid] for pid in product_ids}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    catalog = {
+        pid: {
+            "price": Decimal(rng.randint(50, 50_000)) / 100,
+            "iva_rate": Decimal(rng.choice((0, 12, 15))),
+        }
+        for pid in range(1, args.lines + 1)
+    }
+    items = [
+        {
+            "product_id": pid,
+            "quantity": rng.randint(1, 5),
+            "price": float(catalog[pid]["price"]),
+            "discount": rng.choice((0, 0, 0.5)),
+        }
+        for pid in catalog
+    ]
+    pricing = PricingService(_Catalog(catalog))
+    loaded = pricing.load_catalog(catalog)
+
+    seconds = min(
+        timeit.repeat(lambda: pricing.price_items(items, loaded), number=args.runs, repeat=5)
+    )
+    per_cart = seconds / args.runs
+    print(
+        f"{args.lines}-line cart: {per_cart * 1e6:.1f} us per cart "
+        f"({per_cart / args.lines * 1e6:.2f} us per line, {1 / per_cart:,.0f} carts/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
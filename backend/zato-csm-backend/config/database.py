@@ -1,5 +1,6 @@
 import contextlib
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
 import os
 from dotenv import load_dotenv
@@ -13,6 +14,8 @@ POSTGRES_CONFIG = {
     "password": os.getenv("POSTGRES_PASSWORD"),
     "database": os.getenv("POSTGRES_DATABASE", "zatobox_csm_db"),
     "port": int(os.getenv("POSTGRES_PORT", "5432")),
+    # Sessions work in UTC; timestamps are converted to the caller's zone in the API
+    "options": "-c timezone=UTC",
 }
 
 
@@ -30,3 +33,18 @@ def get_db_connection():
         yield conn
     finally:
         conn.close()
+
+
+def use_store_schema(conn, schema_name=None):
+    """
+    Resolve unqualified table names in a store's dedicated schema (shared
+    tables such as users and stores still come from public). None goes back
+    to the shared schema. Committed at once: a later rollback would undo it.
+    """
+    path = "public"
+    if schema_name:
+        path = f"{psycopg2.extensions.quote_ident(schema_name, conn)}, public"
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT set_config('search_path', %s, false)", (path,))
+    conn.commit()
+    return conn
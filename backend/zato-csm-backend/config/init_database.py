@@ -1,8 +1,24 @@
+from psycopg2 import sql
+
 from config.database import connect_postgres
+from config.settings import LEGACY_TIMESTAMP_TIMEZONE
 
 
-def create_tables_sql():
+def create_shared_tables_sql():
+    """Tables shared by every store; they always live in the public schema"""
     return """
+    CREATE TABLE IF NOT EXISTS stores (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        schema_name VARCHAR(63) UNIQUE
+            CHECK (schema_name ~ '^[a-z_][a-z0-9_]*$' AND schema_name <> 'public'),
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+    );
+
+    INSERT INTO stores (id, name) VALUES (1, 'Principal') ON CONFLICT (id) DO NOTHING;
+
+    SELECT setval(pg_get_serial_sequence('stores', 'id'), (SELECT MAX(id) FROM stores));
+
     CREATE TABLE IF NOT EXISTS users (
         id SERIAL PRIMARY KEY,
         email VARCHAR(255) NOT NULL UNIQUE,
@@ -11,10 +27,50 @@ def create_tables_sql():
         phone VARCHAR(30),
         address VARCHAR(255),
         role VARCHAR(20) DEFAULT 'user',
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        last_updated TIMESTAMP DEFAULT NOW()
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+        last_updated TIMESTAMPTZ DEFAULT NOW()
     );
-    
+
+    ALTER TABLE users ADD COLUMN IF NOT EXISTS store_id INT NOT NULL DEFAULT 1
+        REFERENCES stores(id);
+
+    CREATE INDEX IF NOT EXISTS idx_users_store_id
+        ON users (store_id, id);
+
+    CREATE TABLE IF NOT EXISTS catalog_import_jobs (
+        id VARCHAR(32) PRIMARY KEY,
+        store_id INT NOT NULL REFERENCES stores(id),
+        schema_name VARCHAR(63),
+        status VARCHAR(20) NOT NULL DEFAULT 'queued',
+        format VARCHAR(10) NOT NULL,
+        processed INT NOT NULL DEFAULT 0,
+        valid INT NOT NULL DEFAULT 0,
+        errors INT NOT NULL DEFAULT 0,
+        inserted INT NOT NULL DEFAULT 0,
+        updated INT NOT NULL DEFAULT 0,
+        detail TEXT,
+        source_path TEXT NOT NULL,
+        error_path TEXT NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        finished_at TIMESTAMPTZ
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_catalog_import_jobs_store_created_at
+        ON catalog_import_jobs (store_id, created_at)
+    """
+
+
+def create_tables_sql():
+    """
+    Store-owned tables. Run once for the public schema (stores sharing it
+    are told apart by store_id) and once per dedicated store schema.
+    """
+    return """
+    CREATE TABLE IF NOT EXISTS schema_migrations(
+        name VARCHAR(100) PRIMARY KEY,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+
     CREATE TABLE IF NOT EXISTS products (
         id SERIAL PRIMARY KEY,
         name VARCHAR(255) NOT NULL,
@@ -23,9 +79,12 @@ def create_tables_sql():
         stock INT NOT NULL,
         category VARCHAR(100),
         images TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        last_updated TIMESTAMP DEFAULT NOW()
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+        last_updated TIMESTAMPTZ DEFAULT NOW()
     );
+
+    ALTER TABLE products ADD COLUMN IF NOT EXISTS store_id INT NOT NULL DEFAULT 1
+        REFERENCES stores(id);
         
     CREATE TABLE IF NOT EXISTS inventory(
         id SERIAL PRIMARY KEY,
@@ -33,9 +92,11 @@ def create_tables_sql():
         product_name VARCHAR(255),
         quantity INT NOT NULL,
         min_stock INT DEFAULT 0,
-        last_updated TIMESTAMP DEFAULT NOW(),
+        last_updated TIMESTAMPTZ DEFAULT NOW(),
         FOREIGN KEY (product_id) REFERENCES products(id)
     );
+
+    ALTER TABLE inventory ADD COLUMN IF NOT EXISTS store_id INT NOT NULL DEFAULT 1;
     
     CREATE TABLE IF NOT EXISTS sales(
         id SERIAL PRIMARY KEY,
@@ -44,12 +105,555 @@ def create_tables_sql():
         payment_method VARCHAR(50),
         user_id INT,
         status VARCHAR(20) DEFAULT 'completed',
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY (user_id) REFERENCES users(id)
     );
+
+    ALTER TABLE sales ADD COLUMN IF NOT EXISTS store_id INT NOT NULL DEFAULT 1
+        REFERENCES stores(id);
+
+    CREATE TABLE IF NOT EXISTS sale_items(
+        sale_id INT NOT NULL,
+        line_no INT NOT NULL,
+        product_id INT NOT NULL,
+        quantity INT NOT NULL,
+        price DECIMAL(10,2) NOT NULL,
+        PRIMARY KEY (sale_id, line_no)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_sale_items_product_id
+        ON sale_items (product_id, sale_id);
+
+    ALTER TABLE sales ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(100);
+
+    CREATE TABLE IF NOT EXISTS sale_idempotency_keys(
+        store_id INT NOT NULL DEFAULT 1,
+        idempotency_key VARCHAR(100) NOT NULL,
+        sale_id INT NOT NULL,
+        PRIMARY KEY (store_id, idempotency_key)
+    );
+
+    ALTER TABLE sale_idempotency_keys ADD COLUMN IF NOT EXISTS store_id INT NOT NULL DEFAULT 1;
+
+    DROP INDEX IF EXISTS idx_sales_idempotency_key;
+
+    ALTER TABLE sales ADD COLUMN IF NOT EXISTS recorded_at TIMESTAMPTZ;
+
+    ALTER TABLE sales ALTER COLUMN recorded_at SET DEFAULT clock_timestamp();
+
+    CREATE INDEX IF NOT EXISTS idx_sales_recorded_at
+        ON sales (recorded_at);
+
+    ALTER TABLE products ADD COLUMN IF NOT EXISTS iva_rate DECIMAL(5,2) NOT NULL DEFAULT 15;
+
+    ALTER TABLE sale_items
+        ADD COLUMN IF NOT EXISTS discount DECIMAL(10,2) NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS iva_rate DECIMAL(5,2),
+        ADD COLUMN IF NOT EXISTS iva_amount DECIMAL(12,2),
+        ADD COLUMN IF NOT EXISTS line_total DECIMAL(12,2);
+
+    ALTER TABLE sales
+        ADD COLUMN IF NOT EXISTS subtotal DECIMAL(12,2),
+        ADD COLUMN IF NOT EXISTS discount_total DECIMAL(12,2),
+        ADD COLUMN IF NOT EXISTS iva_total DECIMAL(12,2);
+
+    DROP INDEX IF EXISTS idx_sales_created_at_id;
+
+    DROP INDEX IF EXISTS idx_sales_status_created_at;
+
+    DROP INDEX IF EXISTS idx_sales_payment_method_created_at;
+
+    CREATE INDEX IF NOT EXISTS idx_sales_store_created_at
+        ON sales (store_id, created_at, id);
+
+    CREATE INDEX IF NOT EXISTS idx_sales_store_status_created_at
+        ON sales (store_id, status, created_at, id);
+
+    CREATE INDEX IF NOT EXISTS idx_sales_store_payment_method_created_at
+        ON sales (store_id, payment_method, created_at, id);
+
+    DROP INDEX IF EXISTS idx_sales_user_id_created_at;
+
+    CREATE INDEX IF NOT EXISTS idx_sales_store_user_created_at
+        ON sales (store_id, user_id, created_at, id);
+
+    CREATE TABLE IF NOT EXISTS sales_daily_rollup(
+        store_id INT NOT NULL DEFAULT 1,
+        day DATE NOT NULL,
+        payment_method VARCHAR(50) NOT NULL,
+        user_id INT NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        sales_count INT NOT NULL DEFAULT 0,
+        items_count INT NOT NULL DEFAULT 0,
+        total DECIMAL(14,2) NOT NULL DEFAULT 0
+    );
+
+    ALTER TABLE sales_daily_rollup ADD COLUMN IF NOT EXISTS store_id INT NOT NULL DEFAULT 1;
+
+    -- Rollups from before stores were keyed without store_id
+    ALTER TABLE sales_daily_rollup DROP CONSTRAINT IF EXISTS sales_daily_rollup_pkey;
+
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_sales_daily_rollup_store
+        ON sales_daily_rollup (store_id, day, payment_method, user_id, status);
+
+    CREATE TABLE IF NOT EXISTS product_tombstones(
+        product_id INT PRIMARY KEY,
+        deleted_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+
+    ALTER TABLE product_tombstones ADD COLUMN IF NOT EXISTS store_id INT NOT NULL DEFAULT 1;
+
+    DROP INDEX IF EXISTS idx_products_last_updated_id;
+
+    DROP INDEX IF EXISTS idx_products_stock;
+
+    DROP INDEX IF EXISTS idx_product_tombstones_deleted_at;
+
+    DROP INDEX IF EXISTS idx_inventory_low_stock;
+
+    CREATE INDEX IF NOT EXISTS idx_products_store_id
+        ON products (store_id, id);
+
+    CREATE INDEX IF NOT EXISTS idx_products_store_last_updated
+        ON products (store_id, last_updated, id);
+
+    CREATE INDEX IF NOT EXISTS idx_products_store_category
+        ON products (store_id, category);
+
+    CREATE INDEX IF NOT EXISTS idx_products_store_stock
+        ON products (store_id, stock);
+
+    CREATE INDEX IF NOT EXISTS idx_product_tombstones_store_deleted_at
+        ON product_tombstones (store_id, deleted_at, product_id);
+
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_inventory_product_id
+        ON inventory (product_id);
+
+    CREATE INDEX IF NOT EXISTS idx_inventory_store_low_stock
+        ON inventory (store_id, product_id) WHERE quantity <= min_stock;
+
+    ALTER TABLE inventory
+        DROP CONSTRAINT IF EXISTS inventory_product_id_fkey,
+        ADD CONSTRAINT inventory_product_id_fkey
+            FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE;
+
+    CREATE TABLE IF NOT EXISTS stock_movements(
+        id BIGSERIAL PRIMARY KEY,
+        product_id INT NOT NULL,
+        kind VARCHAR(20) NOT NULL,
+        quantity INT NOT NULL,
+        reference VARCHAR(100),
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+
+    ALTER TABLE stock_movements ADD COLUMN IF NOT EXISTS store_id INT NOT NULL DEFAULT 1;
+
+    CREATE INDEX IF NOT EXISTS idx_stock_movements_product_id
+        ON stock_movements (product_id, id);
+
+    CREATE INDEX IF NOT EXISTS idx_stock_movements_created_at
+        ON stock_movements (created_at);
+
+    CREATE INDEX IF NOT EXISTS idx_stock_movements_product_created_at
+        ON stock_movements (product_id, created_at);
+
+    DROP INDEX IF EXISTS idx_stock_movements_sales;
+
+    DROP INDEX IF EXISTS idx_stock_movements_store_sales;
+
+    CREATE INDEX IF NOT EXISTS idx_stock_movements_store_sales_created_at
+        ON stock_movements (store_id, created_at) WHERE kind = 'sale';
+
+    CREATE TABLE IF NOT EXISTS stock_snapshots(
+        product_id INT NOT NULL,
+        last_movement_id BIGINT NOT NULL,
+        stock INT NOT NULL,
+        taken_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+        covered_until TIMESTAMPTZ NOT NULL,
+        PRIMARY KEY (product_id, last_movement_id)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_stock_snapshots_covered_until
+        ON stock_snapshots (product_id, covered_until);
+
+    CREATE TABLE IF NOT EXISTS stocktakes(
+        id SERIAL PRIMARY KEY,
+        store_id INT NOT NULL DEFAULT 1,
+        user_id INT,
+        items_counted INT NOT NULL,
+        items_adjusted INT NOT NULL,
+        total_variance INT NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    );
+
+    CREATE TABLE IF NOT EXISTS stocktake_items(
+        stocktake_id INT NOT NULL,
+        product_id INT NOT NULL,
+        expected INT NOT NULL,
+        counted INT NOT NULL,
+        variance INT NOT NULL,
+        PRIMARY KEY (stocktake_id, product_id),
+        FOREIGN KEY (stocktake_id) REFERENCES stocktakes(id) ON DELETE CASCADE
+    );
+
+    ALTER TABLE stocktakes ADD COLUMN IF NOT EXISTS store_id INT NOT NULL DEFAULT 1;
+
+    CREATE INDEX IF NOT EXISTS idx_stocktakes_store_created_at
+        ON stocktakes (store_id, created_at, id);
+
+    DROP MATERIALIZED VIEW IF EXISTS inventory_valuation;
+
+    CREATE MATERIALIZED VIEW IF NOT EXISTS store_inventory_valuation AS
+        SELECT
+            store_id,
+            COALESCE(category, '') AS category,
+            GROUPING(COALESCE(category, '')) = 1 AS is_total,
+            COUNT(*) AS products,
+            COALESCE(SUM(stock), 0) AS units,
+            COALESCE(SUM(stock * price), 0) AS stock_value,
+            NOW() AS refreshed_at
+        FROM products
+        GROUP BY store_id, ROLLUP (COALESCE(category, ''));
+
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_store_inventory_valuation_key
+        ON store_inventory_valuation (store_id, is_total, category);
     """
 
 
+def data_migrations_sql():
+    """
+    One-time data migrations as (name, statement), run after
+    create_tables_sql(). Each is recorded in the schema's schema_migrations
+    table once applied, so later starts skip it instead of scanning sales
+    and products again. Append new ones at the end; never rename one.
+    """
+    return [
+        # Sale lines used to be a JSON array in sales.items
+        (
+            "sale_items_from_json",
+            """
+            WITH moved AS (
+                INSERT INTO sale_items (sale_id, line_no, product_id, quantity, price)
+                SELECT s.id, e.line_no, (e.item->>'product_id')::int,
+                       (e.item->>'quantity')::int, (e.item->>'price')::numeric
+                FROM sales s,
+                     json_array_elements(s.items::json) WITH ORDINALITY AS e(item, line_no)
+                WHERE s.items LIKE '[%'
+                ON CONFLICT DO NOTHING
+                RETURNING sale_id
+            )
+            UPDATE sales SET items = NULL WHERE id IN (SELECT sale_id FROM moved)
+            """,
+        ),
+        # Products created before the inventory sync trigger
+        (
+            "inventory_backfill",
+            """
+            INSERT INTO inventory (product_id, product_name, quantity, store_id)
+                SELECT id, name, stock, store_id FROM products
+                ON CONFLICT (product_id) DO NOTHING
+            """,
+        ),
+        # Ledger starting point for products that predate stock_movements
+        (
+            "stock_movements_opening",
+            """
+            INSERT INTO stock_movements (product_id, kind, quantity, store_id)
+                SELECT p.id, 'opening', p.stock, p.store_id FROM products p
+                WHERE NOT EXISTS (SELECT 1 FROM stock_movements m WHERE m.product_id = p.id)
+                  AND NOT EXISTS (SELECT 1 FROM stock_snapshots s WHERE s.product_id = p.id)
+            """,
+        ),
+        (
+            "sales_daily_rollup_backfill",
+            """
+            INSERT INTO sales_daily_rollup (store_id, day, payment_method, user_id,
+                                            status, sales_count, items_count, total)
+            SELECT s.store_id, s.created_at::date, COALESCE(s.payment_method, ''),
+                   COALESCE(s.user_id, 0), COALESCE(s.status, 'completed'), COUNT(*),
+                   COALESCE(SUM((SELECT SUM(i.quantity) FROM sale_items i
+                                 WHERE i.sale_id = s.id)), 0),
+                   SUM(s.total)
+            FROM sales s
+            WHERE NOT EXISTS (SELECT 1 FROM sales_daily_rollup)
+            GROUP BY 1, 2, 3, 4, 5
+            """,
+        ),
+        # Keys claimed before sale_idempotency_keys existed lived on sales
+        (
+            "sale_idempotency_keys_backfill",
+            """
+            INSERT INTO sale_idempotency_keys (store_id, idempotency_key, sale_id)
+                SELECT store_id, idempotency_key, id FROM sales
+                WHERE idempotency_key IS NOT NULL
+                ON CONFLICT DO NOTHING
+            """,
+        ),
+    ]
+
+
+def create_functions_sql():
+    """
+    Statements with function bodies. They contain ';' so they are executed
+    one by one instead of being split like create_tables_sql().
+    """
+    return [
+        # inventory.quantity mirrors products.stock so "quantity <= min_stock"
+        # can be answered from a partial index on a single table
+        """
+        CREATE OR REPLACE FUNCTION sync_inventory_from_product() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO inventory (product_id, product_name, quantity, last_updated, store_id)
+            VALUES (NEW.id, NEW.name, NEW.stock, NOW(), NEW.store_id)
+            ON CONFLICT (product_id) DO UPDATE
+                SET quantity = EXCLUDED.quantity,
+                    product_name = EXCLUDED.product_name,
+                    last_updated = EXCLUDED.last_updated;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS trg_products_sync_inventory ON products",
+        """
+        CREATE TRIGGER trg_products_sync_inventory
+            AFTER INSERT OR UPDATE OF stock, name ON products
+            FOR EACH ROW EXECUTE FUNCTION sync_inventory_from_product()
+        """,
+        # Every stock change lands in the append-only ledger. Writers tag the
+        # reason with set_config('zatobox.movement_kind'/'zatobox.movement_ref')
+        """
+        CREATE OR REPLACE FUNCTION record_stock_movement() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO stock_movements (product_id, kind, quantity, reference, store_id)
+            VALUES (
+                NEW.id,
+                COALESCE(
+                    NULLIF(current_setting('zatobox.movement_kind', true), ''),
+                    CASE WHEN TG_OP = 'INSERT' THEN 'opening' ELSE 'adjustment' END
+                ),
+                NEW.stock - CASE WHEN TG_OP = 'INSERT' THEN 0 ELSE OLD.stock END,
+                NULLIF(current_setting('zatobox.movement_ref', true), ''),
+                NEW.store_id
+            );
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS trg_products_stock_ledger_insert ON products",
+        """
+        CREATE TRIGGER trg_products_stock_ledger_insert
+            AFTER INSERT ON products
+            FOR EACH ROW EXECUTE FUNCTION record_stock_movement()
+        """,
+        "DROP TRIGGER IF EXISTS trg_products_stock_ledger_update ON products",
+        """
+        CREATE TRIGGER trg_products_stock_ledger_update
+            AFTER UPDATE OF stock ON products
+            FOR EACH ROW WHEN (OLD.stock IS DISTINCT FROM NEW.stock)
+            EXECUTE FUNCTION record_stock_movement()
+        """,
+        # One sales partition per month, named sales_YYYY_MM, in the schema
+        # being set up; months that already have a partition are skipped.
+        # Rows of the month already sitting in sales_default (e.g. sales
+        # dated ahead by a terminal) are moved into the new partition, which
+        # could not be attached over them otherwise. A month that still fails
+        # is reported and skipped so the following ones are created.
+        """
+        CREATE OR REPLACE FUNCTION create_sales_partitions(from_month DATE, months INT)
+        RETURNS INT AS $$
+        DECLARE
+            month_start DATE;
+            lower_bound TIMESTAMPTZ;
+            upper_bound TIMESTAMPTZ;
+            partition_name TEXT;
+            default_name TEXT := format('%I.sales_default', current_schema());
+            moved BOOLEAN;
+            created INT := 0;
+        BEGIN
+            FOR i IN 0..months - 1 LOOP
+                month_start := (date_trunc('month', from_month::timestamp)
+                    + make_interval(months => i))::date;
+                partition_name := 'sales_' || to_char(month_start, 'YYYY_MM');
+                CONTINUE WHEN to_regclass(format('%I.%I', current_schema(), partition_name))
+                    IS NOT NULL;
+                -- Bounds are UTC month starts, whatever the session zone
+                lower_bound := month_start::timestamp AT TIME ZONE 'UTC';
+                upper_bound := (month_start + interval '1 month') AT TIME ZONE 'UTC';
+                BEGIN
+                    moved := FALSE;
+                    IF to_regclass(default_name) IS NOT NULL THEN
+                        -- Attaching locks sales_default anyway; taking it first
+                        -- keeps new rows for the month from slipping in meanwhile
+                        EXECUTE format('LOCK TABLE %s IN ACCESS EXCLUSIVE MODE', default_name);
+                        EXECUTE format(
+                            'CREATE TEMP TABLE sales_partition_rows ON COMMIT DROP AS '
+                            'WITH moved AS (DELETE FROM %s WHERE created_at >= %L '
+                            'AND created_at < %L RETURNING *) SELECT * FROM moved',
+                            default_name, lower_bound, upper_bound
+                        );
+                        moved := TRUE;
+                    END IF;
+                    EXECUTE format(
+                        'CREATE TABLE %I.%I PARTITION OF sales FOR VALUES FROM (%L) TO (%L)',
+                        current_schema(), partition_name, lower_bound, upper_bound
+                    );
+                    IF moved THEN
+                        EXECUTE format(
+                            'INSERT INTO %I.%I SELECT * FROM sales_partition_rows',
+                            current_schema(), partition_name
+                        );
+                        DROP TABLE sales_partition_rows;
+                    END IF;
+                    created := created + 1;
+                EXCEPTION WHEN OTHERS THEN
+                    RAISE WARNING 'Could not create sales partition %: %',
+                        partition_name, SQLERRM;
+                END;
+            END LOOP;
+            RETURN created;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        # Timestamps are stored as timestamptz (UTC instants). Columns still
+        # holding naive values are read as wall time in LEGACY_TIMESTAMP_TIMEZONE
+        # (passed in zatobox.legacy_timezone); partitions are handled below
+        """
+        DO $$
+        DECLARE
+            legacy_tz TEXT := COALESCE(
+                NULLIF(current_setting('zatobox.legacy_timezone', true), ''), 'UTC'
+            );
+            tbl RECORD;
+        BEGIN
+            FOR tbl IN
+                SELECT c.relname, string_agg(format(
+                    'ALTER COLUMN %I TYPE TIMESTAMPTZ USING %I AT TIME ZONE %L',
+                    a.attname, a.attname, legacy_tz), ', ') AS alters
+                FROM pg_attribute a JOIN pg_class c ON c.oid = a.attrelid
+                WHERE c.relnamespace = current_schema()::regnamespace
+                  AND c.relkind = 'r' AND NOT c.relispartition
+                  AND a.attnum > 0 AND NOT a.attisdropped
+                  AND a.atttypid = 'timestamp'::regtype
+                GROUP BY c.relname
+            LOOP
+                -- One rewrite per table, however many columns it has
+                EXECUTE format('ALTER TABLE %I %s', tbl.relname, tbl.alters);
+            END LOOP;
+        END
+        $$
+        """,
+        # (Re)builds sales as a table partitioned by month on created_at: once
+        # from a plain table, and again if its timestamps are still naive (the
+        # partition key cannot change type in place). sale_items can no longer
+        # reference sales(id) (a partitioned table's unique keys must include
+        # created_at), so the foreign key is dropped and archival removes
+        # items explicitly.
+        """
+        DO $$
+        DECLARE
+            legacy_tz TEXT := COALESCE(
+                NULLIF(current_setting('zatobox.legacy_timezone', true), ''), 'UTC'
+            );
+            session_tz TEXT := current_setting('TimeZone');
+            part RECORD;
+            col RECORD;
+            first_month DATE;
+            months INT;
+        BEGIN
+            IF (SELECT relkind FROM pg_class WHERE oid = 'sales'::regclass) = 'p'
+                AND (SELECT atttypid FROM pg_attribute
+                     WHERE attrelid = 'sales'::regclass AND attname = 'created_at')
+                    = 'timestamptz'::regtype THEN
+                RETURN;
+            END IF;
+
+            ALTER TABLE sale_items DROP CONSTRAINT IF EXISTS sale_items_sale_id_fkey;
+            ALTER TABLE sales RENAME TO sales_old;
+            -- Old partitions step aside so create_sales_partitions makes new ones
+            FOR part IN
+                SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'sales_old'::regclass
+            LOOP
+                EXECUTE format('ALTER TABLE %I RENAME TO %I', part.relname, part.relname || '_old');
+            END LOOP;
+            ALTER SEQUENCE sales_id_seq OWNED BY NONE;
+
+            -- Same columns and defaults as the old table, whatever was added
+            -- to it, with every timestamp as timestamptz
+            CREATE TABLE sales_template (LIKE sales_old INCLUDING DEFAULTS);
+            FOR col IN
+                SELECT attname FROM pg_attribute
+                WHERE attrelid = 'sales_template'::regclass AND attnum > 0
+                  AND NOT attisdropped AND atttypid = 'timestamp'::regtype
+            LOOP
+                EXECUTE format(
+                    'ALTER TABLE sales_template ALTER COLUMN %I TYPE TIMESTAMPTZ', col.attname
+                );
+            END LOOP;
+            CREATE TABLE sales (LIKE sales_template INCLUDING DEFAULTS)
+                PARTITION BY RANGE (created_at);
+            DROP TABLE sales_template;
+            ALTER TABLE sales
+                ALTER COLUMN created_at SET NOT NULL,
+                ADD PRIMARY KEY (id, created_at),
+                ADD FOREIGN KEY (user_id) REFERENCES users(id),
+                ADD FOREIGN KEY (store_id) REFERENCES stores(id);
+            ALTER SEQUENCE sales_id_seq OWNED BY sales.id;
+
+            -- Catches sales dated outside every monthly partition (e.g. late
+            -- offline uploads for an archived month)
+            CREATE TABLE sales_default PARTITION OF sales DEFAULT;
+
+            first_month := COALESCE(
+                (SELECT date_trunc('month', MIN(created_at)) FROM sales_old),
+                date_trunc('month', NOW())
+            );
+            months := (EXTRACT(YEAR FROM age(date_trunc('month', NOW()), first_month)) * 12
+                + EXTRACT(MONTH FROM age(date_trunc('month', NOW()), first_month)))::int + 4;
+            PERFORM create_sales_partitions(first_month, months);
+
+            UPDATE sales_old SET created_at = NOW() WHERE created_at IS NULL;
+            -- Naive values are converted on insert using the session zone
+            PERFORM set_config('TimeZone', legacy_tz, true);
+            INSERT INTO sales SELECT * FROM sales_old;
+            PERFORM set_config('TimeZone', session_tz, true);
+            DROP TABLE sales_old;
+
+            CREATE INDEX idx_sales_store_created_at ON sales (store_id, created_at, id);
+            CREATE INDEX idx_sales_store_status_created_at
+                ON sales (store_id, status, created_at, id);
+            CREATE INDEX idx_sales_store_payment_method_created_at
+                ON sales (store_id, payment_method, created_at, id);
+            CREATE INDEX idx_sales_store_user_created_at
+                ON sales (store_id, user_id, created_at, id);
+            CREATE INDEX idx_sales_recorded_at ON sales (recorded_at);
+        END
+        $$
+        """,
+        # Idempotency keys used to be unique across stores; they are now
+        # claimed per store, with store_id taken from the sale they point to
+        """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_index i
+                JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+                WHERE i.indrelid = 'sale_idempotency_keys'::regclass
+                  AND i.indisprimary AND a.attname = 'store_id'
+            ) THEN
+                UPDATE sale_idempotency_keys k SET store_id = s.store_id
+                FROM sales s WHERE s.id = k.sale_id AND s.store_id <> k.store_id;
+                ALTER TABLE sale_idempotency_keys
+                    DROP CONSTRAINT IF EXISTS sale_idempotency_keys_pkey,
+                    ADD PRIMARY KEY (store_id, idempotency_key);
+            END IF;
+        END
+        $$
+        """,
+    ]
+
+
 def init_database():
     conn = None
     cursor = None
@@ -57,12 +661,50 @@ def init_database():
         conn = connect_postgres()
         cursor = conn.cursor()
 
+        # Read by the migrations that turn naive timestamps into timestamptz
+        cursor.execute(
+            "SELECT set_config('zatobox.legacy_timezone', %s, false)",
+            (LEGACY_TIMESTAMP_TIMEZONE,),
+        )
+
         # Execute each statement separately
-        for statement in create_tables_sql().split(";"):
+        for statement in create_shared_tables_sql().split(";"):
             stmt = statement.strip()
             if stmt:
                 cursor.execute(stmt)
 
+        # Store-owned tables: the shared public schema, then one schema per
+        # store kept apart (created on first start after stores.schema_name is set)
+        cursor.execute(
+            "SELECT schema_name FROM stores WHERE schema_name IS NOT NULL ORDER BY id"
+        )
+        schemas = [None] + [row[0] for row in cursor.fetchall()]
+        for schema in schemas:
+            path = "public"
+            if schema:
+                cursor.execute(
+                    sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(schema))
+                )
+                path = sql.SQL("{}, public").format(sql.Identifier(schema)).as_string(conn)
+            cursor.execute("SELECT set_config('search_path', %s, true)", (path,))
+
+            for statement in create_tables_sql().split(";"):
+                stmt = statement.strip()
+                if stmt:
+                    cursor.execute(stmt)
+
+            for name, statement in data_migrations_sql():
+                cursor.execute(
+                    "INSERT INTO schema_migrations (name) VALUES (%s) "
+                    "ON CONFLICT DO NOTHING RETURNING name",
+                    (name,),
+                )
+                if cursor.fetchone():
+                    cursor.execute(statement)
+
+            for statement in create_functions_sql():
+                cursor.execute(statement)
+
         conn.commit()
         print("Database initialized successfully!")
 
@@ -10,3 +10,47 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 60))
 DATABASE_TYPE = os.getenv("DATABASE_TYPE", "postgres")
 
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+IMPORT_DIR = os.getenv("IMPORT_DIR", "imports")
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("SNAPSHOT_INTERVAL_SECONDS", 60))
+
+# LISTEN/NOTIFY channel used to push catalog and sales events
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "zatobox_events")
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", 256))
+
+# Stock ledger: how often snapshots are taken and how long raw movements are kept
+STOCK_SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("STOCK_SNAPSHOT_INTERVAL_SECONDS", 3600))
+STOCK_MOVEMENT_RETENTION_DAYS = int(os.getenv("STOCK_MOVEMENT_RETENTION_DAYS", 90))
+VALUATION_REFRESH_SECONDS = int(os.getenv("VALUATION_REFRESH_SECONDS", 30))
+
+# Group commit: coalesce concurrent checkouts into one INSERT and one commit
+SALES_GROUP_COMMIT = os.getenv("SALES_GROUP_COMMIT", "false").lower() == "true"
+SALES_GROUP_COMMIT_WINDOW_MS = int(os.getenv("SALES_GROUP_COMMIT_WINDOW_MS", 5))
+SALES_GROUP_COMMIT_MAX_BATCH = int(os.getenv("SALES_GROUP_COMMIT_MAX_BATCH", 100))
+
+# Offline sales may be stamped this far ahead of the server clock (terminal drift)
+OFFLINE_SALE_MAX_CLOCK_SKEW_SECONDS = int(os.getenv("OFFLINE_SALE_MAX_CLOCK_SKEW_SECONDS", 300))
+
+# Sales are partitioned by month; partitions older than SALES_RETENTION_MONTHS
+# are exported to SALES_ARCHIVE_DIR and dropped (0 keeps everything online)
+SALES_PARTITIONS_AHEAD = int(os.getenv("SALES_PARTITIONS_AHEAD", 3))
+SALES_RETENTION_MONTHS = int(os.getenv("SALES_RETENTION_MONTHS", 0))
+SALES_ARCHIVE_DIR = os.getenv("SALES_ARCHIVE_DIR", "archive")
+SALES_PARTITION_INTERVAL_SECONDS = int(os.getenv("SALES_PARTITION_INTERVAL_SECONDS", 3600))
+
+# Parquet copies of sales for analytics; reports read these files and only
+# ask Postgres for sales recorded after the last export
+PARQUET_SNAPSHOTS = os.getenv("PARQUET_SNAPSHOTS", "false").lower() == "true"
+PARQUET_DIR = os.getenv("PARQUET_DIR", "parquet")
+PARQUET_EXPORT_INTERVAL_SECONDS = int(os.getenv("PARQUET_EXPORT_INTERVAL_SECONDS", 300))
+PARQUET_EXPORT_LAG_SECONDS = int(os.getenv("PARQUET_EXPORT_LAG_SECONDS", 60))
+
+# IVA: catalog prices include it; products carry one of these rates (percent)
+IVA_RATES = tuple(int(r) for r in os.getenv("IVA_RATES", "0,12,15").split(","))
+DEFAULT_IVA_RATE = int(os.getenv("DEFAULT_IVA_RATE", 15))
+
+# Timestamps are stored as UTC timestamptz. Naive values written before that
+# are read as wall time in this zone when the columns are converted
+LEGACY_TIMESTAMP_TIMEZONE = os.getenv("LEGACY_TIMESTAMP_TIMEZONE", "UTC")
@@ -1,7 +1,22 @@
+import os
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes import auth, products, inventory, sales
+from routes import auth, products, inventory, sales, events
 from config.init_database import init_database  # comming create database
+from config.settings import UPLOAD_DIR
+from services.catalog_snapshot_service import start_snapshot_worker
+from services.forecast_service import register_forecast_invalidation
+from services.sales_archive_service import start_sales_partition_worker
+from services.sales_reporting_service import start_parquet_exporter
+from services.sales_service import register_analytics_invalidation
+from services.inventory_service import (
+    register_cache_invalidation,
+    start_stock_snapshot_worker,
+    start_valuation_refresher,
+)
+from utils.static_files import UploadStaticFiles
+from utils.timezone_utils import TimezoneMiddleware
 
 app = FastAPI(title="CSM API", description="Headless CSM for Zatobox", version="1.0.0")
 
@@ -35,6 +50,14 @@ app.openapi = custom_openapi
 async def startup_event():
     # try:
     init_database()
+    start_snapshot_worker()
+    register_cache_invalidation()
+    register_forecast_invalidation()
+    register_analytics_invalidation()
+    start_stock_snapshot_worker()
+    start_valuation_refresher()
+    start_sales_partition_worker()
+    start_parquet_exporter()
     print("🚀 API Started with Configured database!")
     # except Exception as e:
     #     print(e)
@@ -49,11 +72,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Timestamps are stored in UTC and leave the API in the caller's X-Timezone
+# (routers opt in with route_class=LocalTimeRoute)
+app.add_middleware(TimezoneMiddleware)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(products.router)
 app.include_router(inventory.router)
 app.include_router(sales.router)
+app.include_router(events.router)
+
+# Product images: served straight from disk with caching headers
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+app.mount("/uploads", UploadStaticFiles(directory=UPLOAD_DIR), name="uploads")
 
 
 @app.get("/")
@@ -1,8 +1,11 @@
-from pydantic import BaseModel, validator, Field
+from pydantic import BaseModel, validator, Field, field_serializer
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from enum import Enum
 
+from config.settings import OFFLINE_SALE_MAX_CLOCK_SKEW_SECONDS
+from utils.timezone_utils import as_aware, to_request_timezone
+
 
 class PaymentMethod(str, Enum):
     CREDIT_CARD = "credit_card"
@@ -23,6 +26,7 @@ class SalesItem(BaseModel):
     product_id: int = Field(..., gt=0, description="Product ID")
     quantity: int = Field(..., gt=0, description="Quantity")
     price: float = Field(..., gt=0, description="Price")
+    discount: float = Field(0, ge=0, description="Amount off the line")
 
     @validator("quantity")
     def quantity_must_be_positive(cls, v):
@@ -36,6 +40,13 @@ class SalesItem(BaseModel):
             raise ValueError("Price must be positive")
         return round(v, 2)
 
+    @validator("discount")
+    def discount_within_line(cls, v, values):
+        if "quantity" in values and "price" in values:
+            if v > values["quantity"] * values["price"]:
+                raise ValueError("Discount exceeds line amount")
+        return round(v, 2)
+
 
 class CreateSaleRequest(BaseModel):
     items: List[SalesItem] = Field(..., min_items=1, description="Sale items list")
@@ -53,21 +64,59 @@ class CreateSaleRequest(BaseModel):
     def validate_total_matches_items(cls, v, values):
         if "items" in values:
             calculate_total = sum(
-                item.quantity * item.price for item in values["items"]
+                item.quantity * item.price - item.discount for item in values["items"]
             )
             if abs(v - calculate_total) > 0.01:
                 raise ValueError("Total does not confer with the sum of the items")
         return round(v, 2)
 
 
+class OfflineSaleRequest(CreateSaleRequest):
+    idempotency_key: str = Field(
+        ..., min_length=1, max_length=100, description="Client generated unique key"
+    )
+    created_at: Optional[datetime] = Field(
+        None, description="When the sale happened on the terminal"
+    )
+
+    @validator("created_at")
+    def validate_created_at_not_future(cls, v):
+        # Naive terminal clocks are read in the request's zone
+        v = as_aware(v)
+        if v is None:
+            return v
+        limit = datetime.now(timezone.utc) + timedelta(
+            seconds=OFFLINE_SALE_MAX_CLOCK_SKEW_SECONDS
+        )
+        if v > limit:
+            raise ValueError(
+                f"created_at is more than {OFFLINE_SALE_MAX_CLOCK_SKEW_SECONDS}s "
+                "ahead of the server clock"
+            )
+        return v
+
+
+class SaleItemResponse(SalesItem):
+    iva_rate: Optional[float] = None
+    iva_amount: Optional[float] = None
+    line_total: Optional[float] = None
+
+
 class SaleResponse(BaseModel):
     id: int
-    items: List[SalesItem]
+    items: List[SaleItemResponse]
     total: float
+    subtotal: Optional[float] = None
+    discount_total: Optional[float] = None
+    iva_total: Optional[float] = None
     payment_method: PaymentMethod
     status: SalesStatus
     user_id: int
     created_at: datetime
 
+    @field_serializer("created_at")
+    def serialize_created_at(self, value: datetime) -> datetime:
+        return to_request_timezone(value)
+
     class Config:
         from_attributes = True  # For compatibility with sqlalchemy
@@ -1,12 +1,136 @@
+import json
+
 import psycopg2.extras
 
+from config.settings import EVENTS_CHANNEL
+
+# NOTIFY payloads are limited to 8000 bytes; keep id lists well below that
+NOTIFY_IDS_PER_EVENT = 500
+
+# Store that owns rows written before stores existed, and writes made
+# without a store (background jobs, scripts)
+DEFAULT_STORE_ID = 1
+
 
 class BaseRepository:
-    def __init__(self, db):
+    def __init__(self, db, store_id: int = None):
+        """
+        :param store_id: store whose rows are read and written; None for
+            jobs that work across every store on the connection's schema
+        """
         self.db = db
+        self.store_id = store_id
+
+    @property
+    def write_store_id(self) -> int:
+        return DEFAULT_STORE_ID if self.store_id is None else self.store_id
+
+    def _store_clause(self, alias: str = None, store_id: int = None) -> str:
+        """
+        SQL predicate limiting rows to this repository's store (or `store_id`).
+        Inlined as a literal so the planner matches it against the
+        store_id-leading indexes (and partial indexes) of store-owned tables.
+        """
+        if store_id is None:
+            store_id = self.store_id
+        if store_id is None:
+            return "TRUE"
+        column = f"{alias}.store_id" if alias else "store_id"
+        return f"{column} = {int(store_id)}"
 
     def _get_cursor(self):
         """Return a RealDictCursor for PostgreSQL."""
         if getattr(self.db, "closed", 0):
             raise Exception("Database connection is closed")
         return self.db.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+    def _get_named_cursor(self, name: str, itersize: int = 2000):
+        """Server-side RealDictCursor that fetches `itersize` rows per round trip."""
+        if getattr(self.db, "closed", 0):
+            raise Exception("Database connection is closed")
+        cursor = self.db.cursor(
+            name=name, cursor_factory=psycopg2.extras.RealDictCursor
+        )
+        cursor.itersize = itersize
+        return cursor
+
+    def try_advisory_lock(self, name: str) -> bool:
+        """Session-level lock shared by every worker; False if someone holds it"""
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_try_advisory_lock(hashtext(%s)) AS locked", (name,)
+            )
+            locked = cursor.fetchone()["locked"]
+        self.db.commit()
+        return locked
+
+    def advisory_unlock(self, name: str):
+        with self._get_cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(hashtext(%s))", (name,))
+        self.db.commit()
+
+    def find_commit_horizon(self):
+        """
+        Rows stamped with NOW() carry the start of their transaction, not its
+        commit. A transaction still open can commit rows stamped as early as
+        its own start, so only stamps before the oldest open transaction's
+        start are final. Call it in its own statement before reading the rows
+        it bounds, so those are read from a later snapshot.
+        """
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "SELECT LEAST(clock_timestamp(), MIN(xact_start)) AS horizon "
+                "FROM pg_stat_activity "
+                "WHERE datname = current_database() AND pid <> pg_backend_pid()"
+            )
+            return cursor.fetchone()["horizon"]
+
+    def _set_movement_reason(self, cursor, kind: str, reference=None):
+        """
+        Tag stock changes made by the rest of this transaction; read by the
+        record_stock_movement trigger when it appends to stock_movements.
+        """
+        cursor.execute(
+            "SELECT set_config('zatobox.movement_kind', %s, true), "
+            "set_config('zatobox.movement_ref', %s, true)",
+            (kind, "" if reference is None else str(reference)),
+        )
+
+    def _notify(self, cursor, event_type: str, ids=(), **data):
+        """
+        Queue a NOTIFY on the events channel. Postgres delivers it only when
+        the surrounding transaction commits, so listeners never see rolled
+        back writes.
+        """
+        ids = list(ids)
+        for start in range(0, max(len(ids), 1), NOTIFY_IDS_PER_EVENT):
+            payload = {"type": event_type, "ids": ids[start : start + NOTIFY_IDS_PER_EVENT]}
+            if self.store_id is not None:
+                payload["store_id"] = self.store_id
+            payload.update(data)
+            cursor.execute(
+                "SELECT pg_notify(%s, %s)", (EVENTS_CHANNEL, json.dumps(payload, default=str))
+            )
+
+
+class IteratorFile:
+    """
+    Minimal read-only file object over an iterator of text lines, so
+    cursor.copy_expert can stream rows without materialising them.
+    """
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._buffer = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._lines)
+            except StopIteration:
+                break
+        if size < 0:
+            chunk, self._buffer = self._buffer, ""
+        else:
+            chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
@@ -0,0 +1,94 @@
+from repositories.base_repository import BaseRepository
+
+# Columns a running import may change
+JOB_UPDATE_FIELDS = (
+    "status",
+    "processed",
+    "valid",
+    "errors",
+    "inserted",
+    "updated",
+    "detail",
+)
+
+
+class ImportJobRepository(BaseRepository):
+    """
+    Catalog import jobs. The table is shared (public schema), so any worker
+    can report on a job whatever worker runs it, and jobs survive restarts.
+    """
+
+    def create(self, job: dict):
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO catalog_import_jobs "
+                "(id, store_id, schema_name, format, source_path, error_path) "
+                "VALUES (%s, %s, %s, %s, %s, %s) RETURNING *",
+                (
+                    job["id"],
+                    self.write_store_id,
+                    job["schema_name"],
+                    job["format"],
+                    job["source_path"],
+                    job["error_path"],
+                ),
+            )
+            row = cursor.fetchone()
+        self.db.commit()
+        return row
+
+    def find_by_id(self, job_id: str):
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                f"SELECT * FROM catalog_import_jobs WHERE id=%s AND {self._store_clause()}",
+                (job_id,),
+            )
+            return cursor.fetchone()
+
+    def update(self, job_id: str, fields: dict, finished: bool = False):
+        """
+        :param fields: subset of JOB_UPDATE_FIELDS
+        :param finished: also stamp finished_at
+        """
+        columns = [name for name in JOB_UPDATE_FIELDS if name in fields]
+        assignments = [f"{name} = %s" for name in columns]
+        if finished:
+            assignments.append("finished_at = NOW()")
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                f"UPDATE catalog_import_jobs SET {', '.join(assignments)} WHERE id=%s",
+                [fields[name] for name in columns] + [job_id],
+            )
+        self.db.commit()
+
+    def start(self, job_id: str) -> bool:
+        """Move a queued job to running; False if it was already failed or taken"""
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "UPDATE catalog_import_jobs SET status = 'running' "
+                "WHERE id=%s AND status = 'queued' RETURNING id",
+                (job_id,),
+            )
+            started = cursor.fetchone() is not None
+        self.db.commit()
+        return started
+
+    def fail_orphaned(self, job_id: str, queued_timeout_seconds: int):
+        """
+        Mark a job failed when no worker will finish it: running while its
+        runner's session lock is free (the worker died), or still queued
+        long after it was created (the worker died before starting it).
+        The runner takes its lock before moving the job to running and
+        finishes it before releasing, so a free lock means it is gone.
+        """
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "UPDATE catalog_import_jobs SET status = 'failed', "
+                "detail = 'Import interrupted', finished_at = NOW() "
+                "WHERE id=%s AND CASE status "
+                "WHEN 'running' THEN pg_try_advisory_xact_lock(hashtext('catalog_import:' || id)) "
+                "WHEN 'queued' THEN created_at < NOW() - make_interval(secs => %s) "
+                "ELSE FALSE END",
+                (job_id, queued_timeout_seconds),
+            )
+        self.db.commit()
@@ -0,0 +1,206 @@
+from fastapi import HTTPException
+from psycopg2.extras import execute_values
+
+from repositories.base_repository import BaseRepository
+
+
+class InventoryRepository(BaseRepository):
+    """
+    Per-product stock thresholds. One inventory row per product is kept in
+    sync with products.stock by the trg_products_sync_inventory trigger.
+    """
+
+    def find_all(self):
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "SELECT p.id, p.name, p.stock, COALESCE(i.min_stock, 0) AS min_stock, "
+                "p.last_updated FROM products p "
+                "LEFT JOIN inventory i ON i.product_id = p.id "
+                f"WHERE {self._store_clause('p')} ORDER BY p.id"
+            )
+            return cursor.fetchall()
+
+    def find_stock_levels(self):
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "SELECT product_id AS id, product_name AS name, quantity AS stock, "
+                f"min_stock FROM inventory WHERE {self._store_clause()}"
+            )
+            return cursor.fetchall()
+
+    def find_valuation(self):
+        """Per-category and overall stock value from the store_inventory_valuation view"""
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "SELECT category, is_total, products, units, stock_value, refreshed_at "
+                f"FROM store_inventory_valuation WHERE {self._store_clause()} "
+                "ORDER BY is_total, stock_value DESC"
+            )
+            return cursor.fetchall()
+
+    def refresh_valuation(self):
+        """
+        Rebuild store_inventory_valuation of the connection's schema without
+        blocking readers. An advisory lock per schema keeps workers from
+        refreshing at the same time; returns False if busy.
+        """
+        lock = "hashtext('store_inventory_valuation.' || current_schema())"
+        with self._get_cursor() as cursor:
+            cursor.execute(f"SELECT pg_try_advisory_lock({lock}) AS locked")
+            if not cursor.fetchone()["locked"]:
+                self.db.commit()
+                return False
+            try:
+                cursor.execute(
+                    "REFRESH MATERIALIZED VIEW CONCURRENTLY store_inventory_valuation"
+                )
+                self.db.commit()
+            finally:
+                cursor.execute(f"SELECT pg_advisory_unlock({lock})")
+                self.db.commit()
+            return True
+
+    def find_low_stock(self, after_id: int = 0, limit: int = 100):
+        """Keyset page of products at or below their own min_stock"""
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "SELECT i.product_id AS id, i.product_name AS name, "
+                "i.quantity AS stock, i.min_stock "
+                "FROM inventory i "
+                f"WHERE {self._store_clause('i')} "
+                "AND i.quantity <= i.min_stock AND i.product_id > %s "
+                "ORDER BY i.product_id LIMIT %s",
+                (after_id, limit),
+            )
+            return cursor.fetchall()
+
+    def count_low_stock(self):
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) AS total FROM inventory "
+                f"WHERE {self._store_clause()} AND quantity <= min_stock"
+            )
+            return cursor.fetchone()["total"]
+
+    def bulk_update_thresholds(self, thresholds: list):
+        """
+        Set min_stock for many products in one statement.
+        :param thresholds: list of (product_id, min_stock)
+        """
+        try:
+            with self._get_cursor() as cursor:
+                updated = execute_values(
+                    cursor,
+                    "UPDATE inventory AS i SET min_stock = v.min_stock, "
+                    "last_updated = NOW() "
+                    "FROM (VALUES %s) AS v(product_id, min_stock) "
+                    f"WHERE i.product_id = v.product_id AND {self._store_clause('i')} "
+                    "RETURNING i.product_id, i.min_stock, i.quantity",
+                    thresholds,
+                    template="(%s::int, %s::int)",
+                    page_size=len(thresholds),
+                    fetch=True,
+                )
+                missing = {pid for pid, _ in thresholds} - {
+                    row["product_id"] for row in updated
+                }
+                if missing:
+                    raise HTTPException(
+                        status_code=404,
+                        detail=f"Products not found: {sorted(missing)}",
+                    )
+                self._notify(
+                    cursor, "inventory.updated", [row["product_id"] for row in updated]
+                )
+                self.db.commit()
+                return updated
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def apply_stocktake(self, counts: dict, user_id: int):
+        """
+        Set stock to the counted quantities in one transaction and record
+        expected/counted/variance per product.
+        :param counts: {product_id: counted_quantity}
+        :return: (stocktake row, list of item rows)
+        """
+        product_ids = sorted(counts)
+        try:
+            with self._get_cursor() as cursor:
+                # Lock in id order; counts are compared against these values
+                cursor.execute(
+                    "SELECT id, stock FROM products "
+                    f"WHERE id = ANY(%s) AND {self._store_clause()} ORDER BY id FOR UPDATE",
+                    (product_ids,),
+                )
+                expected = {row["id"]: row["stock"] for row in cursor.fetchall()}
+                missing = set(product_ids) - set(expected)
+                if missing:
+                    raise HTTPException(
+                        status_code=404,
+                        detail=f"Products not found: {sorted(missing)}",
+                    )
+
+                items = [
+                    {
+                        "product_id": pid,
+                        "expected": expected[pid],
+                        "counted": counts[pid],
+                        "variance": counts[pid] - expected[pid],
+                    }
+                    for pid in product_ids
+                ]
+                adjusted = [item for item in items if item["variance"] != 0]
+
+                cursor.execute(
+                    "INSERT INTO stocktakes (store_id, user_id, items_counted, "
+                    "items_adjusted, total_variance) VALUES (%s, %s, %s, %s, %s) RETURNING *",
+                    (
+                        self.write_store_id,
+                        user_id,
+                        len(items),
+                        len(adjusted),
+                        sum(item["variance"] for item in items),
+                    ),
+                )
+                stocktake = cursor.fetchone()
+
+                execute_values(
+                    cursor,
+                    "INSERT INTO stocktake_items "
+                    "(stocktake_id, product_id, expected, counted, variance) VALUES %s",
+                    [
+                        (
+                            stocktake["id"],
+                            item["product_id"],
+                            item["expected"],
+                            item["counted"],
+                            item["variance"],
+                        )
+                        for item in items
+                    ],
+                    page_size=len(items),
+                )
+
+                if adjusted:
+                    self._set_movement_reason(cursor, "stocktake", stocktake["id"])
+                    execute_values(
+                        cursor,
+                        "UPDATE products AS p SET stock = v.counted, last_updated = NOW() "
+                        "FROM (VALUES %s) AS v(id, counted) WHERE p.id = v.id",
+                        [(item["product_id"], item["counted"]) for item in adjusted],
+                        template="(%s::int, %s::int)",
+                        page_size=len(adjusted),
+                    )
+                    self._notify(
+                        cursor,
+                        "products.updated",
+                        [item["product_id"] for item in adjusted],
+                        reason="stocktake",
+                    )
+                self.db.commit()
+                return stocktake, items
+        except Exception:
+            self.db.rollback()
+            raise
@@ -1,8 +1,9 @@
 from fastapi import HTTPException
+from psycopg2.extras import execute_values
 
-from repositories.base_repository import BaseRepository
+from config.settings import DEFAULT_IVA_RATE
+from repositories.base_repository import BaseRepository, IteratorFile
 
-from utils.timezone_utils import get_current_time_with_timezone
 
 
 class ProductRepository(BaseRepository):
@@ -15,14 +16,12 @@ class ProductRepository(BaseRepository):
         stock: int,
         category: str,
         images: str,
-        user_timezone: str = "UTC",
+        iva_rate: float = DEFAULT_IVA_RATE,
     ):
-        last_updated = get_current_time_with_timezone(user_timezone)
-        created_at = get_current_time_with_timezone(user_timezone)
         with self._get_cursor() as cursor:
             cursor.execute(
-                "INSERT INTO products (name, description, price, stock, category, images, last_updated, created_at) "
-                "VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING *",
+                "INSERT INTO products (name, description, price, stock, category, images, "
+                "iva_rate, store_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING *",
                 (
                     name,
                     description,
@@ -30,23 +29,23 @@ class ProductRepository(BaseRepository):
                     stock,
                     category,
                     images,
-                    last_updated,
-                    created_at,
+                    iva_rate,
+                    self.write_store_id,
                 ),
             )
+            product = cursor.fetchone()
+            self._notify(cursor, "products.created", [product["id"]])
             self.db.commit()
-            return cursor.fetchone()
+            return product
 
-    def update_product(self, product_id, updates: dict, user_timezone: str = "UTC"):
+    def update_product(self, product_id, updates: dict):
         # Protecting the created_at and id Update field
-        protect_fields = ["created_at", "id"]
+        protect_fields = ["created_at", "id", "last_updated"]
         for field in protect_fields:
             updates.pop(field, None)
 
-        updates["last_updated"] = get_current_time_with_timezone(user_timezone)
-
         # For construction dynamic SQL
-        set_clauses = []
+        set_clauses = ["last_updated=NOW()"]
         values = []
 
         for field, value in updates.items():
@@ -55,40 +54,292 @@ class ProductRepository(BaseRepository):
 
         values.append(product_id)
 
-        sql = f"UPDATE products SET {','.join(set_clauses)} WHERE id =%s RETURNING *"
+        sql = (
+            f"UPDATE products SET {','.join(set_clauses)} "
+            f"WHERE id =%s AND {self._store_clause()} RETURNING *"
+        )
 
         with self._get_cursor() as cursor:
             cursor.execute(sql, values)
+            product = cursor.fetchone()
+            if product:
+                self._notify(
+                    cursor, "products.updated", [product["id"]], stock=product["stock"]
+                )
             self.db.commit()
-            return cursor.fetchone()
+            return product
+
+    # SQL types used to cast the VALUES list of bulk updates
+    UPDATABLE_COLUMN_TYPES = {
+        "name": "varchar",
+        "description": "text",
+        "price": "numeric",
+        "stock": "int",
+        "category": "varchar",
+        "images": "text",
+        "iva_rate": "numeric",
+    }
+
+    def bulk_update_products(self, updates: list):
+        """
+        Apply many partial updates in a single transaction.
+        :param updates: list of dicts, each with "id" plus the fields to change
+        :return: updated rows; rolls back and raises 404 if any id is missing
+        """
+        # Rows that touch the same columns share one UPDATE ... FROM (VALUES ...)
+        groups = {}
+        for update in updates:
+            fields = tuple(sorted(f for f in update if f != "id"))
+            groups.setdefault(fields, []).append(update)
+
+        updated = []
+        try:
+            with self._get_cursor() as cursor:
+                for fields, rows in groups.items():
+                    columns = ("id",) + fields
+                    set_clause = ",".join(
+                        [f"{f}=v.{f}" for f in fields] + ["last_updated=NOW()"]
+                    )
+                    casts = ["int"] + [self.UPDATABLE_COLUMN_TYPES[f] for f in fields]
+                    template = "(" + ",".join(f"%s::{c}" for c in casts) + ")"
+                    sql = (
+                        f"UPDATE products AS p SET {set_clause} "
+                        f"FROM (VALUES %s) AS v({','.join(columns)}) "
+                        f"WHERE p.id = v.id AND {self._store_clause('p')} RETURNING p.*"
+                    )
+                    updated.extend(
+                        execute_values(
+                            cursor,
+                            sql,
+                            [
+                                [row["id"]] + [row[f] for f in fields]
+                                for row in rows
+                            ],
+                            template=template,
+                            page_size=len(rows),
+                            fetch=True,
+                        )
+                    )
+
+                missing = {u["id"] for u in updates} - {p["id"] for p in updated}
+                if missing:
+                    raise HTTPException(
+                        status_code=404,
+                        detail=f"Products not found: {sorted(missing)}",
+                    )
+                self._notify(cursor, "products.updated", [p["id"] for p in updated])
+                self.db.commit()
+                return updated
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def import_products(self, csv_lines):
+        """
+        Bulk load products through COPY into a staging table, then merge.
+        :param csv_lines: iterator of CSV lines with columns
+            line_no, id, name, description, price, stock, category, images
+        :return: counts of inserted/updated rows and the (line_no, id) pairs
+            whose id does not exist in products
+        """
+        try:
+            with self._get_cursor() as cursor:
+                self._set_movement_reason(cursor, "import")
+                cursor.execute(
+                    "CREATE TEMP TABLE products_import ("
+                    "line_no INT, id INT, name VARCHAR(255), description TEXT, "
+                    "price DECIMAL(10,2), stock INT, category VARCHAR(100), images TEXT"
+                    ") ON COMMIT DROP"
+                )
+                cursor.copy_expert(
+                    "COPY products_import (line_no, id, name, description, price, "
+                    "stock, category, images) FROM STDIN WITH (FORMAT csv)",
+                    IteratorFile(csv_lines),
+                )
+
+                # Later lines win when the same id appears more than once
+                cursor.execute(
+                    f"""
+                    WITH staged AS (
+                        SELECT DISTINCT ON (id) * FROM products_import
+                        WHERE id IS NOT NULL ORDER BY id, line_no DESC
+                    ), upd AS (
+                        UPDATE products p SET
+                            name = COALESCE(s.name, p.name),
+                            description = COALESCE(s.description, p.description),
+                            price = COALESCE(s.price, p.price),
+                            stock = COALESCE(s.stock, p.stock),
+                            category = COALESCE(s.category, p.category),
+                            images = COALESCE(s.images, p.images),
+                            last_updated = NOW()
+                        FROM staged s WHERE p.id = s.id AND {self._store_clause('p')}
+                        RETURNING p.id
+                    ), ins AS (
+                        INSERT INTO products
+                            (name, description, price, stock, category, images,
+                             iva_rate, store_id)
+                        SELECT name, description, price, stock, category, images,
+                               %s, {self.write_store_id}
+                        FROM products_import WHERE id IS NULL ORDER BY line_no
+                        RETURNING id
+                    )
+                    SELECT (SELECT COUNT(*) FROM upd) AS updated,
+                           (SELECT COUNT(*) FROM ins) AS inserted
+                    """,
+                    (DEFAULT_IVA_RATE,),
+                )
+                result = dict(cursor.fetchone())
+
+                cursor.execute(
+                    "SELECT s.line_no, s.id FROM products_import s "
+                    "WHERE s.id IS NOT NULL "
+                    "AND NOT EXISTS (SELECT 1 FROM products p "
+                    f"WHERE p.id = s.id AND {self._store_clause('p')}) "
+                    "ORDER BY s.line_no"
+                )
+                result["unmatched"] = cursor.fetchall()
+
+                # Too many ids to list; clients catch up through the change feed
+                self._notify(
+                    cursor,
+                    "products.imported",
+                    inserted=result["inserted"],
+                    updated=result["updated"],
+                )
+                self.db.commit()
+                return result
+        except Exception:
+            self.db.rollback()
+            raise
 
     def find_all(self):
         with self._get_cursor() as cursor:
-            cursor.execute("SELECT * FROM products")
+            cursor.execute(f"SELECT * FROM products WHERE {self._store_clause()}")
             return cursor.fetchall()
 
+    def iter_all(self, itersize: int = 2000):
+        """Stream every product through a server-side cursor"""
+        with self._get_named_cursor("products_export", itersize) as cursor:
+            cursor.execute(
+                f"SELECT * FROM products WHERE {self._store_clause()} ORDER BY id"
+            )
+            yield from cursor
+
+    def get_stock_summary(self):
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) AS total_products, "
+                "COALESCE(SUM(stock), 0) AS total_stock FROM products "
+                f"WHERE {self._store_clause()}"
+            )
+            return cursor.fetchone()
+
     def find_by_id(self, product_id: int):
         with self._get_cursor() as cursor:
-            cursor.execute("SELECT * FROM products WHERE id=%s", (product_id,))
+            cursor.execute(
+                f"SELECT * FROM products WHERE id=%s AND {self._store_clause()}",
+                (product_id,),
+            )
             return cursor.fetchone()
 
+    def find_pricing(self, product_ids: list):
+        """{id: {"price", "iva_rate"}} for the given products, in one query"""
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "SELECT id, price, iva_rate FROM products "
+                f"WHERE id = ANY(%s) AND {self._store_clause()}",
+                (list(product_ids),),
+            )
+            return {row["id"]: row for row in cursor.fetchall()}
+
+    def find_names(self, product_ids: list):
+        """{id: name} for the given products, in one query"""
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                f"SELECT id, name FROM products WHERE id = ANY(%s) AND {self._store_clause()}",
+                (list(product_ids),),
+            )
+            return {row["id"]: row["name"] for row in cursor.fetchall()}
+
     def find_by_category(self, category: str):
         with self._get_cursor() as cursor:
-            cursor.execute("SELECT * FROM products WHERE category=%s", (category,))
+            cursor.execute(
+                f"SELECT * FROM products WHERE {self._store_clause()} AND category=%s",
+                (category,),
+            )
             return cursor.fetchall()
 
     def find_by_name(self, name: str):
         with self._get_cursor() as cursor:
-            cursor.execute("SELECT * FROM products WHERE name=%s", (name,))
+            cursor.execute(
+                f"SELECT * FROM products WHERE {self._store_clause()} AND name=%s",
+                (name,),
+            )
+            return cursor.fetchall()
+
+    def find_changed_since(self, since_ts, since_id: int, limit: int, until):
+        """
+        Products written after the (last_updated, id) position and before
+        `until` (a find_commit_horizon value), oldest first
+        """
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                f"SELECT * FROM products WHERE {self._store_clause()} "
+                "AND (last_updated, id) > (%s, %s) AND last_updated < %s "
+                "ORDER BY last_updated, id LIMIT %s",
+                (since_ts, since_id, until, limit),
+            )
+            return cursor.fetchall()
+
+    def find_deleted_since(self, since_ts, since_id: int, limit: int, until):
+        """Tombstones recorded after the (deleted_at, product_id) position and before `until`"""
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "SELECT product_id AS id, deleted_at FROM product_tombstones "
+                f"WHERE {self._store_clause()} AND (deleted_at, product_id) > (%s, %s) "
+                "AND deleted_at < %s "
+                "ORDER BY deleted_at, product_id LIMIT %s",
+                (since_ts, since_id, until, limit),
+            )
             return cursor.fetchall()
 
+    def find_latest_change(self, until):
+        """Newest (timestamp, id) position before `until` across product writes and deletions"""
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "SELECT last_updated AS ts, id FROM products "
+                f"WHERE {self._store_clause()} AND last_updated < %s "
+                "ORDER BY last_updated DESC, id DESC LIMIT 1",
+                (until,),
+            )
+            latest_write = cursor.fetchone()
+            cursor.execute(
+                "SELECT deleted_at AS ts, product_id AS id FROM product_tombstones "
+                f"WHERE {self._store_clause()} AND deleted_at < %s "
+                "ORDER BY deleted_at DESC, product_id DESC LIMIT 1",
+                (until,),
+            )
+            latest_delete = cursor.fetchone()
+        positions = [(p["ts"], p["id"]) for p in (latest_write, latest_delete) if p]
+        return max(positions) if positions else None
+
     def delete_product(self, product_id: int):
         with self._get_cursor() as cursor:
             cursor.execute(
-                "DELETE FROM products WHERE id=%s RETURNING *", (product_id,)
+                f"DELETE FROM products WHERE id=%s AND {self._store_clause()} RETURNING *",
+                (product_id,),
             )
-            self.db.commit()
             product = cursor.fetchone()
             if not product:
+                self.db.rollback()
                 raise HTTPException(status_code=404, detail="Product not found")
+            # Keep a tombstone so sync clients learn about the deletion
+            cursor.execute(
+                "INSERT INTO product_tombstones (product_id, deleted_at, store_id) "
+                "VALUES (%s, NOW(), %s) "
+                "ON CONFLICT (product_id) DO UPDATE SET deleted_at = EXCLUDED.deleted_at",
+                (product_id, product["store_id"]),
+            )
+            self._notify(cursor, "products.deleted", [product_id])
+            self.db.commit()
             return product
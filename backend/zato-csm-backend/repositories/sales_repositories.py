@@ -1,34 +1,730 @@
+import json
+
+from fastapi import HTTPException
+from psycopg2.errors import LockNotAvailable
+from psycopg2.extras import execute_values
+
 from repositories.base_repository import BaseRepository
-from utils.timezone_utils import get_current_time_with_timezone
+from utils.timezone_utils import as_aware
+
+# Checkouts waiting longer than this on a contended SKU fail instead of queueing
+STOCK_LOCK_TIMEOUT = "2s"
+# Seconds a client is told to wait before retrying such a checkout
+STOCK_RETRY_AFTER_SECONDS = 1
+# Partition maintenance locks sales briefly; give up rather than queue sales behind it
+PARTITION_LOCK_TIMEOUT = "5s"
+
+
+def stock_busy_error(product_ids=None) -> HTTPException:
+    """503 for a sale whose stock rows stayed locked past STOCK_LOCK_TIMEOUT"""
+    detail = "Stock is being updated by another operation, retry shortly"
+    if product_ids:
+        detail += f" (products: {sorted(product_ids)})"
+    return HTTPException(
+        status_code=503,
+        detail=detail,
+        headers={"Retry-After": str(STOCK_RETRY_AFTER_SECONDS)},
+    )
+
+
+# Sale columns plus its items as a JSON array, in line order
+SALE_WITH_ITEMS_SQL = """
+    SELECT s.id, s.store_id, s.total, s.payment_method, s.user_id, s.status, s.created_at,
+        s.subtotal, s.discount_total, s.iva_total,
+        COALESCE((
+            SELECT json_agg(json_build_object(
+                'product_id', i.product_id, 'quantity', i.quantity, 'price', i.price,
+                'discount', i.discount, 'iva_rate', i.iva_rate,
+                'iva_amount', i.iva_amount, 'line_total', i.line_total
+            ) ORDER BY i.line_no)
+            FROM sale_items i WHERE i.sale_id = s.id
+        ), '[]'::json) AS items
+    FROM sales s
+"""
 
 
 class SalesRepository(BaseRepository):
     def create_sale(
         self,
-        items: str,
+        items: list,
         total: float,
         payment_method: str,
         user_id: int,
         status: str = "completed",
-        user_timezone: str = "UTC",
+        stock_quantities: dict = None,
+        subtotal=None,
+        discount_total=None,
+        iva_total=None,
     ):
-        created_at = get_current_time_with_timezone(user_timezone)
+        """
+        Insert a sale with its items and, when stock_quantities
+        ({product_id: qty}) is given, decrement stock in the same transaction.
+        Either everything happens or nothing does.
+        :param items: list of {"product_id", "quantity", "price"} plus the
+            amounts computed by PricingService
+        :return: the inserted sales row
+        """
+        try:
+            with self._get_cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO sales (store_id, total, payment_method, user_id, status, "
+                    "subtotal, discount_total, iva_total) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING *",
+                    (
+                        self.write_store_id,
+                        total,
+                        payment_method,
+                        user_id,
+                        status,
+                        subtotal,
+                        discount_total,
+                        iva_total,
+                    ),
+                )
+                row = cursor.fetchone()
+                sale_id = row["id"]
+                sale = {
+                    "id": sale_id,
+                    "store_id": row["store_id"],
+                    "items": items,
+                    "total": total,
+                    "payment_method": payment_method,
+                    "user_id": user_id,
+                    "status": status,
+                    "created_at": row["created_at"],
+                }
+                self._insert_sale_items(cursor, [sale])
+                self._add_to_daily_rollup(cursor, [sale])
+                if stock_quantities:
+                    self._set_movement_reason(cursor, "sale", sale_id)
+                    self._decrement_stock(cursor, stock_quantities)
+                self._notify(cursor, "sales.created", [sale_id])
+                self.db.commit()
+                return row
+        except LockNotAvailable:
+            self.db.rollback()
+            raise stock_busy_error(stock_quantities)
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def create_sales_group(self, sales: list):
+        """
+        Group commit: insert many independent checkouts with one multi-row
+        INSERT and one commit.
+
+        Every product touched by the group is locked in id order up front, so
+        groups never deadlock with each other. If some product stays locked by
+        another transaction past STOCK_LOCK_TIMEOUT, the group keeps the
+        products it can lock and only the sales touching the others fail with
+        a 503. Each sale's stock decrement runs under its own savepoint; a sale
+        that hits insufficient stock or an unknown product gets its exception
+        back without failing the rest.
+        :param sales: dicts with store_id, items, total, payment_method,
+            user_id, status, stock_quantities and the priced amounts; all of
+            them are stamped with the transaction's NOW()
+        :return: list aligned with `sales` of inserted rows or exceptions
+        """
+        results = [None] * len(sales)
+        try:
+            with self._get_cursor() as cursor:
+                # Ids are drawn first so RETURNING rows map back by id, not position
+                cursor.execute(
+                    "SELECT nextval(pg_get_serial_sequence('sales', 'id')) AS id, "
+                    "NOW() AS created_at FROM generate_series(1, %s)",
+                    (len(sales),),
+                )
+                for sale, row in zip(sales, cursor.fetchall()):
+                    sale["id"] = row["id"]
+                    sale["created_at"] = row["created_at"]
+
+                all_products = sorted(
+                    {pid for sale in sales for pid in sale["stock_quantities"]}
+                )
+                busy = set()
+                if all_products:
+                    cursor.execute(f"SET LOCAL lock_timeout = '{STOCK_LOCK_TIMEOUT}'")
+                    cursor.execute("SAVEPOINT group_lock")
+                    try:
+                        cursor.execute(
+                            "SELECT id FROM products WHERE id = ANY(%s) ORDER BY id FOR UPDATE",
+                            (all_products,),
+                        )
+                        cursor.execute("RELEASE SAVEPOINT group_lock")
+                    except LockNotAvailable:
+                        # Take what is free right now (still in id order) and
+                        # fail only the sales that need a busy product
+                        cursor.execute("ROLLBACK TO SAVEPOINT group_lock")
+                        cursor.execute(
+                            "SELECT id FROM products WHERE id = ANY(%s) "
+                            "ORDER BY id FOR UPDATE SKIP LOCKED",
+                            (all_products,),
+                        )
+                        locked = {row["id"] for row in cursor.fetchall()}
+                        existing = self._existing_products(cursor, all_products)
+                        busy = existing - locked
+
+                accepted = []
+                for index, sale in enumerate(sales):
+                    blocked = busy.intersection(sale["stock_quantities"])
+                    if blocked:
+                        results[index] = stock_busy_error(blocked)
+                        continue
+                    if sale["stock_quantities"]:
+                        cursor.execute("SAVEPOINT sale_stock")
+                        try:
+                            self._set_movement_reason(cursor, "sale", sale["id"])
+                            self._decrement_stock(
+                                cursor, sale["stock_quantities"], store_id=sale["store_id"]
+                            )
+                        except HTTPException as e:
+                            cursor.execute("ROLLBACK TO SAVEPOINT sale_stock")
+                            results[index] = e
+                            continue
+                        cursor.execute("RELEASE SAVEPOINT sale_stock")
+                    accepted.append(sale)
+
+                if accepted:
+                    inserted = execute_values(
+                        cursor,
+                        "INSERT INTO sales (id, store_id, total, payment_method, user_id, "
+                        "status, created_at, subtotal, discount_total, iva_total) "
+                        "VALUES %s RETURNING *",
+                        [
+                            (
+                                sale["id"],
+                                sale["store_id"],
+                                sale["total"],
+                                sale["payment_method"],
+                                sale["user_id"],
+                                sale["status"],
+                                sale["created_at"],
+                                sale.get("subtotal"),
+                                sale.get("discount_total"),
+                                sale.get("iva_total"),
+                            )
+                            for sale in accepted
+                        ],
+                        page_size=len(accepted),
+                        fetch=True,
+                    )
+                    rows = {row["id"]: row for row in inserted}
+                    self._insert_sale_items(cursor, accepted)
+                    self._add_to_daily_rollup(cursor, accepted)
+                    by_store = {}
+                    for row in inserted:
+                        by_store.setdefault(row["store_id"], []).append(row["id"])
+                    for store_id, ids in by_store.items():
+                        self._notify(cursor, "sales.created", ids, store_id=store_id)
+                    for index, sale in enumerate(sales):
+                        if results[index] is None:
+                            results[index] = rows[sale["id"]]
+
+                self.db.commit()
+                return results
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def create_sales_batch(self, sales: list, user_id: int, zone=None):
+        """
+        Insert offline sales in one transaction, skipping idempotency keys
+        that already exist.
+        :param sales: dicts with idempotency_key, items, total, payment_method,
+            status and optional created_at (the terminal's clock)
+        :param zone: zone of naive terminal timestamps (default: the request's)
+        :return: {idempotency_key: (sale_id, created)}
+        """
+        try:
+            with self._get_cursor() as cursor:
+                # Keys are claimed per store in their own table: sales is
+                # partitioned by month, so it cannot hold a unique index on them
+                cursor.execute(
+                    "SELECT nextval(pg_get_serial_sequence('sales', 'id')) AS id, "
+                    "NOW() AS now FROM generate_series(1, %s)",
+                    (len(sales),),
+                )
+                for sale, row in zip(sales, cursor.fetchall()):
+                    sale["id"] = row["id"]
+                    sale["created_at"] = as_aware(sale.get("created_at"), zone) or row["now"]
+                    sale["user_id"] = user_id
+                    sale["store_id"] = self.write_store_id
+                claimed = execute_values(
+                    cursor,
+                    "INSERT INTO sale_idempotency_keys (store_id, idempotency_key, sale_id) "
+                    "VALUES %s ON CONFLICT DO NOTHING RETURNING idempotency_key, sale_id",
+                    [(sale["store_id"], sale["idempotency_key"], sale["id"]) for sale in sales],
+                    page_size=len(sales),
+                    fetch=True,
+                )
+                new_ids = {row["idempotency_key"]: row["sale_id"] for row in claimed}
+                outcomes = {key: (sale_id, True) for key, sale_id in new_ids.items()}
+
+                duplicates = [
+                    sale["idempotency_key"]
+                    for sale in sales
+                    if sale["idempotency_key"] not in new_ids
+                ]
+                if duplicates:
+                    cursor.execute(
+                        "SELECT sale_id, idempotency_key FROM sale_idempotency_keys "
+                        "WHERE store_id = %s AND idempotency_key = ANY(%s)",
+                        (self.write_store_id, duplicates),
+                    )
+                    for row in cursor.fetchall():
+                        outcomes[row["idempotency_key"]] = (row["sale_id"], False)
+
+                created = [s for s in sales if new_ids.get(s["idempotency_key"]) == s["id"]]
+                if created:
+                    execute_values(
+                        cursor,
+                        "INSERT INTO sales (id, store_id, idempotency_key, total, "
+                        "payment_method, user_id, status, created_at, subtotal, "
+                        "discount_total, iva_total) VALUES %s",
+                        [
+                            (
+                                sale["id"],
+                                sale["store_id"],
+                                sale["idempotency_key"],
+                                sale["total"],
+                                sale["payment_method"],
+                                user_id,
+                                sale["status"],
+                                sale["created_at"],
+                                sale.get("subtotal"),
+                                sale.get("discount_total"),
+                                sale.get("iva_total"),
+                            )
+                            for sale in created
+                        ],
+                        page_size=len(created),
+                    )
+                    self._insert_sale_items(cursor, created)
+                    self._add_to_daily_rollup(cursor, created)
+
+                    # Goods already left the store; record it even if stock runs negative
+                    quantities = {}
+                    for sale in created:
+                        if sale["status"] in ("completed", "pending"):
+                            for item in sale["items"]:
+                                pid = item["product_id"]
+                                quantities[pid] = quantities.get(pid, 0) + item["quantity"]
+                    if quantities:
+                        self._set_movement_reason(cursor, "sale", "offline-batch")
+                        self._decrement_stock(cursor, quantities, strict=False)
+                    self._notify(cursor, "sales.created", [s["id"] for s in created])
+
+                self.db.commit()
+                return outcomes
+        except LockNotAvailable:
+            # Keys are idempotent: the terminal can simply resend the batch
+            self.db.rollback()
+            raise stock_busy_error()
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def _insert_sale_items(self, cursor, sales: list):
+        """One batched insert for the items of every sale in `sales`"""
+        rows = [
+            (
+                sale["id"],
+                line_no,
+                item["product_id"],
+                item["quantity"],
+                item["price"],
+                item.get("discount") or 0,
+                item.get("iva_rate"),
+                item.get("iva_amount"),
+                item.get("line_total"),
+            )
+            for sale in sales
+            for line_no, item in enumerate(sale["items"], start=1)
+        ]
+        if rows:
+            execute_values(
+                cursor,
+                "INSERT INTO sale_items (sale_id, line_no, product_id, quantity, price, "
+                "discount, iva_rate, iva_amount, line_total) VALUES %s",
+                rows,
+                page_size=len(rows),
+            )
+
+    def _add_to_daily_rollup(self, cursor, sales: list):
+        """Keep sales_daily_rollup in step with sales inside the sales' transaction"""
+        execute_values(
+            cursor,
+            "INSERT INTO sales_daily_rollup "
+            "(store_id, day, payment_method, user_id, status, sales_count, items_count, total) "
+            "SELECT v.store_id, (v.ts AT TIME ZONE 'UTC')::date, v.payment_method, "
+            "v.user_id, v.status, COUNT(*), SUM(v.items_count), SUM(v.total) "
+            "FROM (VALUES %s) "
+            "AS v(store_id, ts, payment_method, user_id, status, items_count, total) "
+            "GROUP BY 1, 2, 3, 4, 5 "
+            "ON CONFLICT (store_id, day, payment_method, user_id, status) DO UPDATE SET "
+            "sales_count = sales_daily_rollup.sales_count + EXCLUDED.sales_count, "
+            "items_count = sales_daily_rollup.items_count + EXCLUDED.items_count, "
+            "total = sales_daily_rollup.total + EXCLUDED.total",
+            [
+                (
+                    sale["store_id"],
+                    sale["created_at"],
+                    sale["payment_method"] or "",
+                    sale["user_id"] or 0,
+                    sale["status"],
+                    sum(item["quantity"] for item in sale["items"]),
+                    sale["total"],
+                )
+                for sale in sales
+            ],
+            template="(%s::int, %s::timestamptz, %s::varchar, %s::int, %s::varchar, %s::int, %s::numeric)",
+            page_size=len(sales),
+        )
+
+    def get_stats(self, ranges: dict, user_id=None):
+        """
+        Totals and per-payment-method breakdown.
+        :param ranges: from sales_service.stats_ranges: rollup days
+            [first_day, last_day), plus instant ranges (edges, today) read
+            from sales, which hold fewer rows than a day each
+        """
+        params = {
+            "first_day": ranges["first_day"],
+            "last_day": ranges["last_day"],
+            "user_id": user_id,
+        }
+        edge_conditions = []
+        for index, (lower, upper) in enumerate(ranges["edges"]):
+            params[f"edge_start_{index}"], params[f"edge_end_{index}"] = lower, upper
+            edge_conditions.append(
+                f"(s.created_at >= %(edge_start_{index})s AND s.created_at < %(edge_end_{index})s)"
+            )
+        in_range = " OR ".join(edge_conditions) or "FALSE"
+        in_today = "FALSE"
+        if ranges["today"]:
+            params["today_start"], params["today_end"] = ranges["today"]
+            in_today = "(s.created_at >= %(today_start)s AND s.created_at < %(today_end)s)"
+
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "SELECT payment_method, SUM(sales_count) AS sales_count, "
+                "SUM(items_count) AS items_count, SUM(total) AS total, "
+                "SUM(today_count) AS today_count, SUM(today_total) AS today_total "
+                "FROM ("
+                "  SELECT payment_method, sales_count, items_count, total, "
+                "  0 AS today_count, 0 AS today_total "
+                f"  FROM sales_daily_rollup WHERE {self._store_clause()} "
+                "  AND status = 'completed' "
+                "  AND (%(first_day)s::date IS NULL OR day >= %(first_day)s) "
+                "  AND (%(last_day)s::date IS NULL OR day < %(last_day)s) "
+                "  AND (%(user_id)s::int IS NULL OR user_id = %(user_id)s) "
+                "  UNION ALL "
+                "  SELECT payment_method, in_range::int, "
+                "  CASE WHEN in_range THEN items_count ELSE 0 END, "
+                "  CASE WHEN in_range THEN total ELSE 0 END, "
+                "  in_today::int, CASE WHEN in_today THEN total ELSE 0 END "
+                "  FROM ("
+                "    SELECT COALESCE(s.payment_method, '') AS payment_method, s.total, "
+                "    COALESCE((SELECT SUM(i.quantity) FROM sale_items i "
+                "              WHERE i.sale_id = s.id), 0) AS items_count, "
+                f"    {in_range} AS in_range, {in_today} AS in_today "
+                f"    FROM sales s WHERE {self._store_clause('s')} "
+                "    AND s.status = 'completed' "
+                "    AND (%(user_id)s::int IS NULL OR s.user_id = %(user_id)s) "
+                f"    AND ({in_range} OR {in_today})"
+                "  ) raw"
+                ") parts "
+                "GROUP BY payment_method HAVING SUM(sales_count) > 0 ORDER BY total DESC",
+                params,
+            )
+            return cursor.fetchall()
+
+    def get_analytics(self, bucket: str, start, end, top: int = 10, tz: str = "UTC"):
+        """
+        Completed-sales analytics for [start, end), aggregated in SQL.
+        :param bucket: a date_trunc unit: hour, day or week
+        :param tz: zone whose local hours/days/weeks the buckets follow
+        :return: (timeline, top_products, payment_mix); the timeline has a row
+            for every bucket of the range, empty ones included
+        """
+        params = {"bucket": bucket, "start": start, "end": end, "top": top, "tz": tz}
+        with self._get_cursor() as cursor:
+            # Buckets are cut on local wall time and turned back into instants
+            cursor.execute(
+                "WITH buckets AS ("
+                "  SELECT generate_series("
+                "  date_trunc(%(bucket)s, %(start)s::timestamptz AT TIME ZONE %(tz)s), "
+                "  (%(end)s::timestamptz AT TIME ZONE %(tz)s) - interval '1 microsecond', "
+                "  ('1 ' || %(bucket)s)::interval) AT TIME ZONE %(tz)s AS bucket"
+                "), totals AS ("
+                "  SELECT date_trunc(%(bucket)s, created_at AT TIME ZONE %(tz)s) "
+                "  AT TIME ZONE %(tz)s AS bucket, "
+                "  COUNT(*) AS sales, SUM(total) AS revenue "
+                f"  FROM sales WHERE {self._store_clause()} AND status = 'completed' "
+                "  AND created_at >= %(start)s AND created_at < %(end)s "
+                "  GROUP BY 1"
+                ") "
+                "SELECT b.bucket, COALESCE(t.sales, 0) AS sales, "
+                "COALESCE(t.revenue, 0) AS revenue "
+                "FROM buckets b LEFT JOIN totals t USING (bucket) ORDER BY b.bucket",
+                params,
+            )
+            timeline = cursor.fetchall()
+
+            cursor.execute(
+                "SELECT * FROM ("
+                "  SELECT i.product_id, p.name AS product_name, "
+                "  SUM(i.quantity) AS units, SUM(COALESCE(i.line_total, i.quantity * i.price)) AS revenue, "
+                "  RANK() OVER (ORDER BY SUM(COALESCE(i.line_total, i.quantity * i.price)) DESC) AS rank "
+                "  FROM sale_items i JOIN sales s ON s.id = i.sale_id "
+                "  LEFT JOIN products p ON p.id = i.product_id "
+                f"  WHERE {self._store_clause('s')} AND s.status = 'completed' "
+                "  AND s.created_at >= %(start)s AND s.created_at < %(end)s "
+                "  GROUP BY i.product_id, p.name"
+                ") ranked WHERE rank <= %(top)s ORDER BY rank, product_id",
+                params,
+            )
+            top_products = cursor.fetchall()
 
+            cursor.execute(
+                "SELECT payment_method, COUNT(*) AS sales, SUM(total) AS revenue, "
+                "SUM(total) / NULLIF(SUM(SUM(total)) OVER (), 0) AS share "
+                f"FROM sales WHERE {self._store_clause()} AND status = 'completed' "
+                "AND created_at >= %(start)s AND created_at < %(end)s "
+                "GROUP BY payment_method ORDER BY revenue DESC",
+                params,
+            )
+            payment_mix = cursor.fetchall()
+        return timeline, top_products, payment_mix
+
+    def _existing_products(self, cursor, product_ids: list) -> set:
+        cursor.execute("SELECT id FROM products WHERE id = ANY(%s)", (product_ids,))
+        return {row["id"] for row in cursor.fetchall()}
+
+    def _decrement_stock(self, cursor, quantities: dict, strict=True, store_id=None):
+        """
+        Conditionally take stock for every product of a sale.
+
+        Rows are locked in product id order first, so two checkouts sharing
+        SKUs always queue on the same row instead of deadlocking. The UPDATE
+        only touches rows with enough stock; any shortfall aborts the sale.
+        With strict=False (sales that already happened offline) unknown
+        products are skipped and stock may go negative. Products of another
+        store than `store_id` (default: the repository's) count as unknown.
+        """
+        product_ids = sorted(quantities)
+        cursor.execute(f"SET LOCAL lock_timeout = '{STOCK_LOCK_TIMEOUT}'")
+        cursor.execute(
+            "SELECT id FROM products "
+            f"WHERE id = ANY(%s) AND {self._store_clause(store_id=store_id)} "
+            "ORDER BY id FOR UPDATE",
+            (product_ids,),
+        )
+        missing = set(product_ids) - {row["id"] for row in cursor.fetchall()}
+        if missing and strict:
+            raise HTTPException(
+                status_code=404, detail=f"Products not found: {sorted(missing)}"
+            )
+
+        updated = execute_values(
+            cursor,
+            "UPDATE products AS p SET stock = p.stock - v.qty, last_updated = NOW() "
+            "FROM (VALUES %s) AS v(id, qty) "
+            f"WHERE p.id = v.id AND {self._store_clause('p', store_id)}"
+            + (" AND p.stock >= v.qty" if strict else "")
+            + " RETURNING p.id, p.stock",
+            [(pid, quantities[pid]) for pid in product_ids],
+            template="(%s::int, %s::int)",
+            page_size=len(product_ids),
+            fetch=True,
+        )
+        short = set(product_ids) - missing - {row["id"] for row in updated}
+        if short:
+            raise HTTPException(
+                status_code=409, detail=f"Insufficient stock for products: {sorted(short)}"
+            )
+        scope = {} if store_id is None else {"store_id": store_id}
+        self._notify(
+            cursor, "products.updated", [row["id"] for row in updated], reason="sale", **scope
+        )
+
+    def ensure_partitions(self, months_ahead: int):
+        """Create the monthly sales partitions from this month to `months_ahead` later"""
         with self._get_cursor() as cursor:
+            # Serialized so two workers never create the same partition at once
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('sales_partitions'))")
+            cursor.execute(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'")
             cursor.execute(
-                "INSERT INTO sales (items, total, payment_method, user_id, status, created_at) "
-                "VALUES (%s, %s, %s, %s, %s, %s) RETURNING id",
-                (items, total, payment_method, user_id, status, created_at),
+                "SELECT create_sales_partitions(CURRENT_DATE, %s) AS created",
+                (months_ahead + 1,),
             )
+            created = cursor.fetchone()["created"]
+        self.db.commit()
+        return created
+
+    def find_partitions_before(self, cutoff):
+        """
+        Monthly sales partitions that end on or before `cutoff`, oldest first,
+        as {name, attached}. Detached ones are left over from an archival that
+        was interrupted after the detach and still have to be exported.
+        """
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "SELECT c.relname AS name, c.relispartition AS attached FROM pg_class c "
+                "WHERE c.relnamespace = current_schema()::regnamespace "
+                "AND c.relkind = 'r' "
+                "AND c.relname ~ '^sales_[0-9]{4}_[0-9]{2}$' "
+                "AND (NOT c.relispartition OR EXISTS (SELECT 1 FROM pg_inherits i "
+                "WHERE i.inhrelid = c.oid AND i.inhparent = 'sales'::regclass)) "
+                "AND to_date(substr(c.relname, 7), 'YYYY_MM') + interval '1 month' <= %s "
+                "ORDER BY c.relname",
+                (cutoff,),
+            )
+            return cursor.fetchall()
+
+    def export_partition(self, name: str, sales_file, items_file, attached: bool = True):
+        """
+        Detach one monthly partition and COPY its sales and their items out.
+        Only the detach locks sales, in its own short transaction; the copy
+        reads the detached table. Callers hold the "sales_archive" advisory
+        lock and call drop_partition once the files are safely on disk.
+        :param name: a partition name from find_partitions_before
+        :param attached: False for a partition already detached by an earlier run
+        """
+        try:
+            with self._get_cursor() as cursor:
+                if attached:
+                    cursor.execute(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'")
+                    cursor.execute(f'ALTER TABLE sales DETACH PARTITION "{name}"')
+                    self.db.commit()
+
+                cursor.copy_expert(
+                    f'COPY "{name}" TO STDOUT WITH (FORMAT csv, HEADER)', sales_file
+                )
+                cursor.copy_expert(
+                    f"COPY (SELECT i.* FROM sale_items i JOIN \"{name}\" s "
+                    "ON s.id = i.sale_id ORDER BY i.sale_id, i.line_no) "
+                    "TO STDOUT WITH (FORMAT csv, HEADER)",
+                    items_file,
+                )
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def drop_partition(self, name: str):
+        """Delete a detached partition's sale items and drop it"""
+        try:
+            with self._get_cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM sale_items i USING "{name}" s WHERE i.sale_id = s.id'
+                )
+                cursor.execute(f'DROP TABLE "{name}"')
             self.db.commit()
-            return cursor.fetchone()["id"]
+        except Exception:
+            self.db.rollback()
+            raise
 
     def find_by_id(self, sale_id: int):
         with self._get_cursor() as cursor:
-            cursor.execute("SELECT * FROM sales WHERE id=%s", (sale_id,))
+            cursor.execute(
+                SALE_WITH_ITEMS_SQL + f" WHERE s.id=%s AND {self._store_clause('s')}",
+                (sale_id,),
+            )
             return cursor.fetchone()
 
-    def list_sales(self):
+    def iter_history(self, filters: dict, after=None, limit: int = 100):
+        """
+        Newest-first keyset page of sales with items, streamed from a
+        server-side cursor.
+        :param filters: optional start, end, status, payment_method, user_id
+        :param after: (created_at, id) of the last row of the previous page
+        """
+        conditions = [self._store_clause("s")]
+        params = {}
+        if filters.get("start") is not None:
+            conditions.append("s.created_at >= %(start)s")
+        if filters.get("end") is not None:
+            conditions.append("s.created_at < %(end)s")
+        for field in ("status", "payment_method", "user_id"):
+            if filters.get(field) is not None:
+                conditions.append(f"s.{field} = %({field})s")
+        params.update(filters)
+        if after:
+            conditions.append("(s.created_at, s.id) < (%(after_ts)s, %(after_id)s)")
+            params["after_ts"], params["after_id"] = after
+        params["limit"] = limit
+
+        where = f" WHERE {' AND '.join(conditions)}"
+        with self._get_named_cursor("sales_history", itersize=min(limit, 2000)) as cursor:
+            cursor.execute(
+                SALE_WITH_ITEMS_SQL
+                + where
+                + " ORDER BY s.created_at DESC, s.id DESC LIMIT %(limit)s",
+                params,
+            )
+            yield from cursor
+
+    def recorded_cutoff(self, lag_seconds: int):
+        """DB clock minus `lag_seconds`, a margin on top of find_commit_horizon"""
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "SELECT clock_timestamp() - make_interval(secs => %s) AS cutoff",
+                (lag_seconds,),
+            )
+            return cursor.fetchone()["cutoff"]
+
+    def iter_recorded(self, after=None, until=None, start=None, end=None, itersize: int = 5000):
+        """
+        Stream sales with items by the time they were written (recorded_at),
+        for incremental extracts.
+        :param after: only rows recorded after this; None also includes rows
+            from before recorded_at existed
+        :param until: only rows recorded at or before this
+        :param start: optional created_at lower bound
+        :param end: optional created_at upper bound (exclusive)
+        """
+        conditions = [self._store_clause("s")]
+        if after is not None:
+            conditions.append("s.recorded_at > %(after)s")
+        if until is not None:
+            conditions.append("(s.recorded_at <= %(until)s OR s.recorded_at IS NULL)")
+        if start is not None:
+            conditions.append("s.created_at >= %(start)s")
+        if end is not None:
+            conditions.append("s.created_at < %(end)s")
+        where = f" WHERE {' AND '.join(conditions)}"
+        with self._get_named_cursor("sales_recorded", itersize) as cursor:
+            cursor.execute(
+                SALE_WITH_ITEMS_SQL + where + " ORDER BY s.recorded_at NULLS FIRST, s.id",
+                {"after": after, "until": until, "start": start, "end": end},
+            )
+            yield from cursor
+
+    def iter_all(self, itersize: int = 2000):
+        """Stream every sale through a server-side cursor"""
+        with self._get_named_cursor("sales_export", itersize) as cursor:
+            cursor.execute(
+                SALE_WITH_ITEMS_SQL + f" WHERE {self._store_clause('s')} ORDER BY s.id"
+            )
+            for sale in cursor:
+                # Keep items as a JSON string so CSV rows stay flat
+                sale["items"] = json.dumps(sale["items"])
+                yield sale
+
+    def sales_by_product(self, start=None, end=None):
+        """Units and revenue per product, aggregated from sale_items"""
         with self._get_cursor() as cursor:
-            cursor.execute("SELECT * FROM sales")
+            cursor.execute(
+                "SELECT i.product_id, p.name AS product_name, "
+                "SUM(i.quantity) AS units, SUM(COALESCE(i.line_total, i.quantity * i.price)) AS revenue, "
+                "COUNT(DISTINCT i.sale_id) AS sales "
+                "FROM sale_items i JOIN sales s ON s.id = i.sale_id "
+                "LEFT JOIN products p ON p.id = i.product_id "
+                f"WHERE {self._store_clause('s')} AND s.status = 'completed' "
+                "AND (%(start)s::timestamptz IS NULL OR s.created_at >= %(start)s) "
+                "AND (%(end)s::timestamptz IS NULL OR s.created_at < %(end)s) "
+                "GROUP BY i.product_id, p.name ORDER BY revenue DESC",
+                {"start": start, "end": end},
+            )
             return cursor.fetchall()
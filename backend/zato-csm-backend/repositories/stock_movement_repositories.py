@@ -0,0 +1,183 @@
+from fastapi import HTTPException
+
+from repositories.base_repository import BaseRepository
+
+
+class StockMovementRepository(BaseRepository):
+    """
+    Append-only stock ledger. Rows are written by the record_stock_movement
+    trigger on every products.stock change; stock_snapshots periodically
+    folds them so history queries only read a snapshot plus recent deltas.
+
+    A snapshot covers the movements stamped (created_at) before its
+    covered_until, a commit horizon at the time it was taken. Ids are not
+    used for this: they are drawn in allocation order, and a lower id can
+    commit after a higher one has been folded.
+    """
+
+    def record_movement(
+        self,
+        product_id: int,
+        kind: str,
+        quantity: int,
+        reference: str = None,
+    ):
+        """Apply a relative stock change (restock, receipt, adjustment)"""
+        try:
+            with self._get_cursor() as cursor:
+                self._set_movement_reason(cursor, kind, reference)
+                cursor.execute(
+                    "UPDATE products SET stock = stock + %s, last_updated = NOW() "
+                    f"WHERE id = %s AND {self._store_clause()} AND stock + %s >= 0 "
+                    "RETURNING *",
+                    (quantity, product_id, quantity),
+                )
+                product = cursor.fetchone()
+                if not product:
+                    cursor.execute(
+                        f"SELECT 1 FROM products WHERE id=%s AND {self._store_clause()}",
+                        (product_id,),
+                    )
+                    if not cursor.fetchone():
+                        raise HTTPException(status_code=404, detail="Product not found")
+                    raise HTTPException(status_code=409, detail="Insufficient stock")
+                self._notify(
+                    cursor, "products.updated", [product_id], stock=product["stock"]
+                )
+                self.db.commit()
+                return product
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def find_movements(self, product_id: int, before_id: int = None, limit: int = 100):
+        """Newest-first page of a product's movements"""
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "SELECT * FROM stock_movements WHERE product_id = %s "
+                f"AND {self._store_clause()} AND (%s::bigint IS NULL OR id < %s) ORDER BY id DESC LIMIT %s",
+                (product_id, before_id, before_id, limit),
+            )
+            return cursor.fetchall()
+
+    def sales_by_day(self, since, after, until):
+        """
+        Units sold per product and day from sale movements stamped in
+        [after, until), restricted to days >= `since`.
+        :param after: None to read from `since` on
+        :param until: a commit horizon, so later reads can resume from it
+        """
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "SELECT product_id, created_at::date AS day, -SUM(quantity) AS qty "
+                "FROM stock_movements "
+                f"WHERE kind = 'sale' AND {self._store_clause()} "
+                "AND created_at >= GREATEST(%s::date, %s::timestamptz) AND created_at < %s "
+                "GROUP BY product_id, created_at::date",
+                (since, after, until),
+            )
+            return cursor.fetchall()
+
+    def stock_at(self, product_id: int, at=None):
+        """
+        Stock as of `at` (now when None): latest snapshot plus later deltas.
+        history_from is set once compact() has dropped the movements before
+        the product's oldest snapshot; stock before it cannot be rebuilt.
+        An uncompacted first snapshot always has movements before it.
+        """
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                """
+                WITH snap AS (
+                    SELECT stock, last_movement_id, covered_until FROM stock_snapshots
+                    WHERE product_id = %(pid)s
+                      AND (%(at)s::timestamptz IS NULL OR covered_until <= %(at)s)
+                    ORDER BY covered_until DESC LIMIT 1
+                ), first_snap AS (
+                    SELECT covered_until FROM stock_snapshots
+                    WHERE product_id = %(pid)s
+                    ORDER BY covered_until LIMIT 1
+                )
+                SELECT
+                    COALESCE((SELECT stock FROM snap), 0) + COALESCE(SUM(m.quantity), 0)
+                        AS stock,
+                    (SELECT last_movement_id FROM snap) AS snapshot_movement_id,
+                    COUNT(m.id) AS deltas,
+                    (SELECT f.covered_until FROM first_snap f WHERE NOT EXISTS (
+                        SELECT 1 FROM stock_movements o
+                        WHERE o.product_id = %(pid)s AND o.created_at < f.covered_until
+                    )) AS history_from
+                FROM stock_movements m
+                WHERE m.product_id = %(pid)s
+                  AND m.created_at >= COALESCE(
+                      (SELECT covered_until FROM snap), '-infinity'::timestamptz
+                  )
+                  AND (%(at)s::timestamptz IS NULL OR m.created_at <= %(at)s)
+                """,
+                {"pid": product_id, "at": at},
+            )
+            return cursor.fetchone()
+
+    def take_snapshots(self):
+        """
+        Fold each product's movements stamped between its last snapshot's
+        covered_until and the current commit horizon into a new snapshot.
+        Everything stamped before the horizon has committed, so no movement
+        can show up later inside a range that was already folded.
+        """
+        horizon = self.find_commit_horizon()
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO stock_snapshots
+                    (product_id, last_movement_id, stock, taken_at, covered_until)
+                SELECT m.product_id, MAX(m.id),
+                       COALESCE(s.stock, 0) + SUM(m.quantity), NOW(), %(horizon)s
+                FROM stock_movements m
+                LEFT JOIN LATERAL (
+                    SELECT stock, covered_until FROM stock_snapshots ss
+                    WHERE ss.product_id = m.product_id
+                    ORDER BY covered_until DESC LIMIT 1
+                ) s ON TRUE
+                WHERE m.created_at >= COALESCE(s.covered_until, '-infinity'::timestamptz)
+                  AND m.created_at < %(horizon)s
+                GROUP BY m.product_id, s.stock
+                """,
+                {"horizon": horizon},
+            )
+            count = cursor.rowcount
+            self.db.commit()
+            return count
+
+    def compact(self, retention_days: int):
+        """
+        Drop movements and snapshots older than the retention window once a
+        snapshot covers them; the latest snapshot per product is kept.
+        """
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                """
+                WITH latest AS (
+                    SELECT product_id, MAX(covered_until) AS covered_until
+                    FROM stock_snapshots
+                    WHERE covered_until < NOW() - make_interval(days => %(days)s)
+                    GROUP BY product_id
+                ), moves AS (
+                    DELETE FROM stock_movements m USING latest l
+                    WHERE m.product_id = l.product_id
+                      AND m.created_at < l.covered_until
+                    RETURNING 1
+                ), snaps AS (
+                    DELETE FROM stock_snapshots s USING latest l
+                    WHERE s.product_id = l.product_id
+                      AND s.covered_until < l.covered_until
+                    RETURNING 1
+                )
+                SELECT (SELECT COUNT(*) FROM moves) AS movements,
+                       (SELECT COUNT(*) FROM snaps) AS snapshots
+                """,
+                {"days": retention_days},
+            )
+            result = cursor.fetchone()
+            self.db.commit()
+            return result
@@ -0,0 +1,26 @@
+from repositories.base_repository import BaseRepository
+
+
+class StoreRepository(BaseRepository):
+    """
+    Stores (tenants). Rows always live in the public schema; a store with a
+    schema_name keeps its own products, inventory and sales in that schema.
+    """
+
+    def find_by_id(self, store_id: int):
+        with self._get_cursor() as cursor:
+            cursor.execute("SELECT * FROM stores WHERE id=%s", (store_id,))
+            return cursor.fetchone()
+
+    def find_all(self):
+        with self._get_cursor() as cursor:
+            cursor.execute("SELECT * FROM stores ORDER BY id")
+            return cursor.fetchall()
+
+    def find_schema_names(self):
+        """Dedicated store schemas, in store order"""
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                "SELECT schema_name FROM stores WHERE schema_name IS NOT NULL ORDER BY id"
+            )
+            return [row["schema_name"] for row in cursor.fetchall()]
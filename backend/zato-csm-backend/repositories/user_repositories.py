@@ -1,13 +1,12 @@
 import psycopg2.extras
 
 from repositories.base_repository import BaseRepository
-from utils.timezone_utils import get_current_time_with_timezone
 
 
 class UserRepository(BaseRepository):
     def find_all_users(self):
         with self._get_cursor() as cursor:
-            cursor.execute("SELECT * FROM users")
+            cursor.execute(f"SELECT * FROM users WHERE {self._store_clause()}")
             return cursor.fetchall()
 
     def find_by_email(self, email: str):
@@ -18,7 +17,8 @@ class UserRepository(BaseRepository):
     def find_by_credentials(self, email: str, password: str):
         with self._get_cursor() as cursor:
             cursor.execute(
-                "SELECT id, email, full_name, role FROM users WHERE email=%s AND password=%s",
+                "SELECT id, email, full_name, role, store_id FROM users "
+                "WHERE email=%s AND password=%s",
                 (email, password),
             )
             return cursor.fetchone()
@@ -36,14 +36,10 @@ class UserRepository(BaseRepository):
         phone: str = None,
         address: str = None,
         role: str = "user",
-        user_timezone: str = "UTC",
     ):
-        created_at = get_current_time_with_timezone(user_timezone)
-        last_updated = get_current_time_with_timezone(user_timezone)
-
         with self._get_cursor() as cursor:
             cursor.execute(
-                "INSERT INTO users (full_name, email, password, phone, address, role, created_at, last_updated) VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id",
+                "INSERT INTO users (full_name, email, password, phone, address, role, store_id) VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id",
                 (
                     full_name,
                     email,
@@ -51,14 +47,13 @@ class UserRepository(BaseRepository):
                     phone,
                     address,
                     role,
-                    created_at,
-                    last_updated,
+                    self.write_store_id,
                 ),
             )
             self.db.commit()
             return cursor.fetchone()["id"]
 
-    def update_profile(self, user_id: int, updates: dict, user_timezone: str = "UTC"):
+    def update_profile(self, user_id: int, updates: dict):
         # Validation fields
         allowed_fields = ["full_name", "password", "phone", "address"]
 
@@ -68,16 +63,13 @@ class UserRepository(BaseRepository):
         for field in protect_fields:
             updates.pop(field, None)
 
-        updates["last_updated"] = get_current_time_with_timezone(user_timezone)
-
         with self._get_cursor() as cursor:
             cursor.execute(
-                "UPDATE users SET full_name=%s, phone=%s, address=%s, last_updated=%s WHERE id=%s",
+                "UPDATE users SET full_name=%s, phone=%s, address=%s, last_updated=NOW() WHERE id=%s",
                 (
                     updates.get("full_name"),
                     updates.get("phone"),
                     updates.get("address"),
-                    updates.get("last_updated"),
                     user_id,
                 ),
             )
@@ -4,10 +4,11 @@ from config.database import get_db_connection
 
 from repositories.user_repositories import UserRepository
 from services.auth_service import AuthService
-from utils.dependencies import get_current_token, get_current_user
+from utils.dependencies import get_current_store, get_current_token, get_current_user
+from utils.timezone_utils import LocalTimeRoute
 
 
-router = APIRouter(prefix="/api/auth", tags=["auth"])
+router = APIRouter(prefix="/api/auth", tags=["auth"], route_class=LocalTimeRoute)
 
 
 def _get_auth_service(db=Depends(get_db_connection)) -> AuthService:
@@ -15,6 +16,13 @@ def _get_auth_service(db=Depends(get_db_connection)) -> AuthService:
     return AuthService(auth_repo)
 
 
+def _get_store_auth_service(
+    store=Depends(get_current_store), db=Depends(get_db_connection)
+) -> AuthService:
+    """Same service limited to the users of the caller's store"""
+    return AuthService(UserRepository(db, store["id"]))
+
+
 class LoginRequest(BaseModel):
     email: str
     password: str
@@ -58,7 +66,7 @@ def get_current_user(user=Depends((get_current_user))):
 
 @router.get("/users")
 def list_users(
-    current_user=Depends(get_current_user), auth_service=Depends(_get_auth_service)
+    current_user=Depends(get_current_user), auth_service=Depends(_get_store_auth_service)
 ):
     if not current_user.get("admin"):
         raise HTTPException(status_code=403, detail="Acess denied")
@@ -0,0 +1,49 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+
+from services.event_broker import broker
+from utils.dependencies import get_streaming_store
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+HEARTBEAT_SECONDS = 15
+
+
+@router.get("/stream")
+async def stream_events(
+    request: Request,
+    types: Optional[str] = None,
+    store=Depends(get_streaming_store),
+):
+    """
+    Server-Sent Events feed of catalog, stock and sales changes.
+    :param types: comma separated event prefixes, e.g. "products,sales"
+    """
+    subscription = broker.subscribe(types.split(",") if types else None, store["id"])
+
+    async def event_stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(), HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                if event["type"] == "resync" and subscription.overflowed:
+                    break
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,16 +1,41 @@
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Body, Depends
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
 from config.database import get_db_connection
 from repositories.product_repositories import ProductRepository
+from repositories.inventory_repositories import InventoryRepository
+from repositories.stock_movement_repositories import StockMovementRepository
 from services.inventory_service import InventoryService
-from utils.dependencies import get_current_user
-from utils.timezone_utils import get_user_timezone_from_request
+from services.forecast_service import ForecastService
+from utils.dependencies import get_current_store, get_current_user
+from utils.timezone_utils import LocalTimeRoute
 
-router = APIRouter(prefix="/api/inventory", tags=["inventory"])
+router = APIRouter(prefix="/api/inventory", tags=["inventory"], route_class=LocalTimeRoute)
 
 
-def _get_inventory_service(db=Depends(get_db_connection)) -> InventoryService:
-    product_repo = ProductRepository(db)
-    return InventoryService(product_repo)
+def _get_inventory_service(
+    store=Depends(get_current_store), db=Depends(get_db_connection)
+) -> InventoryService:
+    product_repo = ProductRepository(db, store["id"])
+    inventory_repo = InventoryRepository(db, store["id"])
+    movement_repo = StockMovementRepository(db, store["id"])
+    return InventoryService(product_repo, inventory_repo, movement_repo)
+
+
+def _get_forecast_service(
+    store=Depends(get_current_store), db=Depends(get_db_connection)
+) -> ForecastService:
+    return ForecastService(
+        StockMovementRepository(db, store["id"]), InventoryRepository(db, store["id"])
+    )
+
+
+class StockMovementRequest(BaseModel):
+    product_id: int
+    kind: str
+    quantity: int
+    reference: Optional[str] = None
 
 
 @router.get("")
@@ -21,16 +46,127 @@ def get_inventory(
     return {"success": True, "inventory": inventory}
 
 
+@router.get("/summary")
+def get_inventory_summary(
+    user=Depends(get_current_user), inventory_service=Depends(_get_inventory_service)
+):
+    summary = inventory_service.get_inventory_summary()
+    return {"success": True, "summary": summary}
+
+
+@router.get("/valuation")
+def get_valuation(
+    user=Depends(get_current_user), inventory_service=Depends(_get_inventory_service)
+):
+    valuation = inventory_service.get_valuation()
+    return {"success": True, "valuation": valuation}
+
+
+@router.get("/forecast")
+def get_forecast(
+    window_days: int = 28,
+    lead_time_days: int = 7,
+    review_days: int = 7,
+    service_z: float = 1.65,
+    limit: int = 100,
+    user=Depends(get_current_user),
+    forecast_service=Depends(_get_forecast_service),
+):
+    forecast = forecast_service.get_forecast(
+        window_days, lead_time_days, review_days, service_z, limit
+    )
+    return {"success": True, **forecast}
+
+
+@router.get("/low-stock")
+def get_low_stock(
+    after: int = 0,
+    limit: int = 100,
+    user=Depends(get_current_user),
+    inventory_service=Depends(_get_inventory_service),
+):
+    result = inventory_service.check_low_stock(after, limit)
+    return {"success": True, **result}
+
+
+@router.put("/thresholds")
+def update_thresholds(
+    thresholds: List[dict] = Body(...),
+    user=Depends(get_current_user),
+    inventory_service=Depends(_get_inventory_service),
+):
+    result = inventory_service.update_thresholds(thresholds)
+    return {
+        "success": True,
+        "message": "Thresholds updated successfully",
+        "thresholds": result,
+    }
+
+
+@router.post("/movements")
+def record_movement(
+    payload: StockMovementRequest,
+    user=Depends(get_current_user),
+    inventory_service=Depends(_get_inventory_service),
+):
+    result = inventory_service.record_movement(
+        payload.product_id,
+        payload.kind,
+        payload.quantity,
+        payload.reference,
+    )
+    return {
+        "success": True,
+        "message": "Stock movement recorded",
+        "inventory": result,
+    }
+
+
+@router.post("/stocktake")
+def apply_stocktake(
+    counts: List[dict] = Body(...),
+    user=Depends(get_current_user),
+    inventory_service=Depends(_get_inventory_service),
+):
+    result = inventory_service.apply_stocktake(counts, user)
+    return {
+        "success": True,
+        "message": "Stocktake applied successfully",
+        "stocktake": result,
+    }
+
+
+@router.get("/{product_id}/movements")
+def get_movements(
+    product_id: int,
+    before: Optional[int] = None,
+    limit: int = 100,
+    user=Depends(get_current_user),
+    inventory_service=Depends(_get_inventory_service),
+):
+    result = inventory_service.get_movements(product_id, before, limit)
+    return {"success": True, **result}
+
+
+@router.get("/{product_id}/stock")
+def get_stock_at(
+    product_id: int,
+    at: Optional[datetime] = None,
+    user=Depends(get_current_user),
+    inventory_service=Depends(_get_inventory_service),
+):
+    result = inventory_service.get_stock_at(product_id, at)
+    return {"success": True, "stock": result}
+
+
 @router.put("/{product_id}")
 def update_inventory(
     product_id: int,
     quantity: int,
-    request: Request,
     user=Depends(get_current_user),
     inventory_service=Depends(_get_inventory_service),
 ):
-    user_timezone = get_user_timezone_from_request(request)
-    result = inventory_service.update_stock(product_id, quantity, user_timezone)
+    result = inventory_service.update_stock(product_id, quantity)
     return {
         "success": True,
         "message": "Stock updated successfully",
@@ -1,5 +1,6 @@
 from fastapi import (
     APIRouter,
+    BackgroundTasks,
     Form,
     UploadFile,
     File,
@@ -8,31 +9,36 @@ from fastapi import (
     Body,
     Request,
 )
+from fastapi.responses import FileResponse, Response
 from typing import List, Optional
 import os
 
 from repositories.product_repositories import ProductRepository
-from utils.dependencies import get_current_user
-from config.database import get_db_connection
+from utils.dependencies import get_current_store, get_current_user, get_streaming_store
+from config.database import get_db_connection, use_store_schema
 
 from services.product_service import ProductService
-from utils.timezone_utils import get_user_timezone_from_request
+from services.catalog_import_service import CatalogImportService
+from services.catalog_snapshot_service import CatalogSnapshotService
+from utils.export_utils import export_response
+from utils.timezone_utils import LocalTimeRoute
 
-router = APIRouter(prefix="/api/products", tags=["products"])
+router = APIRouter(prefix="/api/products", tags=["products"], route_class=LocalTimeRoute)
 
 """
 This function aims to create repository and service instance for this Route.
 """
 
 
-def _get_product_service(db=Depends(get_db_connection)) -> ProductService:
-    product_repo = ProductRepository(db)  # postgres is default bank
+def _get_product_service(
+    store=Depends(get_current_store), db=Depends(get_db_connection)
+) -> ProductService:
+    product_repo = ProductRepository(db, store["id"])  # postgres is default bank
     return ProductService(product_repo)
 
 
 @router.post("/")
 def create_product(
-    request: Request,
     name: str = Form(...),
     description: str = Form(...),
     price: float = Form(...),
@@ -42,7 +48,6 @@ def create_product(
     current_user=Depends(get_current_user),
     product_service=Depends(_get_product_service),
 ):
-    user_timezone = get_user_timezone_from_request(request)
     product = product_service.create_product(
         name, description, price, stock, category, images
     )
@@ -53,6 +58,50 @@ def create_product(
     }
 
 
+@router.get("/export")
+def export_products(
+    format: str = "csv",
+    gzip: bool = False,
+    store=Depends(get_streaming_store),
+):
+    return export_response(
+        lambda conn: ProductRepository(
+            use_store_schema(conn, store["schema_name"]), store["id"]
+        ).iter_all(),
+        "products",
+        format,
+        gzip,
+    )
+
+
+@router.get("/changes")
+def get_product_changes(
+    since: Optional[str] = None,
+    limit: int = 500,
+    current_user=Depends(get_current_user),
+    product_service=Depends(_get_product_service),
+):
+    changes = product_service.get_changes(since, limit)
+    return {"success": True, **changes}
+
+
+@router.get("/snapshot")
+def get_catalog_snapshot(request: Request, store=Depends(get_streaming_store)):
+    path, meta = CatalogSnapshotService(store).get_snapshot()
+    etag = f'"{meta["version"]}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "X-Catalog-Version": meta["version"],
+        "X-Sync-Token": meta["sync_token"] or "",
+    }
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=304, headers=headers)
+    # Stored gzipped; clients decode transparently via Content-Encoding
+    headers["Content-Encoding"] = "gzip"
+    return FileResponse(path, media_type="application/x-ndjson", headers=headers)
+
+
 @router.get("/{product_id}")
 def get_product(
     product_id: int,
@@ -63,6 +112,45 @@ def get_product(
     return {"success": True, "message": "Product found", "product": product}
 
 
+@router.post("/import", status_code=202)
+def import_products(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    current_user=Depends(get_current_user),
+    store=Depends(get_current_store),
+):
+    import_service = CatalogImportService(store)
+    job = import_service.start_import(file, format)
+    background_tasks.add_task(import_service.run_import, job["id"])
+    return {"success": True, "message": "Import started", "job": job}
+
+
+@router.get("/import/{job_id}")
+def get_import_status(job_id: str, store=Depends(get_current_store)):
+    return {"success": True, "job": CatalogImportService(store).get_job(job_id)}
+
+
+@router.get("/import/{job_id}/errors")
+def get_import_errors(job_id: str, store=Depends(get_streaming_store)):
+    path = CatalogImportService(store).get_error_file(job_id)
+    return FileResponse(path, media_type="text/csv", filename=f"import-{job_id}-errors.csv")
+
+
+@router.patch("/batch")
+def bulk_update_products(
+    updates: List[dict] = Body(...),
+    current_user=Depends(get_current_user),
+    product_service=Depends(_get_product_service),
+):
+    products = product_service.bulk_update_products(updates)
+    return {
+        "success": True,
+        "message": f"{len(products)} products updated successfully",
+        "products": products,
+    }
+
+
 @router.put("/{product_id}")
 def update_product(
     product_id: int,
@@ -1,17 +1,51 @@
-from config.database import get_db_connection
+from datetime import date, datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from models.sales import SaleResponse, CreateSaleRequest
+from config.database import get_db_connection, use_store_schema
+from config.settings import SALES_GROUP_COMMIT
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
+from models.sales import SaleResponse, CreateSaleRequest, PaymentMethod, SalesStatus
+from services.pricing_service import PricingService
+from services.sales_reporting_service import SalesReportingService
 from services.sales_service import SalesService
-from utils.dependencies import get_current_token, get_current_user
+from utils.dependencies import (
+    get_current_store,
+    get_current_token,
+    get_current_user,
+    get_streaming_store,
+)
+from repositories.product_repositories import ProductRepository
 from repositories.sales_repositories import SalesRepository
+from utils.export_utils import export_response, json_page_response
+from utils.pagination import decode_cursor, encode_cursor
+from utils.timezone_utils import LocalTimeRoute, as_aware
+
+router = APIRouter(prefix="/api/sales", tags=["sales"], route_class=LocalTimeRoute)
 
-router = APIRouter(prefix="/api/sales", tags=["sales"])
 
+def _get_sale_service(
+    store=Depends(get_current_store), db=Depends(get_db_connection)
+) -> SalesService:
+    dedicated = bool(store["schema_name"])
+    sales_repo = SalesRepository(db, store["id"])
+    product_repo = ProductRepository(db, store["id"])
+    pricing = PricingService(product_repo)
+    reporting = SalesReportingService(sales_repo, product_repo, dedicated)
+    return SalesService(
+        sales_repo, pricing, reporting, group_commit=SALES_GROUP_COMMIT and not dedicated
+    )
 
-def _get_sale_service(db=Depends(get_db_connection)) -> SalesService:
-    sales_repo = SalesRepository(db)
-    return SalesService(sales_repo)
+
+def _iter_export_rows(conn, store: dict):
+    use_store_schema(conn, store["schema_name"])
+    sales_repo = SalesRepository(conn, store["id"])
+    reporting = SalesReportingService(
+        sales_repo, ProductRepository(conn, store["id"]), bool(store["schema_name"])
+    )
+    if reporting.available():
+        return reporting.iter_export_rows()
+    return sales_repo.iter_all()
 
 
 @router.post("/", response_model=SaleResponse)
@@ -23,11 +57,92 @@ def create_sale(
     return sales_service.create_sale(sale_data, current_user)
 
 
+@router.post("/batch")
+def create_sales_batch(
+    sales: List[dict] = Body(...),
+    current_user=Depends(get_current_user),
+    sales_service: SalesService = Depends(_get_sale_service),
+):
+    result = sales_service.create_sales_batch(sales, current_user)
+    return {"success": True, **result}
+
+
+@router.get("/export")
+def export_sales(
+    format: str = "csv",
+    gzip: bool = False,
+    store=Depends(get_streaming_store),
+):
+    return export_response(
+        lambda conn: _iter_export_rows(conn, store), "sales", format, gzip
+    )
+
+
+@router.get("/stats")
+def get_sales_stats(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    user_id: Optional[int] = None,
+    current_user=Depends(get_current_user),
+    sales_service: SalesService = Depends(_get_sale_service),
+):
+    stats, by_payment_method = sales_service.get_stats(start, end, user_id)
+    return {"success": True, "stats": stats, "byPaymentMethod": by_payment_method}
+
+
+@router.get("/analytics")
+def get_sales_analytics(
+    bucket: str = Query("day", pattern="^(hour|day|week)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    top: int = Query(10, ge=1, le=100),
+    current_user=Depends(get_current_user),
+    sales_service: SalesService = Depends(_get_sale_service),
+):
+    analytics = sales_service.get_analytics(bucket, start, end, top)
+    return {"success": True, **analytics}
+
+
+@router.get("/by-product")
+def get_sales_by_product(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    current_user=Depends(get_current_user),
+    sales_service: SalesService = Depends(_get_sale_service),
+):
+    products = sales_service.sales_by_product(as_aware(start), as_aware(end))
+    return {"success": True, "products": products}
+
+
 @router.get("/{sale_id}", response_model=SaleResponse)
 def get_sale(sale_id: int, sales_service: SalesService = Depends(_get_sale_service)):
     return sales_service.get_sale(sale_id)
 
 
-@router.get("/", response_model=SaleResponse)
-def get_sales_history(sales_service: SalesService = Depends(_get_sale_service)):
-    return sales_service.history_sales()
+@router.get("/")
+def get_sales_history(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    status: Optional[SalesStatus] = None,
+    payment_method: Optional[PaymentMethod] = None,
+    user_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    store=Depends(get_streaming_store),
+):
+    filters = {
+        "start": as_aware(start),
+        "end": as_aware(end),
+        "status": status.value if status else None,
+        "payment_method": payment_method.value if payment_method else None,
+        "user_id": user_id,
+    }
+    after = decode_cursor(cursor)
+    return json_page_response(
+        lambda conn: SalesRepository(
+            use_store_schema(conn, store["schema_name"]), store["id"]
+        ).iter_history(filters, after, limit + 1),
+        "sales",
+        limit,
+        lambda sale: encode_cursor(sale["created_at"], sale["id"]),
+    )
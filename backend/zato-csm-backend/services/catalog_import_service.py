@@ -0,0 +1,243 @@
+import csv
+import io
+import json
+import os
+import shutil
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from fastapi import HTTPException, UploadFile
+
+from config.database import connect_postgres, use_store_schema
+from config.settings import IMPORT_DIR
+from repositories.import_job_repositories import ImportJobRepository
+from repositories.product_repositories import ProductRepository
+
+IMPORT_FIELDS = ["id", "name", "description", "price", "stock", "category", "images"]
+SUPPORTED_FORMATS = ("csv", "ndjson")
+
+# Largest values the staging and products columns hold: DECIMAL(10,2) and INT
+MAX_PRICE = Decimal("99999999.99")
+MAX_INT = 2**31 - 1
+
+# Progress counters are written to the job row every this many rows
+PROGRESS_ROWS = 5000
+# A job still queued after this long lost its worker before it started
+QUEUED_TIMEOUT_SECONDS = 600
+
+_PRIVATE_JOB_FIELDS = ("source_path", "error_path", "schema_name")
+
+
+class RowError(Exception):
+    """A catalog row that failed validation; recorded in the error file."""
+
+
+class CatalogImportService:
+    """
+    Streams a supplier catalog (CSV or NDJSON) into products.
+
+    The upload is spooled to disk, then parsed and validated one row at a
+    time in a background task. Valid rows are fed straight into COPY, bad
+    rows are appended to a per-job error CSV, so memory stays flat no
+    matter how large the file is. Job state lives in catalog_import_jobs,
+    so any worker can answer a poll; the files stay in IMPORT_DIR, which
+    workers must share.
+    """
+
+    def __init__(self, store: dict = None):
+        """:param store: row of the caller's store; jobs of other stores are not visible"""
+        self.store = store or {"id": None, "schema_name": None}
+
+    def start_import(self, upload: UploadFile, file_format: str = None):
+        file_format = (file_format or self._guess_format(upload.filename)).lower()
+        if file_format not in SUPPORTED_FORMATS:
+            raise HTTPException(
+                status_code=400, detail=f"Unsupported import format: {file_format}"
+            )
+
+        os.makedirs(IMPORT_DIR, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        source_path = os.path.join(IMPORT_DIR, f"{job_id}.{file_format}")
+        with open(source_path, "wb") as f:
+            shutil.copyfileobj(upload.file, f, 1024 * 1024)
+
+        conn = connect_postgres()
+        try:
+            job = ImportJobRepository(conn, self.store["id"]).create(
+                {
+                    "id": job_id,
+                    "schema_name": self.store["schema_name"],
+                    "format": file_format,
+                    "source_path": source_path,
+                    "error_path": os.path.join(IMPORT_DIR, f"{job_id}.errors.csv"),
+                }
+            )
+        finally:
+            conn.close()
+        return self._public(job)
+
+    def get_job(self, job_id: str):
+        return self._public(self._find_job(job_id))
+
+    def get_error_file(self, job_id: str) -> str:
+        path = self._find_job(job_id)["error_path"]
+        if not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="Error file not available yet")
+        return path
+
+    def _find_job(self, job_id: str):
+        conn = connect_postgres()
+        try:
+            job_repo = ImportJobRepository(conn, self.store["id"])
+            job_repo.fail_orphaned(job_id, QUEUED_TIMEOUT_SECONDS)
+            job = job_repo.find_by_id(job_id)
+        finally:
+            conn.close()
+        if not job:
+            raise HTTPException(status_code=404, detail="Import job not found")
+        return job
+
+    def _public(self, job: dict) -> dict:
+        return {k: v for k, v in job.items() if k not in _PRIVATE_JOB_FIELDS}
+
+    def run_import(self, job_id: str):
+        """
+        Background task: validate, COPY and merge. Opens its own connections:
+        one for the import transaction, one to publish progress meanwhile.
+        """
+        jobs_conn = connect_postgres()
+        conn = None
+        job = None
+        job_repo = ImportJobRepository(jobs_conn)
+        try:
+            # Held until this connection closes: tells pollers the runner is alive
+            job_repo.try_advisory_lock(f"catalog_import:{job_id}")
+            job = dict(job_repo.find_by_id(job_id))
+            if not job_repo.start(job_id):
+                return
+            conn = use_store_schema(connect_postgres(), job["schema_name"])
+            source = open(job["source_path"], "r", encoding="utf-8-sig", newline="")
+            errors = open(job["error_path"], "w", encoding="utf-8", newline="")
+            with source, errors:
+                error_writer = csv.writer(errors)
+                error_writer.writerow(["line", "error", "row"])
+                rows = self._iter_rows(source, job["format"])
+                result = ProductRepository(conn, job["store_id"]).import_products(
+                    self._iter_copy_lines(rows, job, error_writer, job_repo)
+                )
+                for unmatched in result["unmatched"]:
+                    error_writer.writerow(
+                        [unmatched["line_no"], f"Product {unmatched['id']} not found", ""]
+                    )
+
+            job["inserted"] = result["inserted"]
+            job["updated"] = result["updated"]
+            job["errors"] += len(result["unmatched"])
+            job["status"] = "completed"
+        except Exception as e:
+            if job is not None:
+                job["status"] = "failed"
+                job["detail"] = str(e)
+        finally:
+            try:
+                if job is not None and job["status"] in ("completed", "failed"):
+                    job_repo.update(job_id, job, finished=True)
+            finally:
+                jobs_conn.close()
+                if conn:
+                    conn.close()
+                if job is not None and os.path.exists(job["source_path"]):
+                    os.remove(job["source_path"])
+
+    def _guess_format(self, filename: str):
+        ext = os.path.splitext(filename or "")[1].lstrip(".").lower()
+        return {"jsonl": "ndjson", "json": "ndjson"}.get(ext, ext or "csv")
+
+    def _iter_rows(self, source, file_format: str):
+        """Yield (line_no, raw_row) pairs; raw_row is a RowError for unparsable lines."""
+        if file_format == "csv":
+            reader = csv.DictReader(source)
+            for raw in reader:
+                yield reader.line_num, raw
+        else:
+            for line_no, line in enumerate(source, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    raw = json.loads(line)
+                    if not isinstance(raw, dict):
+                        raise ValueError("expected a JSON object")
+                except ValueError as e:
+                    raw = RowError(f"Invalid JSON: {e}")
+                yield line_no, raw
+
+    def _iter_copy_lines(self, rows, job: dict, error_writer, job_repo=None):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for line_no, raw in rows:
+            job["processed"] += 1
+            if job_repo is not None and job["processed"] % PROGRESS_ROWS == 0:
+                job_repo.update(job["id"], job)
+            try:
+                if isinstance(raw, RowError):
+                    raise raw
+                row = self._validate_row(raw)
+            except RowError as e:
+                job["errors"] += 1
+                raw_json = "" if isinstance(raw, RowError) else json.dumps(raw, default=str)
+                error_writer.writerow([line_no, str(e), raw_json])
+                continue
+
+            job["valid"] += 1
+            writer.writerow([line_no] + [row[f] for f in IMPORT_FIELDS])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    def _validate_row(self, raw: dict) -> dict:
+        """Apply the same rules as ProductService.create_product/update_product"""
+        # CSV rows with extra values carry them under the key None
+        unknown = next((key for key in raw if key not in IMPORT_FIELDS), False)
+        if unknown is not False:
+            raise RowError(f"Invalid field: {unknown}")
+
+        row = {}
+        for field in IMPORT_FIELDS:
+            value = raw.get(field)
+            if isinstance(value, str):
+                value = value.strip()
+            row[field] = None if value in ("", None) else value
+
+        try:
+            if row["id"] is not None:
+                row["id"] = int(row["id"])
+                if row["id"] <= 0 or row["id"] > MAX_INT:
+                    raise RowError("Invalid product ID")
+            if row["price"] is not None:
+                row["price"] = Decimal(str(row["price"]))
+                if not row["price"].is_finite() or row["price"] <= 0:
+                    raise RowError("Price must be positive")
+                if row["price"] > MAX_PRICE:
+                    raise RowError(f"Price cannot exceed {MAX_PRICE}")
+            if row["stock"] is not None:
+                row["stock"] = int(row["stock"])
+                if row["stock"] < 0:
+                    raise RowError("Stock must be positive")
+                if row["stock"] > MAX_INT:
+                    raise RowError(f"Stock cannot exceed {MAX_INT}")
+        except (ValueError, TypeError, InvalidOperation) as e:
+            raise RowError(f"Invalid number: {e}")
+
+        if isinstance(row["images"], list):
+            row["images"] = ",".join(row["images"])
+
+        if row["id"] is None:
+            # New products need the same fields as create_product
+            for field in ("name", "description", "category", "price", "stock"):
+                if row[field] is None:
+                    raise RowError(f"Missing field: {field}")
+        if row["name"] is not None and len(str(row["name"])) > 255:
+            raise RowError("Name is too long")
+        if row["category"] is not None and len(str(row["category"])) > 100:
+            raise RowError("Category is too long")
+        return row
@@ -0,0 +1,133 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+import psycopg2.extensions
+
+from config.database import connect_postgres, use_store_schema
+from config.settings import SNAPSHOT_DIR, SNAPSHOT_INTERVAL_SECONDS
+from repositories.base_repository import DEFAULT_STORE_ID
+from repositories.product_repositories import ProductRepository
+from repositories.store_repositories import StoreRepository
+from utils.pagination import encode_cursor
+from utils.background import start_periodic
+from utils.export_utils import json_default
+
+SNAPSHOT_META_FILE = "catalog.json"
+
+_build_lock = threading.Lock()
+
+
+class CatalogSnapshotService:
+    """
+    Keeps a gzip NDJSON copy of the whole catalog on disk for terminal cold start.
+
+    A snapshot is tagged with the change-feed token of the newest write it
+    contains; terminals download it once and then follow
+    /api/products/changes?since=<token>. The version id is derived from
+    that token, so it only changes when the catalog does.
+
+    Every store has its own snapshot under SNAPSHOT_DIR/store-<id>.
+    """
+
+    def __init__(self, store: dict = None):
+        self.store = store or {"id": DEFAULT_STORE_ID, "schema_name": None}
+        self.directory = os.path.join(SNAPSHOT_DIR, f"store-{self.store['id']}")
+
+    def get_snapshot(self):
+        """Return (path, metadata) of the current snapshot, building it if missing"""
+        meta = self._read_meta()
+        if meta is None:
+            meta = self.build_snapshot()
+        return os.path.join(self.directory, meta["file"]), meta
+
+    def build_snapshot(self, force: bool = False):
+        """Write a new snapshot if the catalog changed since the last one"""
+        with _build_lock:
+            conn = use_store_schema(connect_postgres(), self.store["schema_name"])
+            try:
+                product_repo = ProductRepository(conn, self.store["id"])
+                # Taken before the snapshot below, so every write stamped
+                # earlier is already in it; the token never skips a late commit
+                horizon = product_repo.find_commit_horizon()
+                conn.commit()
+                # One consistent view for both the version check and the scan
+                conn.set_session(
+                    isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ,
+                    readonly=True,
+                )
+                latest = product_repo.find_latest_change(horizon)
+                token = encode_cursor(*latest) if latest else None
+                version = hashlib.sha1((token or "empty").encode()).hexdigest()[:16]
+
+                meta = self._read_meta()
+                if not force and meta and meta["version"] == version:
+                    return meta
+
+                # Files are named by version so metadata and content never disagree
+                os.makedirs(self.directory, exist_ok=True)
+                filename = f"catalog-{version}.ndjson.gz"
+                tmp_path = os.path.join(self.directory, f".{filename}.{os.getpid()}")
+                count = 0
+                with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+                    for product in product_repo.iter_all():
+                        f.write(json.dumps(product, default=json_default))
+                        f.write("\n")
+                        count += 1
+                conn.rollback()
+
+                meta = {
+                    "version": version,
+                    "file": filename,
+                    "sync_token": token,
+                    "count": count,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                }
+                os.replace(tmp_path, os.path.join(self.directory, filename))
+                self._write_meta(meta)
+                self._remove_old_snapshots(filename)
+                return meta
+            finally:
+                conn.close()
+
+    def _read_meta(self):
+        path = os.path.join(self.directory, SNAPSHOT_META_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(os.path.join(self.directory, meta.get("file", ""))):
+            return None
+        return meta
+
+    def _write_meta(self, meta: dict):
+        path = os.path.join(self.directory, SNAPSHOT_META_FILE)
+        tmp_path = f"{path}.{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    def _remove_old_snapshots(self, current: str):
+        # Downloads already streaming an old file keep their open handle
+        for name in os.listdir(self.directory):
+            if name.startswith("catalog-") and name != current:
+                os.remove(os.path.join(self.directory, name))
+
+
+def start_snapshot_worker():
+    """Background thread that refreshes each store's snapshot when its catalog changes"""
+
+    def build_all():
+        conn = connect_postgres()
+        try:
+            stores = StoreRepository(conn).find_all()
+        finally:
+            conn.close()
+        for store in stores:
+            CatalogSnapshotService(store).build_snapshot()
+
+    return start_periodic("catalog-snapshot", SNAPSHOT_INTERVAL_SECONDS, build_all)
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import select
+import threading
+import time
+
+from config.database import connect_postgres
+from config.settings import EVENTS_CHANNEL, EVENTS_QUEUE_SIZE
+
+
+class Subscription:
+    """One connected client: a bounded queue plus its event filters."""
+
+    def __init__(self, loop, types=None, store_id=None):
+        self.loop = loop
+        self.types = tuple(types or ())
+        self.store_id = store_id
+        self.queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+        self.overflowed = False
+
+    def wants(self, event: dict) -> bool:
+        # Events of other stores are never sent; unscoped ones (resync) are
+        store_id = event.get("store_id")
+        if self.store_id is not None and store_id is not None and store_id != self.store_id:
+            return False
+        if not self.types:
+            return True
+        return event.get("type", "").startswith(self.types)
+
+    def offer(self, event: dict):
+        # Runs on the event loop thread
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow consumer: stop buffering, tell it to resync via the change feed
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+
+
+class EventBroker:
+    """
+    Single LISTEN connection per worker fanned out to in-process subscribers.
+
+    Repositories emit NOTIFY inside their write transactions (see
+    BaseRepository._notify); this thread receives them and hands each event
+    to every matching subscriber's queue on its event loop.
+    """
+
+    def __init__(self, channel: str = EVENTS_CHANNEL):
+        self.channel = channel
+        self._subscribers = set()
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, types=None, store_id=None) -> Subscription:
+        subscription = Subscription(asyncio.get_running_loop(), types, store_id)
+        with self._lock:
+            self._subscribers.add(subscription)
+            self._ensure_listening()
+        return subscription
+
+    def add_listener(self, callback, types=None):
+        """
+        Call `callback(event)` on the listener thread for matching events.
+        Used for in-process cache invalidation; keep callbacks fast.
+        """
+        with self._lock:
+            self._listeners.append((tuple(types or ()), callback))
+            self._ensure_listening()
+
+    def _ensure_listening(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._listen, name="events-listener", daemon=True
+            )
+            self._thread.start()
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _dispatch(self, event: dict):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            listeners = list(self._listeners)
+        for types, callback in listeners:
+            if event["type"] == "resync" or not types or event["type"].startswith(types):
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"Event callback error: {e}")
+        for subscription in subscribers:
+            if subscription.wants(event):
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+
+    def _listen(self):
+        backoff = 1
+        while True:
+            conn = None
+            try:
+                conn = connect_postgres()
+                conn.set_isolation_level(0)  # autocommit, required for LISTEN
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                backoff = 1
+                while True:
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            self._dispatch(json.loads(notify.payload))
+                        except ValueError:
+                            continue
+            except Exception as e:
+                print(f"Event listener error: {e}")
+                # Events were missed while disconnected
+                self._dispatch({"type": "resync"})
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                if conn:
+                    conn.close()
+
+
+broker = EventBroker()
@@ -0,0 +1,199 @@
+import math
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+
+from config.settings import STOCK_MOVEMENT_RETENTION_DAYS
+from repositories.inventory_repositories import InventoryRepository
+from repositories.stock_movement_repositories import StockMovementRepository
+from services.event_broker import broker
+
+# Sale movements older than the ledger retention are compacted into stock
+# snapshots, so a longer window would count days whose sales are gone
+MAX_WINDOW_DAYS = min(365, STOCK_MOVEMENT_RETENTION_DAYS)
+
+
+class _SalesHistory:
+    """
+    Per-worker daily sales per SKU, kept in long format (product_id, day, qty)
+    so only days with sales take memory. Each refresh reads just the sale
+    movements stamped between the previous commit horizon and the current
+    one, so a movement committed late is never skipped.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.daily = pd.DataFrame(
+            {
+                "product_id": pd.Series(dtype="int64"),
+                "day": pd.Series(dtype="datetime64[ns]"),
+                "qty": pd.Series(dtype="float64"),
+            }
+        )
+        self.covered_until = None
+        self.start = None
+        self.results = {}
+
+    def refresh(self, movement_repo: StockMovementRepository, start: date):
+        if self.start is None or start < self.start:
+            # Wider window than what is loaded: reload from scratch
+            self.daily = self.daily.iloc[0:0]
+            self.covered_until = None
+            self.start = start
+
+        horizon = movement_repo.find_commit_horizon()
+        rows = movement_repo.sales_by_day(self.start, self.covered_until, horizon)
+        self.covered_until = horizon
+        if not rows:
+            self._trim(start)
+            return False
+
+        new = pd.DataFrame.from_records(rows)
+        new["day"] = pd.to_datetime(new["day"])
+        new["qty"] = new["qty"].astype("float64")
+        combined = pd.concat([self.daily, new[["product_id", "day", "qty"]]], ignore_index=True)
+        # A day's bucket can arrive in several refreshes; merge it
+        self.daily = combined.groupby(["product_id", "day"], as_index=False)["qty"].sum()
+        self._trim(start)
+        self.results.clear()
+        return True
+
+    def _trim(self, start: date):
+        if start > self.start:
+            self.daily = self.daily[self.daily["day"] >= pd.Timestamp(start)]
+            self.start = start
+            self.results.clear()
+
+
+# One history per store
+_histories = {}
+_histories_lock = threading.Lock()
+
+
+def _get_history(store_id) -> _SalesHistory:
+    with _histories_lock:
+        history = _histories.get(store_id)
+        if history is None:
+            history = _histories[store_id] = _SalesHistory()
+        return history
+
+
+def register_forecast_invalidation():
+    """Stock changes alter days-of-cover; drop computed results (history stays)"""
+
+    def invalidate(event):
+        store_id = event.get("store_id")
+        with _histories_lock:
+            if store_id is None:
+                histories = list(_histories.values())
+            else:
+                histories = [h for s, h in _histories.items() if s == store_id]
+        for history in histories:
+            with history.lock:
+                history.results.clear()
+
+    broker.add_listener(invalidate, ["products", "inventory"])
+
+
+class ForecastService:
+    def __init__(
+        self,
+        movement_repo: StockMovementRepository,
+        inventory_repo: InventoryRepository,
+    ):
+        self.movement_repo = movement_repo
+        self.inventory_repo = inventory_repo
+
+    def get_forecast(
+        self,
+        window_days: int = 28,
+        lead_time_days: int = 7,
+        review_days: int = 7,
+        service_z: float = 1.65,
+        limit: int = 100,
+    ):
+        """
+        Reorder suggestions for every SKU, computed column-wise over all SKUs.
+
+        velocity        mean units sold per day over the window
+        days_of_cover   stock / velocity
+        reorder_qty     velocity * (lead + review) + z * std * sqrt(lead)
+                        (at least min_stock), minus current stock
+        """
+        if window_days <= 0 or window_days > MAX_WINDOW_DAYS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Window must be between 1 and {MAX_WINDOW_DAYS} days",
+            )
+        if lead_time_days < 0 or review_days < 0 or service_z < 0:
+            raise HTTPException(status_code=400, detail="Parameters cannot be negative")
+
+        key = (window_days, lead_time_days, review_days, service_z)
+        start = date.today() - timedelta(days=window_days - 1)
+        history = _get_history(self.movement_repo.store_id)
+        with history.lock:
+            history.refresh(self.movement_repo, start)
+            cached = history.results.get(key)
+            if cached is None:
+                cached = self._compute(history.daily, window_days, *key[1:])
+                history.results[key] = cached
+
+        return {
+            "windowDays": window_days,
+            "leadTimeDays": lead_time_days,
+            "reviewDays": review_days,
+            "totalSkus": len(cached),
+            "items": cached[:limit],
+        }
+
+    def _compute(self, daily, window_days, lead_time_days, review_days, service_z):
+        stock = pd.DataFrame.from_records(
+            self.inventory_repo.find_stock_levels(),
+            columns=["id", "name", "stock", "min_stock"],
+        ).set_index("id")
+        if stock.empty:
+            return []
+
+        # Sum and sum of squares per SKU give mean and std over the whole
+        # window, including days without sales, without a dense SKU x day matrix
+        totals = (
+            daily.assign(qty_sq=daily["qty"] ** 2)
+            .groupby("product_id")[["qty", "qty_sq"]]
+            .sum()
+            .reindex(stock.index, fill_value=0.0)
+        )
+
+        n = float(window_days)
+        velocity = totals["qty"].to_numpy() / n
+        variance = np.maximum(totals["qty_sq"].to_numpy() / n - velocity**2, 0.0)
+        std = np.sqrt(variance)
+
+        on_hand = stock["stock"].to_numpy(dtype="float64")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            days_of_cover = np.where(velocity > 0, on_hand / velocity, np.inf)
+
+        target = velocity * (lead_time_days + review_days) + service_z * std * math.sqrt(
+            lead_time_days
+        )
+        target = np.maximum(target, stock["min_stock"].fillna(0).to_numpy(dtype="float64"))
+        reorder_qty = np.ceil(np.maximum(target - on_hand, 0.0)).astype("int64")
+
+        result = pd.DataFrame(
+            {
+                "productId": stock.index.to_numpy(),
+                "productName": stock["name"].to_numpy(),
+                "stock": stock["stock"].to_numpy(),
+                "velocity": np.round(velocity, 3),
+                "daysOfCover": np.round(days_of_cover, 1),
+                "reorderQuantity": reorder_qty,
+            }
+        ).sort_values(["daysOfCover", "productId"])
+
+        records = result.to_dict("records")
+        for record in records:
+            if math.isinf(record["daysOfCover"]):
+                record["daysOfCover"] = None
+        return records
@@ -1,16 +1,100 @@
+import threading
+
 from fastapi import HTTPException
-from typing import List
-from datetime import datetime
+from typing import List, Optional
+from datetime import datetime, timezone
+from config.database import connect_postgres, use_store_schema
+from config.settings import (
+    STOCK_MOVEMENT_RETENTION_DAYS,
+    STOCK_SNAPSHOT_INTERVAL_SECONDS,
+    VALUATION_REFRESH_SECONDS,
+)
 from repositories.product_repositories import ProductRepository
+from repositories.inventory_repositories import InventoryRepository
+from repositories.stock_movement_repositories import StockMovementRepository
+from repositories.store_repositories import StoreRepository
+from services.event_broker import broker
+from utils.background import start_periodic
+from utils.cache import ScopedCache
+from utils.timezone_utils import as_aware
+
+# Movement kinds clients may post; sales, imports, stocktakes and openings
+# are recorded by their own write paths
+MANUAL_MOVEMENT_KINDS = ("restock", "adjustment", "ocr_receipt")
+
+# Summary per store, shared by every request of this worker; dropped on any
+# stock write to that store
+_summary_cache = ScopedCache(ttl=300)
+
+
+# Set when products change; the valuation refresher rebuilds the view if so
+_valuation_dirty = threading.Event()
+
+
+def register_cache_invalidation():
+    """Drop cached aggregates when any worker commits a product/stock write"""
+    broker.add_listener(
+        lambda event: _summary_cache.invalidate(event.get("store_id")),
+        ["products", "inventory"],
+    )
+    broker.add_listener(lambda event: _valuation_dirty.set(), ["products"])
+
+
+def _snapshot_and_compact_stock():
+    conn = connect_postgres()
+    try:
+        for schema in [None] + StoreRepository(conn).find_schema_names():
+            movement_repo = StockMovementRepository(use_store_schema(conn, schema))
+            movement_repo.take_snapshots()
+            movement_repo.compact(STOCK_MOVEMENT_RETENTION_DAYS)
+    finally:
+        conn.close()
+
+
+def start_stock_snapshot_worker():
+    """Periodically snapshot per-product stock and compact the movement ledger"""
+    return start_periodic(
+        "stock-snapshot", STOCK_SNAPSHOT_INTERVAL_SECONDS, _snapshot_and_compact_stock
+    )
+
+
+def _refresh_valuation_if_dirty():
+    if not _valuation_dirty.is_set():
+        return
+    _valuation_dirty.clear()
+    conn = connect_postgres()
+    try:
+        for schema in [None] + StoreRepository(conn).find_schema_names():
+            if not InventoryRepository(use_store_schema(conn, schema)).refresh_valuation():
+                # Another worker is refreshing; it may have started before our change
+                _valuation_dirty.set()
+    except Exception:
+        _valuation_dirty.set()
+        raise
+    finally:
+        conn.close()
+
+
+def start_valuation_refresher():
+    """Coalesce catalog changes into at most one view refresh per interval"""
+    return start_periodic(
+        "valuation-refresh", VALUATION_REFRESH_SECONDS, _refresh_valuation_if_dirty
+    )
 
 
 class InventoryService:
-    def __init__(self, product_repo: ProductRepository):
+    def __init__(
+        self,
+        product_repo: ProductRepository,
+        inventory_repo: InventoryRepository,
+        movement_repo: StockMovementRepository,
+    ):
         self.product_repo = product_repo
+        self.inventory_repo = inventory_repo
+        self.movement_repo = movement_repo
 
     def get_inventory(self):
-        products = self.product_repo.find_all()
-        inventory = []
+        products = self.inventory_repo.find_all()
 
         return [
             {
@@ -19,58 +103,215 @@ class InventoryService:
                 "productName": p["name"],
                 "quantity": p["stock"],
                 "minStock": p.get("min_stock", 0),
-                "lastUpdated": p.get("last_updated", datetime.now().isoformat() + "Z"),
+                "lastUpdated": p.get("last_updated", datetime.now(timezone.utc)),
             }
             for p in products
         ]
 
-    def update_stock(self, product_id: int, quantity: int, user_timezone: str = "UTC"):
+    def update_stock(self, product_id: int, quantity: int):
         if quantity < 0:
             raise HTTPException(status_code=400, detail="Quantity cannot be negative")
 
         updated_product = self.product_repo.update_product(
-            product_id, {"stock": quantity}, user_timezone
+            product_id, {"stock": quantity}
         )
 
         if not updated_product:
             raise HTTPException(status_code=404, detail="Product not found")
+        _summary_cache.invalidate(self.product_repo.store_id)
 
         return {
             "id": updated_product["id"],
             "productId": updated_product["id"],
             "quantity": updated_product["stock"],
             "lastUpdated": updated_product.get(
-                "last_updated", datetime.now().isoformat() + "Z"
+                "last_updated", datetime.now(timezone.utc)
             ),
         }
 
-    def check_low_stock(self, min_threshold: int = 0):
-        """Function to check low stock products"""
-        products = self.product_repo.find_all()
+    def record_movement(
+        self,
+        product_id: int,
+        kind: str,
+        quantity: int,
+        reference: Optional[str] = None,
+    ):
+        if kind not in MANUAL_MOVEMENT_KINDS:
+            raise HTTPException(status_code=400, detail=f"Invalid movement kind: {kind}")
+        if quantity == 0:
+            raise HTTPException(status_code=400, detail="Quantity cannot be zero")
+        if kind != "adjustment" and quantity < 0:
+            raise HTTPException(status_code=400, detail="Quantity must be positive")
 
-        return [
+        product = self.movement_repo.record_movement(
+            product_id, kind, quantity, reference
+        )
+        _summary_cache.invalidate(self.product_repo.store_id)
+        return {
+            "id": product["id"],
+            "productId": product["id"],
+            "quantity": product["stock"],
+            "lastUpdated": product["last_updated"],
+        }
+
+    def get_movements(self, product_id: int, before_id: Optional[int] = None, limit: int = 100):
+        if limit <= 0 or limit > 1000:
+            raise HTTPException(status_code=400, detail="Limit must be between 1 and 1000")
+        movements = self.movement_repo.find_movements(product_id, before_id, limit)
+        return {
+            "movements": movements,
+            "nextBefore": movements[-1]["id"] if len(movements) == limit else None,
+        }
+
+    def get_stock_at(self, product_id: int, at: Optional[datetime] = None):
+        # Snapshots are keyed by product only; check the product is this store's
+        if not self.product_repo.find_by_id(product_id):
+            raise HTTPException(status_code=404, detail="Product not found")
+        at = as_aware(at)
+        result = self.movement_repo.stock_at(product_id, at)
+        if at is not None and result["history_from"] and at < result["history_from"]:
+            raise HTTPException(
+                status_code=410,
+                detail=f"Stock history compacted before {result['history_from'].isoformat()}",
+            )
+        return {
+            "productId": product_id,
+            "at": at,
+            "quantity": int(result["stock"]),
+            "snapshotMovementId": result["snapshot_movement_id"],
+            "deltasApplied": result["deltas"],
+        }
+
+    def apply_stocktake(self, counts: List[dict], user: dict):
+        """Apply a physical count; every product's stock becomes the counted quantity"""
+        if not counts:
+            raise HTTPException(status_code=400, detail="No counts provided")
+
+        quantities = {}
+        for count in counts:
+            product_id = count.get("product_id")
+            counted = count.get("counted_quantity")
+            if not isinstance(product_id, int) or product_id <= 0:
+                raise HTTPException(status_code=400, detail="Invalid product ID")
+            if not isinstance(counted, int) or counted < 0:
+                raise HTTPException(
+                    status_code=400, detail="Counted quantity cannot be negative"
+                )
+            if product_id in quantities:
+                raise HTTPException(
+                    status_code=400, detail=f"Duplicate product ID: {product_id}"
+                )
+            quantities[product_id] = counted
+
+        stocktake, items = self.inventory_repo.apply_stocktake(
+            quantities, user.get("id")
+        )
+        _summary_cache.invalidate(self.product_repo.store_id)
+        return {
+            "id": stocktake["id"],
+            "itemsCounted": stocktake["items_counted"],
+            "itemsAdjusted": stocktake["items_adjusted"],
+            "totalVariance": stocktake["total_variance"],
+            "createdAt": stocktake["created_at"],
+            "variances": [
+                {
+                    "productId": item["product_id"],
+                    "expected": item["expected"],
+                    "counted": item["counted"],
+                    "variance": item["variance"],
+                }
+                for item in items
+                if item["variance"] != 0
+            ],
+        }
+
+    def get_valuation(self):
+        """Stock value (stock x price) by category plus the overall total"""
+        rows = self.inventory_repo.find_valuation()
+        categories = [
             {
-                "id": p["id"],
-                "productName": p["name"],
-                "currentStock": p["stock"],
-                "minStock": min_threshold,
-                "needRestock": True,
+                "category": row["category"] or None,
+                "products": row["products"],
+                "units": int(row["units"]),
+                "stockValue": float(row["stock_value"]),
             }
-            for p in products
-            if p["stock"] <= min_threshold
+            for row in rows
+            if not row["is_total"]
         ]
+        total = next((row for row in rows if row["is_total"]), None)
+        return {
+            "categories": categories,
+            "total": {
+                "products": total["products"] if total else 0,
+                "units": int(total["units"]) if total else 0,
+                "stockValue": float(total["stock_value"]) if total else 0.0,
+            },
+            "refreshedAt": total["refreshed_at"] if total else None,
+        }
 
-    def get_inventory_summary(self):
-        """Inventory summary functionality"""
-        products = self.product_repo.find_all()
+    def check_low_stock(self, after_id: int = 0, limit: int = 100):
+        """Products at or below their own minimum stock, paginated by product id"""
+        if limit <= 0 or limit > 1000:
+            raise HTTPException(status_code=400, detail="Limit must be between 1 and 1000")
 
-        total_products = len(products)
-        total_stock = sum(p["stock"] for p in products)
-        low_stock_count = len([p for p in products if p["stock"] <= 0])
+        products = self.inventory_repo.find_low_stock(after_id, limit + 1)
+        page = products[:limit]
 
         return {
-            "totalProducts": total_products,
-            "totalStock": total_stock,
-            "lowStockProducts": low_stock_count,
-            "lastUpdated": datetime.now().isoformat() + "Z",
+            "items": [
+                {
+                    "id": p["id"],
+                    "productName": p["name"],
+                    "currentStock": p["stock"],
+                    "minStock": p["min_stock"],
+                    "needRestock": True,
+                }
+                for p in page
+            ],
+            "nextAfter": page[-1]["id"] if len(products) > limit else None,
         }
+
+    def update_thresholds(self, thresholds: List[dict]):
+        """Bulk set per-product min_stock"""
+        if not thresholds:
+            raise HTTPException(status_code=400, detail="No thresholds provided")
+
+        values = {}
+        for threshold in thresholds:
+            product_id = threshold.get("product_id")
+            min_stock = threshold.get("min_stock")
+            if not isinstance(product_id, int) or product_id <= 0:
+                raise HTTPException(status_code=400, detail="Invalid product ID")
+            if not isinstance(min_stock, int) or min_stock < 0:
+                raise HTTPException(
+                    status_code=400, detail="Minimum stock cannot be negative"
+                )
+            values[product_id] = min_stock
+
+        updated = self.inventory_repo.bulk_update_thresholds(
+            list(values.items())
+        )
+        _summary_cache.invalidate(self.product_repo.store_id)
+        return [
+            {
+                "productId": row["product_id"],
+                "minStock": row["min_stock"],
+                "needRestock": row["quantity"] <= row["min_stock"],
+            }
+            for row in updated
+        ]
+
+    def get_inventory_summary(self):
+        """Inventory summary functionality"""
+        cache = _summary_cache.scope(self.product_repo.store_id)
+        summary = cache.get("summary")
+        if summary is None:
+            totals = self.product_repo.get_stock_summary()
+            summary = {
+                "totalProducts": totals["total_products"],
+                "totalStock": int(totals["total_stock"]),
+                "lowStockProducts": self.inventory_repo.count_low_stock(),
+                "lastUpdated": datetime.now(timezone.utc),
+            }
+            cache.set("summary", summary)
+        return summary
@@ -0,0 +1,107 @@
+from decimal import ROUND_HALF_UP, Decimal
+from typing import List
+
+from fastapi import HTTPException
+
+from config.settings import DEFAULT_IVA_RATE
+from repositories.product_repositories import ProductRepository
+
+CENT = Decimal("0.01")
+HUNDRED = Decimal(100)
+
+# Client totals may differ from ours by at most this (float rounding on terminals)
+TOTAL_TOLERANCE = Decimal("0.01")
+
+
+def _money(value) -> Decimal:
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class PricingService:
+    """
+    Server-side prices for sales. Catalog prices include IVA; every line is
+    priced in Decimal and split into its taxable base and IVA amount.
+    """
+
+    def __init__(self, product_repo: ProductRepository):
+        self.product_repo = product_repo
+
+    def load_catalog(self, product_ids) -> dict:
+        """{id: {"price", "iva_rate"}} for all products in one query"""
+        return self.product_repo.find_pricing(sorted(set(product_ids)))
+
+    def price_items(self, items: List[dict], catalog: dict, use_client_prices=False):
+        """
+        Price one sale in a single pass over its lines.
+        :param items: dicts with product_id, quantity, price and optional discount
+            (an amount off the line)
+        :param catalog: result of load_catalog covering every item
+        :param use_client_prices: keep the price each line was sold at (offline
+            sales); unknown products then get DEFAULT_IVA_RATE instead of a 404
+        :return: dict with the priced lines plus subtotal, discount_total,
+            iva_total and total, all Decimal
+        """
+        missing = sorted(
+            {item["product_id"] for item in items if item["product_id"] not in catalog}
+        )
+        if missing and not use_client_prices:
+            raise HTTPException(status_code=404, detail=f"Products not found: {missing}")
+
+        lines = []
+        subtotal = discount_total = iva_total = total = Decimal(0)
+        default_rate = Decimal(DEFAULT_IVA_RATE)
+        for item in items:
+            product = catalog.get(item["product_id"])
+            if use_client_prices or product is None:
+                price = _money(str(item["price"]))
+            else:
+                price = product["price"]
+            rate = product["iva_rate"] if product else default_rate
+            quantity = item["quantity"]
+            discount = _money(str(item.get("discount") or 0))
+            gross = price * quantity
+            if discount > gross:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Discount exceeds line amount for product {item['product_id']}",
+                )
+
+            line_total = gross - discount
+            base = _money(line_total * HUNDRED / (HUNDRED + rate))
+            iva = line_total - base
+            lines.append(
+                {
+                    "product_id": item["product_id"],
+                    "quantity": quantity,
+                    "price": price,
+                    "discount": discount,
+                    "iva_rate": rate,
+                    "iva_amount": iva,
+                    "line_total": line_total,
+                }
+            )
+            subtotal += base
+            discount_total += discount
+            iva_total += iva
+            total += line_total
+
+        return {
+            "items": lines,
+            "subtotal": subtotal,
+            "discount_total": discount_total,
+            "iva_total": iva_total,
+            "total": total,
+        }
+
+    def price_sale(self, items: List[dict], client_total) -> dict:
+        """
+        Price an online sale at current catalog prices and reject it (409)
+        when the terminal's total disagrees, so it can refresh its prices.
+        """
+        priced = self.price_items(items, self.load_catalog(i["product_id"] for i in items))
+        if abs(priced["total"] - _money(str(client_total))) > TOTAL_TOLERANCE:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Total does not match current prices; expected {priced['total']}",
+            )
+        return priced
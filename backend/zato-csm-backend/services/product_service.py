@@ -2,8 +2,14 @@ from fastapi import HTTPException
 from typing import List
 
 from repositories.product_repositories import ProductRepository
+from config.settings import IVA_RATES, UPLOAD_DIR
+from utils.pagination import decode_cursor, encode_cursor
+from utils.static_files import IMAGE_EXTENSIONS
 
+import hashlib
 import os
+import tempfile
+from datetime import datetime
 
 
 class ProductService:
@@ -37,16 +43,32 @@ class ProductService:
         return product
 
     def _process_images(self, images: List):
+        for image in images:
+            ext = os.path.splitext(image.filename or "")[1].lower()
+            if ext not in IMAGE_EXTENSIONS:
+                raise HTTPException(
+                    status_code=400, detail=f"Unsupported image type: {image.filename}"
+                )
+
         image_paths = []
-        upload_dir = "uploads/products/"
+        upload_dir = os.path.join(UPLOAD_DIR, "products")
         os.makedirs(upload_dir, exist_ok=True)
 
         for image in images:
-            ext = os.path.splitext(image.filename)[1]
-            filename = f"product-{int(os.times()[4] * 1000)}-{os.getpid()}{ext}"
-            filepath = os.path.join(upload_dir, filename)
-            with open(filepath, "wb") as f:
-                f.write(image.file.read())
+            ext = os.path.splitext(image.filename)[1].lower()
+            # Name files by content hash so they can be served as immutable
+            digest = hashlib.sha256()
+            tmp = tempfile.NamedTemporaryFile(dir=upload_dir, suffix=".part", delete=False)
+            try:
+                with tmp:
+                    for chunk in iter(lambda: image.file.read(1024 * 1024), b""):
+                        digest.update(chunk)
+                        tmp.write(chunk)
+                filename = f"product-{digest.hexdigest()[:32]}{ext}"
+                os.replace(tmp.name, os.path.join(upload_dir, filename))
+            except Exception:
+                os.remove(tmp.name)
+                raise
             image_paths.append(f"/uploads/products/{filename}")
         return image_paths
 
@@ -69,9 +91,17 @@ class ProductService:
             raise HTTPException(status_code=404, detail="Product not found")
         return product
 
-    def update_product(self, product_id: int, updates: dict):
+    def _validate_updates(self, updates: dict):
         # Validation allowed fields
-        allowed_fields = ["name", "description", "price", "stock", "category", "images"]
+        allowed_fields = [
+            "name",
+            "description",
+            "price",
+            "stock",
+            "category",
+            "images",
+            "iva_rate",
+        ]
 
         for field in updates.keys():
             if field not in allowed_fields:
@@ -81,8 +111,80 @@ class ProductService:
             raise HTTPException(status_code=400, detail="Price must be positive")
         if "stock" in updates and updates["stock"] < 0:
             raise HTTPException(status_code=400, detail="Stock cannot be negative")
+        if "iva_rate" in updates and updates["iva_rate"] not in IVA_RATES:
+            raise HTTPException(
+                status_code=400, detail=f"IVA rate must be one of {list(IVA_RATES)}"
+            )
 
+    def update_product(self, product_id: int, updates: dict):
+        self._validate_updates(updates)
         return self.product_repo.update_product(product_id, updates)
 
+    def bulk_update_products(self, updates: List[dict]):
+        """Validate every update before touching the database, then apply all at once"""
+        if not updates:
+            raise HTTPException(status_code=400, detail="No updates provided")
+
+        seen_ids = set()
+        for update in updates:
+            product_id = update.get("id")
+            if not isinstance(product_id, int) or product_id <= 0:
+                raise HTTPException(status_code=400, detail="Invalid product ID")
+            if product_id in seen_ids:
+                raise HTTPException(
+                    status_code=400, detail=f"Duplicate product ID: {product_id}"
+                )
+            seen_ids.add(product_id)
+
+            fields = {k: v for k, v in update.items() if k != "id"}
+            if not fields:
+                raise HTTPException(
+                    status_code=400, detail=f"No fields to update for product {product_id}"
+                )
+            self._validate_updates(fields)
+
+        return self.product_repo.bulk_update_products(updates)
+
     def delete_product(self, product_id):
         return self.product_repo.delete_product(product_id)
+
+    def get_changes(self, since: str = None, limit: int = 500):
+        """
+        Incremental catalog feed for POS clients.
+        :param since: opaque token from a previous response; None for a full sync
+        :param limit: max number of changes (updates + deletions) returned
+        :return: changed products, deleted ids and the token for the next call
+        """
+        if limit <= 0 or limit > 5000:
+            raise HTTPException(status_code=400, detail="Limit must be between 1 and 5000")
+        since_ts, since_id = decode_cursor(since, (datetime.min, 0))
+        # Rows at or past the horizon may still be joined by slower writers
+        # stamped before them; they are handed out once it moves past them
+        horizon = self.product_repo.find_commit_horizon()
+
+        # Both sources are ordered by (timestamp, id); merge and keep the first
+        # `limit`. One extra row from each tells whether another page exists.
+        changed = [
+            (p["last_updated"], p["id"], p)
+            for p in self.product_repo.find_changed_since(
+                since_ts, since_id, limit + 1, horizon
+            )
+        ]
+        deleted = [
+            (t["deleted_at"], t["id"], None)
+            for t in self.product_repo.find_deleted_since(
+                since_ts, since_id, limit + 1, horizon
+            )
+        ]
+        merged = sorted(changed + deleted, key=lambda c: (c[0], c[1]))
+        page = merged[:limit]
+
+        next_token = since
+        if page:
+            next_token = encode_cursor(page[-1][0], page[-1][1])
+        return {
+            "products": [p for _, _, p in page if p is not None],
+            "deleted": [product_id for _, product_id, p in page if p is None],
+            "next_token": next_token,
+            "has_more": len(merged) > limit,
+        }
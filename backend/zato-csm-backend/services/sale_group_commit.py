@@ -0,0 +1,86 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from config.database import connect_postgres
+from config.settings import SALES_GROUP_COMMIT_MAX_BATCH, SALES_GROUP_COMMIT_WINDOW_MS
+from repositories.sales_repositories import SalesRepository
+
+
+class SaleGroupCommitter:
+    """
+    Coalesces checkouts arriving within a few milliseconds of each other into
+    one transaction, so a burst of sales pays for one commit instead of one each.
+
+    Request threads call submit() and block until their sale's group has been
+    committed. A single writer thread owns its own connection; because it is
+    the only writer of grouped sales, groups are applied one after another.
+    """
+
+    def __init__(self, window_ms=SALES_GROUP_COMMIT_WINDOW_MS, max_batch=SALES_GROUP_COMMIT_MAX_BATCH):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._conn = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, sale: dict):
+        """
+        Queue one sale and wait for its outcome.
+        :param sale: items, total, payment_method, user_id, status, stock_quantities
+        :return: the inserted sales row; stock errors are re-raised as HTTPException
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((sale, future))
+        return future.result()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="sale-group-commit", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            group = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(group) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    group.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(group)
+
+    def _commit(self, group):
+        futures = [future for _, future in group]
+        try:
+            if self._conn is None or self._conn.closed:
+                self._conn = connect_postgres()
+            results = SalesRepository(self._conn).create_sales_group(
+                [sale for sale, _ in group]
+            )
+        except Exception as e:
+            # The whole group failed (connection lost, lock timeout): all callers
+            # see it; a dropped connection is reopened for the next group
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        for future, result in zip(futures, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+committer = SaleGroupCommitter()
@@ -0,0 +1,107 @@
+import gzip
+import os
+from datetime import date
+
+from config.database import connect_postgres, use_store_schema
+from config.settings import (
+    SALES_ARCHIVE_DIR,
+    SALES_PARTITION_INTERVAL_SECONDS,
+    SALES_PARTITIONS_AHEAD,
+    SALES_RETENTION_MONTHS,
+)
+from repositories.sales_repositories import SalesRepository
+from repositories.store_repositories import StoreRepository
+from utils.background import start_periodic
+
+
+def _retention_cutoff(today: date, months: int) -> date:
+    """First day of the month `months` before today's month"""
+    index = today.year * 12 + today.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _fsync(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def archive_partition(
+    sales_repo: SalesRepository, name: str, schema: str = None, attached: bool = True
+):
+    """
+    Export one partition to SALES_ARCHIVE_DIR/<name>.csv.gz (plus
+    <name>_items.csv.gz) and drop it. Files are written under a temporary
+    name, synced and renamed into place before the partition is dropped, so
+    a crash leaves either the rows in the database or a complete archive.
+    Partitions of a store schema are prefixed with it (<schema>.<name>).
+    :return: False if another worker is archiving right now
+    """
+    if not sales_repo.try_advisory_lock("sales_archive"):
+        return False
+    try:
+        os.makedirs(SALES_ARCHIVE_DIR, exist_ok=True)
+        prefix = f"{schema}.{name}" if schema else name
+        paths = [
+            os.path.join(SALES_ARCHIVE_DIR, f"{prefix}.csv.gz"),
+            os.path.join(SALES_ARCHIVE_DIR, f"{prefix}_items.csv.gz"),
+        ]
+        tmp_paths = [path + ".tmp" for path in paths]
+        try:
+            with gzip.open(tmp_paths[0], "wb") as sales_file, gzip.open(
+                tmp_paths[1], "wb"
+            ) as items_file:
+                sales_repo.export_partition(name, sales_file, items_file, attached)
+            for tmp in tmp_paths:
+                _fsync(tmp)
+        except Exception:
+            for tmp in tmp_paths:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+            raise
+
+        for tmp, path in zip(tmp_paths, paths):
+            os.replace(tmp, path)
+        _fsync(SALES_ARCHIVE_DIR)
+        # Failing from here on leaves a detached partition, which the next
+        # run exports again over the same files
+        sales_repo.drop_partition(name)
+        return True
+    finally:
+        sales_repo.advisory_unlock("sales_archive")
+
+
+def _maintain_schema(sales_repo: SalesRepository, schema: str = None):
+    sales_repo.ensure_partitions(SALES_PARTITIONS_AHEAD)
+    if SALES_RETENTION_MONTHS <= 0:
+        return
+    cutoff = _retention_cutoff(date.today(), SALES_RETENTION_MONTHS)
+    for partition in sales_repo.find_partitions_before(cutoff):
+        if not archive_partition(sales_repo, partition["name"], schema, partition["attached"]):
+            # Another worker holds the archive lock; it will carry on
+            break
+        print(f"Archived sales partition {schema or 'public'}.{partition['name']}")
+
+
+def _maintain_sales_partitions():
+    conn = connect_postgres()
+    try:
+        # The shared schema, then every store kept in its own schema; one
+        # store failing is reported and does not hold the others back
+        for schema in [None] + StoreRepository(conn).find_schema_names():
+            try:
+                _maintain_schema(SalesRepository(use_store_schema(conn, schema)), schema)
+            except Exception as e:
+                conn.rollback()
+                print(f"Sales partition maintenance failed for {schema or 'public'}: {e}")
+    finally:
+        conn.close()
+
+
+def start_sales_partition_worker():
+    """Keep future monthly partitions created and archive expired ones"""
+    return start_periodic(
+        "sales-partitions", SALES_PARTITION_INTERVAL_SECONDS, _maintain_sales_partitions
+    )
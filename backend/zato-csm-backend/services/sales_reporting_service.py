@@ -0,0 +1,489 @@
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from config.database import connect_postgres
+from config.settings import (
+    PARQUET_DIR,
+    PARQUET_EXPORT_INTERVAL_SECONDS,
+    PARQUET_EXPORT_LAG_SECONDS,
+    PARQUET_SNAPSHOTS,
+)
+from repositories.product_repositories import ProductRepository
+from repositories.sales_repositories import SalesRepository
+from utils.background import start_periodic
+from utils.timezone_utils import get_zone
+
+SALES_SCHEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("store_id", pa.int64()),
+        ("total", pa.float64()),
+        ("payment_method", pa.string()),
+        ("user_id", pa.int64()),
+        ("status", pa.string()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+        ("subtotal", pa.float64()),
+        ("discount_total", pa.float64()),
+        ("iva_total", pa.float64()),
+        (
+            "items",
+            pa.list_(
+                pa.struct(
+                    [
+                        ("product_id", pa.int64()),
+                        ("quantity", pa.int64()),
+                        ("price", pa.float64()),
+                        ("discount", pa.float64()),
+                        ("iva_rate", pa.float64()),
+                        ("iva_amount", pa.float64()),
+                        ("line_total", pa.float64()),
+                    ]
+                )
+            ),
+        ),
+    ]
+)
+
+# Numeric columns psycopg2 returns as Decimal
+DECIMAL_COLUMNS = ("total", "subtotal", "discount_total", "iva_total")
+
+MANIFEST_FILE = "_manifest.json"
+
+# Bumped when stored files stop matching SALES_SCHEMA; older stores are rebuilt
+# (version 2: created_at is a UTC instant instead of naive wall time;
+# version 3: store_id column)
+MANIFEST_VERSION = 3
+
+# Rows converted to Arrow per step while exporting
+EXPORT_BATCH_ROWS = 50_000
+
+BUCKET_STEPS = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+
+_export_lock = threading.Lock()
+
+
+def _to_table(rows) -> pa.Table:
+    """Sales rows (with items lists) from SalesRepository as an Arrow table"""
+    columns = {name: [] for name in SALES_SCHEMA.names}
+    for row in rows:
+        for name in SALES_SCHEMA.names:
+            columns[name].append(row[name])
+    for name in DECIMAL_COLUMNS:
+        columns[name] = [None if v is None else float(v) for v in columns[name]]
+    return pa.table(columns, schema=SALES_SCHEMA)
+
+
+def _month_of(path: str) -> str:
+    # Paths look like "month=2025-03/part-<run>.parquet"
+    return path.split("/", 1)[0][len("month="):]
+
+
+def _utc_month(ts: datetime) -> str:
+    return ts.astimezone(timezone.utc).strftime("%Y-%m")
+
+
+def _floor(ts: datetime, bucket: str) -> datetime:
+    """Python twin of date_trunc for hour/day/week (weeks start on Monday)"""
+    ts = ts.replace(minute=0, second=0, microsecond=0)
+    if bucket == "hour":
+        return ts
+    ts = ts.replace(hour=0)
+    if bucket == "week":
+        ts -= timedelta(days=ts.weekday())
+    return ts
+
+
+class ParquetSalesStore:
+    """
+    Sales and their items as Parquet files under PARQUET_DIR/sales, one
+    directory per month of created_at.
+
+    Each export appends a part file per touched month with the sales
+    recorded since the previous one. _manifest.json lists the live files and
+    the watermark (recorded_at) they cover; readers only trust listed files,
+    so a crashed export or a compaction in progress is never seen.
+    """
+
+    def __init__(self, root: str = PARQUET_DIR):
+        self.root = os.path.join(root, "sales")
+
+    def read_manifest(self):
+        try:
+            with open(os.path.join(self.root, MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        # Files of an older layout are left unlisted and exported again
+        return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+    def _write_manifest(self, manifest: dict):
+        manifest["version"] = MANIFEST_VERSION
+        path = os.path.join(self.root, MANIFEST_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+
+    def export_increment(self, sales_repo: SalesRepository) -> int:
+        """Append the sales recorded since the last export; returns rows written"""
+        manifest = self.read_manifest() or {"watermark": None, "files": []}
+        after = (
+            datetime.fromisoformat(manifest["watermark"]) if manifest["watermark"] else None
+        )
+        # recorded_at is stamped at insert, so a transaction still open can
+        # commit rows recorded before the lag cutoff; stop at the oldest one
+        cutoff = min(
+            sales_repo.find_commit_horizon(),
+            sales_repo.recorded_cutoff(PARQUET_EXPORT_LAG_SECONDS),
+        )
+        if after and cutoff <= after:
+            return 0
+
+        run = uuid.uuid4().hex[:12]
+        writers = {}
+        written = 0
+        try:
+            rows = sales_repo.iter_recorded(after=after, until=cutoff)
+            while True:
+                batch = list(islice(rows, EXPORT_BATCH_ROWS))
+                if not batch:
+                    break
+                table = _to_table(batch)
+                months = pc.strftime(table["created_at"], format="%Y-%m")
+                for month in pc.unique(months).to_pylist():
+                    if month not in writers:
+                        relative = f"month={month}/part-{run}.parquet"
+                        os.makedirs(os.path.join(self.root, f"month={month}"), exist_ok=True)
+                        writers[month] = (
+                            relative,
+                            pq.ParquetWriter(
+                                os.path.join(self.root, relative),
+                                SALES_SCHEMA,
+                                compression="zstd",
+                            ),
+                        )
+                    writers[month][1].write_table(table.filter(pc.equal(months, month)))
+                written += table.num_rows
+        except Exception:
+            for relative, writer in writers.values():
+                writer.close()
+                os.remove(os.path.join(self.root, relative))
+            raise
+        for _, writer in writers.values():
+            writer.close()
+
+        os.makedirs(self.root, exist_ok=True)
+        self._write_manifest(
+            {
+                "watermark": cutoff.isoformat(),
+                "files": manifest["files"] + [relative for relative, _ in writers.values()],
+            }
+        )
+        return written
+
+    def compact(self, open_months: int = 2):
+        """
+        Merge the part files of each month older than the last `open_months`
+        into one file, so scans of old months open a single file.
+        """
+        manifest = self.read_manifest()
+        if manifest is None:
+            return
+        today = datetime.now(timezone.utc)
+        index = today.year * 12 + today.month - open_months
+        oldest_open = f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+        by_month = {}
+        for relative in manifest["files"]:
+            by_month.setdefault(_month_of(relative), []).append(relative)
+        for month, files in sorted(by_month.items()):
+            if len(files) < 2 or month >= oldest_open:
+                continue
+            table = ds.dataset(
+                [os.path.join(self.root, f) for f in files],
+                schema=SALES_SCHEMA,
+                format="parquet",
+            ).to_table()
+            relative = f"month={month}/compact-{uuid.uuid4().hex[:12]}.parquet"
+            pq.write_table(
+                table.sort_by("id"), os.path.join(self.root, relative), compression="zstd"
+            )
+            manifest["files"] = [f for f in manifest["files"] if f not in files]
+            manifest["files"].append(relative)
+            self._write_manifest(manifest)
+            for f in files:
+                os.remove(os.path.join(self.root, f))
+
+    def _dataset(self, manifest, start, end, completed_only, store_id):
+        """Dataset over the manifest's files that may hold [start, end), and its row filter"""
+        # Month directories are UTC months
+        files = [
+            os.path.join(self.root, f)
+            for f in manifest["files"]
+            if (start is None or _month_of(f) >= _utc_month(start))
+            and (end is None or _month_of(f) <= _utc_month(end))
+        ]
+        created_at = SALES_SCHEMA.field("created_at").type
+        conditions = []
+        if start is not None:
+            conditions.append(ds.field("created_at") >= pa.scalar(start, created_at))
+        if end is not None:
+            conditions.append(ds.field("created_at") < pa.scalar(end, created_at))
+        if completed_only:
+            conditions.append(ds.field("status") == "completed")
+        if store_id is not None:
+            conditions.append(ds.field("store_id") == store_id)
+        condition = None
+        for c in conditions:
+            condition = c if condition is None else condition & c
+        return ds.dataset(files, schema=SALES_SCHEMA, format="parquet"), condition
+
+    def scan(self, start=None, end=None, columns=None, completed_only=False, store_id=None):
+        """
+        Read exported sales with created_at in [start, end), of one store
+        when `store_id` is given.
+        :return: (table, watermark), or (None, None) before the first export
+        """
+        for attempt in range(2):
+            manifest = self.read_manifest()
+            if manifest is None or manifest["watermark"] is None:
+                return None, None
+            dataset, condition = self._dataset(manifest, start, end, completed_only, store_id)
+            try:
+                table = dataset.to_table(columns=columns, filter=condition)
+            except FileNotFoundError:
+                # A compaction replaced a file after we read the manifest
+                if attempt:
+                    raise
+                continue
+            return table, datetime.fromisoformat(manifest["watermark"])
+
+    def scan_batches(
+        self,
+        start=None,
+        end=None,
+        columns=None,
+        completed_only=False,
+        store_id=None,
+        batch_size: int = 2000,
+    ):
+        """
+        Same rows as scan, read lazily: only one batch is held in memory.
+        :return: (iterator of record batches, watermark), or (None, None)
+            before the first export
+        """
+        manifest = self.read_manifest()
+        if manifest is None or manifest["watermark"] is None:
+            return None, None
+
+        def batches():
+            current = manifest
+            for attempt in range(2):
+                dataset, condition = self._dataset(
+                    current, start, end, completed_only, store_id
+                )
+                yielded = False
+                try:
+                    for batch in dataset.to_batches(
+                        columns=columns, filter=condition, batch_size=batch_size
+                    ):
+                        yielded = True
+                        yield batch
+                    return
+                except FileNotFoundError:
+                    # A compaction replaced a file after we read the manifest.
+                    # Compaction keeps the watermark, so the scan can start over
+                    # on the new files unless some rows were already sent.
+                    current = self.read_manifest()
+                    if attempt or yielded or current["watermark"] != manifest["watermark"]:
+                        raise
+
+        return batches(), datetime.fromisoformat(manifest["watermark"])
+
+
+def _export_parquet():
+    with _export_lock:
+        conn = connect_postgres()
+        try:
+            sales_repo = SalesRepository(conn)
+            # One exporter across all workers
+            if not sales_repo.try_advisory_lock("sales_parquet"):
+                return
+            try:
+                store = ParquetSalesStore()
+                written = store.export_increment(sales_repo)
+                conn.commit()
+                store.compact()
+                if written:
+                    print(f"Exported {written} sales to Parquet")
+            finally:
+                sales_repo.advisory_unlock("sales_parquet")
+        finally:
+            conn.close()
+
+
+def start_parquet_exporter():
+    """Periodically append new sales to the Parquet store (if enabled)"""
+    if not PARQUET_SNAPSHOTS:
+        return None
+    return start_periodic(
+        "sales-parquet", PARQUET_EXPORT_INTERVAL_SECONDS, _export_parquet
+    )
+
+
+class SalesReportingService:
+    """
+    Answers sales reports from the Parquet store with columnar scans. Only
+    sales recorded after the store's watermark (the last few minutes) are
+    read from Postgres and appended before aggregating.
+
+    The exporter reads the public schema, so shops kept in a dedicated
+    schema (dedicated_schema=True) are always answered from Postgres.
+    """
+
+    def __init__(
+        self,
+        sales_repo: SalesRepository,
+        product_repo: ProductRepository,
+        dedicated_schema: bool = False,
+    ):
+        self.sales_repo = sales_repo
+        self.product_repo = product_repo
+        self.dedicated_schema = dedicated_schema
+        self.store = ParquetSalesStore()
+
+    def available(self) -> bool:
+        if not PARQUET_SNAPSHOTS or self.dedicated_schema:
+            return False
+        manifest = self.store.read_manifest()
+        return manifest is not None and manifest["watermark"] is not None
+
+    def _load(self, start, end, completed_only=False):
+        table, watermark = self.store.scan(
+            start, end, completed_only=completed_only, store_id=self.sales_repo.store_id
+        )
+        recent = _to_table(
+            self.sales_repo.iter_recorded(after=watermark, start=start, end=end)
+        )
+        if completed_only:
+            recent = recent.filter(pc.equal(recent["status"], "completed"))
+        return pa.concat_tables([table, recent])
+
+    def get_analytics(self, bucket: str, start, end, top: int = 10, tz: str = "UTC"):
+        """Same rows as SalesRepository.get_analytics, computed from Parquet"""
+        table = self._load(start, end, completed_only=True)
+
+        totals = {}
+        if table.num_rows:
+            # Retagging the column with the zone makes floor_temporal cut on
+            # local wall time, the whole column at once
+            local = table["created_at"].cast(pa.timestamp("us", tz=tz))
+            buckets = pc.floor_temporal(local, unit=bucket)
+            grouped = (
+                pa.table({"bucket": buckets, "total": table["total"]})
+                .group_by("bucket")
+                .aggregate([("total", "count"), ("total", "sum")])
+            )
+            totals = {row["bucket"]: row for row in grouped.to_pylist()}
+        timeline = []
+        current = _floor(start.astimezone(get_zone(tz)), bucket)
+        while current < end:
+            row = totals.get(current)
+            timeline.append(
+                {
+                    "bucket": current,
+                    "sales": row["total_count"] if row else 0,
+                    "revenue": row["total_sum"] if row else 0,
+                }
+            )
+            current += BUCKET_STEPS[bucket]
+
+        top_products = []
+        items = table["items"].combine_chunks() if table.num_rows else None
+        if items is not None and len(pc.list_flatten(items)):
+            lines = pc.list_flatten(items)
+            per_product = (
+                pa.table(
+                    {
+                        "product_id": lines.field("product_id"),
+                        "units": lines.field("quantity"),
+                        # line_total is net of discounts; older lines lack it
+                        "revenue": pc.coalesce(
+                            lines.field("line_total"),
+                            pc.multiply(
+                                pc.cast(lines.field("quantity"), pa.float64()),
+                                lines.field("price"),
+                            ),
+                        ),
+                    }
+                )
+                .group_by("product_id")
+                .aggregate([("units", "sum"), ("revenue", "sum")])
+                .sort_by([("revenue_sum", "descending"), ("product_id", "ascending")])
+            )
+            # RANK(): ties share a rank, the next rank skips
+            previous, rank = None, 0
+            for position, row in enumerate(per_product.to_pylist(), start=1):
+                if row["revenue_sum"] != previous:
+                    rank, previous = position, row["revenue_sum"]
+                if rank > top:
+                    break
+                top_products.append(
+                    {
+                        "product_id": row["product_id"],
+                        "units": row["units_sum"],
+                        "revenue": row["revenue_sum"],
+                        "rank": rank,
+                    }
+                )
+            names = self.product_repo.find_names([p["product_id"] for p in top_products])
+            for product in top_products:
+                product["product_name"] = names.get(product["product_id"])
+
+        payment_mix = []
+        if table.num_rows:
+            mix = (
+                table.select(["payment_method", "total"])
+                .group_by("payment_method")
+                .aggregate([("total", "count"), ("total", "sum")])
+                .sort_by([("total_sum", "descending")])
+            )
+            revenue = pc.sum(mix["total_sum"]).as_py() or 0
+            payment_mix = [
+                {
+                    "payment_method": row["payment_method"],
+                    "sales": row["total_count"],
+                    "revenue": row["total_sum"],
+                    "share": row["total_sum"] / revenue if revenue else None,
+                }
+                for row in mix.to_pylist()
+            ]
+        return timeline, top_products, payment_mix
+
+    def iter_export_rows(self, batch_rows: int = 2000):
+        """
+        Every sale for /api/sales/export: Parquet batches as they are read,
+        then recent rows
+        """
+        batches, watermark = self.store.scan_batches(
+            store_id=self.sales_repo.store_id, batch_size=batch_rows
+        )
+        for batch in batches:
+            for sale in batch.to_pylist():
+                sale["items"] = json.dumps(sale["items"])
+                yield sale
+        for sale in self.sales_repo.iter_recorded(after=watermark):
+            sale["items"] = json.dumps(sale["items"])
+            yield sale
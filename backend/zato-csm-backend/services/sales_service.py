@@ -1,38 +1,344 @@
+from datetime import date, datetime, time, timedelta, timezone
+
 from fastapi import HTTPException
-from typing import List
-from models.sales import CreateSaleRequest, SaleResponse
+from pydantic import ValidationError
+from typing import List, Optional
+from models.sales import (
+    CreateSaleRequest,
+    OfflineSaleRequest,
+    SaleResponse,
+    SalesStatus,
+)
+from config.settings import SALES_GROUP_COMMIT
 from repositories.sales_repositories import SalesRepository
-import json
+from services.event_broker import broker
+from services.pricing_service import PricingService
+from services.sale_group_commit import committer
+from services.sales_reporting_service import SalesReportingService
+from utils.cache import ScopedCache
+from utils.timezone_utils import as_aware, get_request_zone, get_request_zone_name
+
+
+MAX_BATCH_SALES = 1000
+
+# Longest range per bucket size, so a timeline stays a few thousand points
+ANALYTICS_MAX_RANGE = {
+    "hour": timedelta(days=93),
+    "day": timedelta(days=3 * 366),
+    "week": timedelta(days=10 * 366),
+}
+
+# Analytics per store and (bucket, start, end, top, zone); a store's entries
+# are dropped whenever one of its sales is stored
+_analytics_cache = ScopedCache(ttl=600)
+
+
+def _local_midnight(day: date, zone) -> datetime:
+    return datetime.combine(day, time.min, zone).astimezone(timezone.utc)
+
+
+def _utc_midnight(day: date) -> datetime:
+    return datetime.combine(day, time.min, timezone.utc)
+
+
+def stats_ranges(start: date, end: date, zone, now: datetime) -> dict:
+    """
+    Split the local days [start, end] of `zone` into what the UTC-day
+    rollup can answer and what must be read from sales.
+    :return: first_day/last_day (UTC rollup days, last exclusive; None is
+        unbounded), edges (instant ranges at either end not covering a whole
+        UTC day) and today (the local day of `now`, within the range, or None)
+    """
+    lower = _local_midnight(start, zone) if start else None
+    upper = _local_midnight(end + timedelta(days=1), zone) if end else None
+
+    first_day = last_day = None
+    if lower is not None:
+        first_day = lower.date()
+        if lower > _utc_midnight(first_day):
+            first_day += timedelta(days=1)
+    if upper is not None:
+        last_day = upper.date()
+
+    edges = []
+    if first_day is not None and last_day is not None and first_day >= last_day:
+        # Shorter than the UTC days it straddles: all from sales
+        first_day = last_day
+        if lower < upper:
+            edges.append((lower, upper))
+    else:
+        if lower is not None and lower < _utc_midnight(first_day):
+            edges.append((lower, _utc_midnight(first_day)))
+        if upper is not None and _utc_midnight(last_day) < upper:
+            edges.append((_utc_midnight(last_day), upper))
+
+    today_local = now.astimezone(zone).date()
+    today = [
+        _local_midnight(today_local, zone),
+        _local_midnight(today_local + timedelta(days=1), zone),
+    ]
+    if lower is not None:
+        today[0] = max(today[0], lower)
+    if upper is not None:
+        today[1] = min(today[1], upper)
+    return {
+        "first_day": first_day,
+        "last_day": last_day,
+        "empty": lower is not None and upper is not None and lower >= upper,
+        "edges": edges,
+        "today": tuple(today) if today[0] < today[1] else None,
+    }
+
+
+def register_analytics_invalidation():
+    """Drop cached analytics when any worker commits a sale"""
+    broker.add_listener(
+        lambda event: _analytics_cache.invalidate(event.get("store_id")), ["sales"]
+    )
 
 
 class SalesService:
-    def __init__(self, sales_repo: SalesRepository):
+    def __init__(
+        self,
+        sales_repo: SalesRepository,
+        pricing: PricingService,
+        reporting: Optional[SalesReportingService] = None,
+        group_commit: bool = SALES_GROUP_COMMIT,
+    ):
+        """
+        :param group_commit: hand checkouts to the shared group committer; it
+            writes to the public schema, so stores with their own schema opt out
+        """
         self.sales_repo = sales_repo
+        self.pricing = pricing
+        self.reporting = reporting
+        self.group_commit = group_commit
 
     def create_sale(self, sale_data: CreateSaleRequest, user: dict) -> SaleResponse:
         user_id = user.get("id")
         if not user_id:
             raise HTTPException(status_code=401, detail="User not found")
 
-        items_json = json.dumps([item.dict() for item in sale_data.items])
-
-        sale_id = self.sales_repo.create_sale(
-            items=items_json,
-            total=sale_data.total,
-            payment_method=sale_data.payment_method.value,
-            user_id=user_id,
-            status=sale_data.status.value,
+        # Prices come from the catalog, not from the terminal
+        priced = self.pricing.price_sale(
+            [item.dict() for item in sale_data.items], sale_data.total
         )
+        items = priced["items"]
+
+        # Cancelled/refunded records don't take goods off the shelf
+        stock_quantities = {}
+        if sale_data.status in (SalesStatus.COMPLETED, SalesStatus.PENDING):
+            for item in sale_data.items:
+                stock_quantities[item.product_id] = (
+                    stock_quantities.get(item.product_id, 0) + item.quantity
+                )
 
-        if not sale_id:
+        sale = {
+            "items": items,
+            "total": priced["total"],
+            "subtotal": priced["subtotal"],
+            "discount_total": priced["discount_total"],
+            "iva_total": priced["iva_total"],
+            "payment_method": sale_data.payment_method.value,
+            "user_id": user_id,
+            "status": sale_data.status.value,
+            "stock_quantities": stock_quantities,
+        }
+        if self.group_commit:
+            row = committer.submit({**sale, "store_id": self.sales_repo.write_store_id})
+        else:
+            row = self.sales_repo.create_sale(**sale)
+
+        if not row:
             raise HTTPException(status_code=500, detail="Failed to create sale")
 
-        sale = self.sales_repo.find_by_id(sale_id)
-        return SaleResponse(**sale)
+        # The inserted row plus the items we already hold: no read-back query
+        return SaleResponse(**{**row, "items": items})
+
+    def create_sales_batch(
+        self, raw_sales: List[dict], user: dict
+    ):
+        """
+        Ingest sales queued by an offline terminal. Each sale is validated on
+        its own so one bad entry does not reject the batch; retried keys are
+        reported as duplicates with the id of the sale already stored.
+        """
+        user_id = user.get("id")
+        if not user_id:
+            raise HTTPException(status_code=401, detail="User not found")
+        if not raw_sales:
+            raise HTTPException(status_code=400, detail="No sales provided")
+        if len(raw_sales) > MAX_BATCH_SALES:
+            raise HTTPException(
+                status_code=400, detail=f"At most {MAX_BATCH_SALES} sales per batch"
+            )
+
+        results = []
+        valid = {}
+        for raw in raw_sales:
+            key = raw.get("idempotency_key") if isinstance(raw, dict) else None
+            try:
+                sale = OfflineSaleRequest(**raw)
+            except (ValidationError, TypeError) as e:
+                results.append(
+                    {"idempotency_key": key, "status": "rejected", "detail": str(e)}
+                )
+                continue
+            result = {"idempotency_key": sale.idempotency_key, "status": None}
+            results.append(result)
+            # The same key twice in one upload is stored once
+            valid.setdefault(
+                sale.idempotency_key,
+                {
+                    "idempotency_key": sale.idempotency_key,
+                    "items": [item.dict() for item in sale.items],
+                    "total": sale.total,
+                    "payment_method": sale.payment_method.value,
+                    "status": sale.status.value,
+                    "created_at": sale.created_at,
+                },
+            )
+
+        outcomes = {}
+        if valid:
+            # Offline sales keep the prices they were sold at; IVA rates come
+            # from the catalog, loaded once for the whole upload
+            catalog = self.pricing.load_catalog(
+                item["product_id"] for sale in valid.values() for item in sale["items"]
+            )
+            for sale in valid.values():
+                sale.update(
+                    self.pricing.price_items(sale["items"], catalog, use_client_prices=True)
+                )
+            outcomes = self.sales_repo.create_sales_batch(
+                list(valid.values()), user_id
+            )
 
-    def history_sales(self):
-        sales = self.sales_repo.list_sales()
-        return [SaleResponse(**sale) for sale in sales]
+        created_keys = set()
+        for result in results:
+            if result["status"] == "rejected":
+                continue
+            sale_id, created = outcomes[result["idempotency_key"]]
+            first_time = created and result["idempotency_key"] not in created_keys
+            created_keys.add(result["idempotency_key"])
+            result["sale_id"] = sale_id
+            result["status"] = "created" if first_time else "duplicate"
+
+        return {
+            "created": sum(1 for r in results if r["status"] == "created"),
+            "duplicates": sum(1 for r in results if r["status"] == "duplicate"),
+            "rejected": sum(1 for r in results if r["status"] == "rejected"),
+            "results": results,
+        }
+
+    def sales_by_product(self, start=None, end=None):
+        rows = self.sales_repo.sales_by_product(start, end)
+        return [
+            {
+                "productId": row["product_id"],
+                "productName": row["product_name"],
+                "units": int(row["units"]),
+                "revenue": float(row["revenue"]),
+                "sales": row["sales"],
+            }
+            for row in rows
+        ]
+
+    def get_stats(self, start=None, end=None, user_id=None):
+        """
+        Totals over the local days [start, end] of the request's zone. Whole
+        UTC days come from the rollup; the hours at either end that only
+        partly overlap a UTC day, and today's figures, come from sales.
+        """
+        ranges = stats_ranges(start, end, get_request_zone(), datetime.now(timezone.utc))
+        rows = [] if ranges["empty"] else self.sales_repo.get_stats(ranges, user_id)
+        total_sales = sum(int(r["sales_count"]) for r in rows)
+        total_revenue = sum(float(r["total"]) for r in rows)
+        stats = {
+            "totalSales": total_sales,
+            "totalRevenue": round(total_revenue, 2),
+            "totalItems": sum(int(r["items_count"]) for r in rows),
+            "averageTicket": round(total_revenue / total_sales, 2) if total_sales else 0,
+            "todaySales": sum(int(r["today_count"] or 0) for r in rows),
+            "todayRevenue": round(sum(float(r["today_total"] or 0) for r in rows), 2),
+        }
+        by_payment_method = [
+            {
+                "paymentMethod": r["payment_method"],
+                "sales": int(r["sales_count"]),
+                "revenue": float(r["total"]),
+            }
+            for r in rows
+        ]
+        return stats, by_payment_method
+
+    def get_analytics(self, bucket: str, start=None, end=None, top: int = 10):
+        """Revenue timeline, top products and payment mix; defaults to the last 30 days"""
+        if bucket not in ANALYTICS_MAX_RANGE:
+            raise HTTPException(status_code=400, detail="Invalid bucket")
+        # Buckets follow the caller's local days; naive bounds are read in that zone
+        tz = get_request_zone_name()
+        # Default end rounded to the minute so repeated dashboard loads share a cache entry
+        end = as_aware(end) or datetime.now(timezone.utc).replace(
+            second=0, microsecond=0
+        ) + timedelta(minutes=1)
+        start = as_aware(start) or end - timedelta(days=30)
+        if start >= end:
+            raise HTTPException(status_code=400, detail="start must be before end")
+        if end - start > ANALYTICS_MAX_RANGE[bucket]:
+            raise HTTPException(
+                status_code=400, detail=f"Range too long for {bucket} buckets"
+            )
+
+        key = (bucket, start, end, top, tz)
+        cache = _analytics_cache.scope(self.sales_repo.store_id)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+        # Parquet snapshots take analytical scans off the OLTP tables when enabled
+        source = (
+            self.reporting
+            if self.reporting and self.reporting.available()
+            else self.sales_repo
+        )
+        timeline, top_products, payment_mix = source.get_analytics(
+            bucket, start, end, top, tz
+        )
+        analytics = {
+            "bucket": bucket,
+            "start": start,
+            "end": end,
+            "timeline": [
+                {
+                    "bucket": row["bucket"],
+                    "sales": row["sales"],
+                    "revenue": float(row["revenue"]),
+                }
+                for row in timeline
+            ],
+            "topProducts": [
+                {
+                    "rank": row["rank"],
+                    "productId": row["product_id"],
+                    "productName": row["product_name"],
+                    "units": int(row["units"]),
+                    "revenue": float(row["revenue"]),
+                }
+                for row in top_products
+            ],
+            "paymentMix": [
+                {
+                    "paymentMethod": row["payment_method"],
+                    "sales": row["sales"],
+                    "revenue": float(row["revenue"]),
+                    "share": round(float(row["share"] or 0), 4),
+                }
+                for row in payment_mix
+            ],
+        }
+        cache.set(key, analytics)
+        return analytics
 
     def get_sale(self, sale_id):
         sale = self.sales_repo.find_by_id(sale_id)
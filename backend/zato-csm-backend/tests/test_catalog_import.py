@@ -0,0 +1,48 @@
+from decimal import Decimal
+
+import pytest
+
+from services.catalog_import_service import MAX_INT, CatalogImportService, RowError
+
+NEW_PRODUCT = {
+    "name": "Café",
+    "description": "Moído",
+    "price": "12.50",
+    "stock": "10",
+    "category": "Bebidas",
+}
+
+
+def _validate(**overrides):
+    return CatalogImportService()._validate_row({**NEW_PRODUCT, **overrides})
+
+
+def test_valid_row_is_converted():
+    row = _validate()
+    assert row["price"] == Decimal("12.50")
+    assert row["stock"] == 10
+
+
+@pytest.mark.parametrize(
+    "overrides, message",
+    [
+        ({"price": "100000000"}, "Price cannot exceed"),
+        ({"stock": str(MAX_INT + 1)}, "Stock cannot exceed"),
+        ({"id": str(MAX_INT + 1)}, "Invalid product ID"),
+        ({"price": "abc"}, "Invalid number"),
+    ],
+)
+def test_out_of_range_values_are_row_errors(overrides, message):
+    with pytest.raises(RowError, match=message):
+        _validate(**overrides)
+
+
+def test_first_unknown_field_is_reported():
+    with pytest.raises(RowError, match="Invalid field: zeta"):
+        _validate(zeta=1, alpha=2)
+
+
+def test_extra_csv_values_are_reported():
+    # csv.DictReader files surplus values under the key None
+    with pytest.raises(RowError, match="Invalid field: None"):
+        CatalogImportService()._validate_row({**NEW_PRODUCT, None: ["x"]})
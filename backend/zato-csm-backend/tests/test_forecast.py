@@ -0,0 +1,65 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from services.forecast_service import MAX_WINDOW_DAYS, ForecastService, _SalesHistory
+
+
+class FakeMovementRepository:
+    """Sale movements as (product_id, created_at, qty); the horizon is set by the test"""
+
+    store_id = None
+
+    def __init__(self):
+        self.movements = []
+        self.horizon = None
+        self.calls = []
+
+    def find_commit_horizon(self):
+        return self.horizon
+
+    def sales_by_day(self, since, after, until):
+        self.calls.append((since, after, until))
+        lower = datetime.combine(since, datetime.min.time(), timezone.utc)
+        if after is not None:
+            lower = max(lower, after)
+        days = {}
+        for product_id, created_at, qty in self.movements:
+            if lower <= created_at < until:
+                key = (product_id, created_at.date())
+                days[key] = days.get(key, 0) + qty
+        return [{"product_id": p, "day": d, "qty": q} for (p, d), q in days.items()]
+
+
+def test_refresh_counts_movements_committed_after_a_refresh():
+    repo = FakeMovementRepository()
+    history = _SalesHistory()
+    start = date.today() - timedelta(days=6)
+    now = datetime.now(timezone.utc)
+
+    repo.movements.append((1, now - timedelta(minutes=5), 2))
+    # A checkout that started 90s ago is still open: the horizon stops there
+    repo.horizon = now - timedelta(seconds=90)
+    assert history.refresh(repo, start)
+    assert repo.calls[-1][1] is None
+    assert history.daily["qty"].sum() == 2
+
+    # It commits with its transaction-start stamp, older than newer movements
+    repo.movements.append((1, now - timedelta(seconds=90), 3))
+    repo.horizon = now
+    assert history.refresh(repo, start)
+    assert repo.calls[-1][1] == now - timedelta(seconds=90)
+    assert history.daily["qty"].sum() == 5
+
+    # Nothing new: the range already read is not counted twice
+    repo.horizon = now + timedelta(seconds=1)
+    assert not history.refresh(repo, start)
+    assert history.daily["qty"].sum() == 5
+
+
+def test_window_is_capped_at_the_movement_retention():
+    service = ForecastService(FakeMovementRepository(), inventory_repo=None)
+    with pytest.raises(HTTPException) as exc:
+        service.get_forecast(window_days=MAX_WINDOW_DAYS + 1)
+    assert exc.value.status_code == 400
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pydantic import ValidationError
+
+from config.settings import OFFLINE_SALE_MAX_CLOCK_SKEW_SECONDS
+from models.sales import OfflineSaleRequest
+
+
+def _sale(**overrides):
+    sale = {
+        "idempotency_key": "terminal-1:42",
+        "items": [{"product_id": 1, "quantity": 2, "price": 5.0}],
+        "total": 10.0,
+        "payment_method": "cash",
+    }
+    sale.update(overrides)
+    return sale
+
+
+def test_created_at_within_skew_is_accepted():
+    now = datetime.now(timezone.utc)
+    sale = OfflineSaleRequest(**_sale(created_at=now + timedelta(seconds=10)))
+    assert sale.created_at.tzinfo is not None
+
+
+def test_created_at_past_is_accepted():
+    past = datetime.now(timezone.utc) - timedelta(days=3)
+    assert OfflineSaleRequest(**_sale(created_at=past)).created_at == past
+
+
+def test_created_at_beyond_skew_is_rejected():
+    ahead = datetime.now(timezone.utc) + timedelta(
+        seconds=OFFLINE_SALE_MAX_CLOCK_SKEW_SECONDS + 60
+    )
+    with pytest.raises(ValidationError, match="ahead of the server clock"):
+        OfflineSaleRequest(**_sale(created_at=ahead))
+
+
+def test_naive_created_at_is_read_as_request_zone():
+    naive = datetime(2024, 5, 1, 12, 30)
+    sale = OfflineSaleRequest(**_sale(created_at=naive))
+    assert sale.created_at == naive.replace(tzinfo=timezone.utc)
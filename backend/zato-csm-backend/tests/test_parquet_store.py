@@ -0,0 +1,102 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pyarrow.parquet as pq
+
+from services.sales_reporting_service import ParquetSalesStore, _to_table
+
+
+def _sale(sale_id, store_id, created_at, status="completed"):
+    return {
+        "id": sale_id,
+        "store_id": store_id,
+        "total": 10.0,
+        "payment_method": "cash",
+        "user_id": 1,
+        "status": status,
+        "created_at": created_at,
+        "subtotal": 10.0,
+        "discount_total": 0.0,
+        "iva_total": 0.0,
+        "items": [],
+    }
+
+
+def _store(tmp_path):
+    store = ParquetSalesStore(str(tmp_path))
+    march = datetime(2025, 3, 10, tzinfo=timezone.utc)
+    april = datetime(2025, 4, 2, tzinfo=timezone.utc)
+    files = {
+        "month=2025-03/part-a.parquet": [_sale(i, 1 + i % 2, march) for i in range(1, 101)],
+        "month=2025-04/part-a.parquet": [_sale(i, 1, april) for i in range(101, 111)],
+    }
+    for relative, rows in files.items():
+        path = os.path.join(store.root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(_to_table(rows), path)
+    watermark = datetime(2025, 4, 3, tzinfo=timezone.utc)
+    store._write_manifest({"watermark": watermark.isoformat(), "files": list(files)})
+    return store
+
+
+def test_scan_batches_streams_filtered_batches(tmp_path):
+    store = _store(tmp_path)
+    batches, watermark = store.scan_batches(store_id=1, batch_size=16)
+    sizes = [batch.num_rows for batch in batches]
+    assert watermark == datetime(2025, 4, 3, tzinfo=timezone.utc)
+    assert max(sizes) <= 16
+    assert sum(sizes) == 60
+
+
+def test_scan_batches_matches_scan(tmp_path):
+    store = _store(tmp_path)
+    start = datetime(2025, 4, 1, tzinfo=timezone.utc)
+    table, _ = store.scan(start=start, store_id=1)
+    batches, _ = store.scan_batches(start=start, store_id=1)
+    ids = [sale_id for batch in batches for sale_id in batch.column("id").to_pylist()]
+    assert sorted(ids) == sorted(table.column("id").to_pylist()) == list(range(101, 111))
+
+
+def test_scan_batches_before_first_export(tmp_path):
+    assert ParquetSalesStore(str(tmp_path)).scan_batches() == (None, None)
+
+
+class _RecordedSales:
+    """iter_recorded over in-memory rows; only committed rows are visible"""
+
+    def __init__(self):
+        self.rows = []
+        self.now = None
+        self.open_since = None
+
+    def find_commit_horizon(self):
+        return min(self.now, self.open_since) if self.open_since else self.now
+
+    def recorded_cutoff(self, lag_seconds):
+        return self.now - timedelta(seconds=lag_seconds)
+
+    def iter_recorded(self, after=None, until=None):
+        for row, recorded_at, committed in self.rows:
+            if committed and (after is None or recorded_at > after) and recorded_at <= until:
+                yield row
+
+
+def test_export_waits_for_rows_committed_after_the_lag(tmp_path):
+    store = ParquetSalesStore(str(tmp_path))
+    repo = _RecordedSales()
+    t0 = datetime(2025, 3, 10, 12, tzinfo=timezone.utc)
+    repo.rows.append((_sale(1, 1, t0), t0, True))
+    # A batch that started at t0 + 1s inserted sale 2 and is still running
+    # two minutes later, well past the lag
+    late = (_sale(2, 1, t0), t0 + timedelta(seconds=2), False)
+    repo.rows.append(late)
+    repo.open_since = t0 + timedelta(seconds=1)
+    repo.now = t0 + timedelta(minutes=2)
+    assert store.export_increment(repo) == 1
+
+    repo.rows[1] = late[:2] + (True,)
+    repo.open_since = None
+    repo.now = t0 + timedelta(minutes=3)
+    assert store.export_increment(repo) == 1
+    batches, _ = store.scan_batches()
+    assert sorted(i for b in batches for i in b.column("id").to_pylist()) == [1, 2]
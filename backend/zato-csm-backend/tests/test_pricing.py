@@ -0,0 +1,96 @@
+from decimal import Decimal
+
+import pytest
+from fastapi import HTTPException
+
+from config.settings import DEFAULT_IVA_RATE, IVA_RATES
+from services.pricing_service import PricingService
+from services.product_service import ProductService
+
+
+class FakeProductRepository:
+    """Catalog held in memory; only what PricingService reads"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def find_pricing(self, product_ids):
+        return {pid: self.catalog[pid] for pid in product_ids if pid in self.catalog}
+
+
+CATALOG = {
+    1: {"price": Decimal("1.15"), "iva_rate": Decimal(15)},
+    2: {"price": Decimal("10.00"), "iva_rate": Decimal(0)},
+}
+
+
+def _pricing():
+    return PricingService(FakeProductRepository(CATALOG))
+
+
+def test_price_items_splits_base_and_iva():
+    pricing = _pricing()
+    items = [
+        {"product_id": 1, "quantity": 2, "price": 9.99},
+        {"product_id": 2, "quantity": 1, "price": 10, "discount": 1},
+    ]
+    priced = pricing.price_items(items, pricing.load_catalog([1, 2]))
+
+    first, second = priced["items"]
+    # Catalog price wins over the terminal's
+    assert first["price"] == Decimal("1.15")
+    assert first["line_total"] == Decimal("2.30")
+    assert first["iva_amount"] == Decimal("0.30")
+    assert second["line_total"] == Decimal("9.00")
+    assert second["iva_amount"] == Decimal("0")
+    assert priced["total"] == Decimal("11.30")
+    assert priced["subtotal"] == Decimal("11.00")
+    assert priced["iva_total"] == Decimal("0.30")
+    assert priced["discount_total"] == Decimal("1.00")
+
+
+def test_price_items_rejects_discount_above_line():
+    pricing = _pricing()
+    items = [{"product_id": 1, "quantity": 1, "price": 1.15, "discount": 2}]
+    with pytest.raises(HTTPException) as e:
+        pricing.price_items(items, pricing.load_catalog([1]))
+    assert e.value.status_code == 400
+
+
+def test_price_items_unknown_product():
+    pricing = _pricing()
+    items = [{"product_id": 99, "quantity": 1, "price": 5}]
+    with pytest.raises(HTTPException) as e:
+        pricing.price_items(items, {})
+    assert e.value.status_code == 404
+
+    # Offline sales keep their price and fall back to the default rate
+    priced = pricing.price_items(items, {}, use_client_prices=True)
+    assert priced["items"][0]["price"] == Decimal("5.00")
+    assert priced["items"][0]["iva_rate"] == Decimal(DEFAULT_IVA_RATE)
+
+
+def test_price_sale_checks_client_total():
+    pricing = _pricing()
+    items = [{"product_id": 1, "quantity": 2, "price": 1.15}]
+    assert pricing.price_sale(items, 2.30)["total"] == Decimal("2.30")
+    assert pricing.price_sale(items, 2.31)["total"] == Decimal("2.30")
+    with pytest.raises(HTTPException) as e:
+        pricing.price_sale(items, 2.00)
+    assert e.value.status_code == 409
+
+
+def test_validate_updates_accepts_known_iva_rates():
+    service = ProductService(product_repo=None)
+    for rate in IVA_RATES:
+        service._validate_updates({"iva_rate": rate, "price": 1})
+
+
+@pytest.mark.parametrize(
+    "updates",
+    [{"iva_rate": 7}, {"price": 0}, {"stock": -1}, {"owner": "x"}],
+)
+def test_validate_updates_rejects(updates):
+    with pytest.raises(HTTPException) as e:
+        ProductService(product_repo=None)._validate_updates(updates)
+    assert e.value.status_code == 400
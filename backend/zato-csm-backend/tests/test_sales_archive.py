@@ -0,0 +1,56 @@
+import gzip
+import os
+
+import pytest
+
+from services import sales_archive_service
+from services.sales_archive_service import archive_partition
+
+
+class _Partitions:
+    def __init__(self, archive_dir, fail_export=False):
+        self.archive_dir = archive_dir
+        self.fail_export = fail_export
+        self.calls = []
+        self.locked = False
+
+    def try_advisory_lock(self, name):
+        self.locked = True
+        return True
+
+    def advisory_unlock(self, name):
+        self.locked = False
+
+    def export_partition(self, name, sales_file, items_file, attached):
+        self.calls.append("export")
+        sales_file.write(b"id,total\n1,10.00\n")
+        if self.fail_export:
+            raise RuntimeError("disk full")
+        items_file.write(b"sale_id,line_no\n1,1\n")
+
+    def drop_partition(self, name):
+        # By now the archive must be complete under its final name
+        with gzip.open(os.path.join(self.archive_dir, f"{name}.csv.gz")) as f:
+            assert f.read() == b"id,total\n1,10.00\n"
+        with gzip.open(os.path.join(self.archive_dir, f"{name}_items.csv.gz")) as f:
+            assert f.read() == b"sale_id,line_no\n1,1\n"
+        self.calls.append("drop")
+
+
+def test_partition_dropped_after_archive_is_in_place(tmp_path, monkeypatch):
+    monkeypatch.setattr(sales_archive_service, "SALES_ARCHIVE_DIR", str(tmp_path))
+    repo = _Partitions(str(tmp_path))
+    assert archive_partition(repo, "sales_2024_01")
+    assert repo.calls == ["export", "drop"]
+    assert not repo.locked
+    assert sorted(os.listdir(tmp_path)) == ["sales_2024_01.csv.gz", "sales_2024_01_items.csv.gz"]
+
+
+def test_failed_export_keeps_partition(tmp_path, monkeypatch):
+    monkeypatch.setattr(sales_archive_service, "SALES_ARCHIVE_DIR", str(tmp_path))
+    repo = _Partitions(str(tmp_path), fail_export=True)
+    with pytest.raises(RuntimeError):
+        archive_partition(repo, "sales_2024_01")
+    assert repo.calls == ["export"]
+    assert not repo.locked
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,47 @@
+from datetime import date, datetime, timezone
+from zoneinfo import ZoneInfo
+
+from services.sales_service import stats_ranges
+
+GUAYAQUIL = ZoneInfo("America/Guayaquil")  # UTC-5, no DST
+NOW = datetime(2025, 3, 10, 15, 0, tzinfo=timezone.utc)
+
+
+def _utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_utc_days_come_from_the_rollup_only():
+    ranges = stats_ranges(date(2025, 3, 1), date(2025, 3, 10), timezone.utc, NOW)
+    assert (ranges["first_day"], ranges["last_day"]) == (date(2025, 3, 1), date(2025, 3, 11))
+    assert ranges["edges"] == []
+    assert ranges["today"] == (_utc(2025, 3, 10), _utc(2025, 3, 11))
+
+
+def test_local_days_split_into_whole_utc_days_and_edges():
+    ranges = stats_ranges(date(2025, 3, 1), date(2025, 3, 10), GUAYAQUIL, NOW)
+    # Local 1 March 00:00 is 05:00 UTC; local 11 March 00:00 is 05:00 UTC
+    assert (ranges["first_day"], ranges["last_day"]) == (date(2025, 3, 2), date(2025, 3, 11))
+    assert ranges["edges"] == [
+        (_utc(2025, 3, 1, 5), _utc(2025, 3, 2)),
+        (_utc(2025, 3, 11), _utc(2025, 3, 11, 5)),
+    ]
+    assert ranges["today"] == (_utc(2025, 3, 10, 5), _utc(2025, 3, 11, 5))
+
+
+def test_single_local_day_is_read_from_sales():
+    ranges = stats_ranges(date(2025, 3, 10), date(2025, 3, 10), GUAYAQUIL, NOW)
+    assert ranges["first_day"] == ranges["last_day"]
+    assert ranges["edges"] == [(_utc(2025, 3, 10, 5), _utc(2025, 3, 11, 5))]
+
+
+def test_unbounded_range_and_today_outside_it():
+    ranges = stats_ranges(None, date(2025, 3, 5), GUAYAQUIL, NOW)
+    assert ranges["first_day"] is None and ranges["last_day"] == date(2025, 3, 6)
+    assert ranges["edges"] == [(_utc(2025, 3, 6), _utc(2025, 3, 6, 5))]
+    assert ranges["today"] is None
+    assert not ranges["empty"]
+
+
+def test_reversed_range_is_empty():
+    assert stats_ranges(date(2025, 3, 5), date(2025, 3, 1), GUAYAQUIL, NOW)["empty"]
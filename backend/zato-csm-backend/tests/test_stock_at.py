@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from services.inventory_service import InventoryService
+
+COMPACTED = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+class _Products:
+    def find_by_id(self, product_id):
+        return {"id": product_id}
+
+
+class _Movements:
+    def __init__(self, history_from):
+        self.history_from = history_from
+
+    def stock_at(self, product_id, at):
+        return {
+            "stock": 0,
+            "snapshot_movement_id": None,
+            "deltas": 0,
+            "history_from": self.history_from,
+        }
+
+
+def _service(history_from):
+    return InventoryService(_Products(), None, _Movements(history_from))
+
+
+def test_stock_before_compacted_history_is_gone():
+    with pytest.raises(HTTPException) as error:
+        _service(COMPACTED).get_stock_at(1, datetime(2024, 12, 31, tzinfo=timezone.utc))
+    assert error.value.status_code == 410
+
+
+def test_stock_after_compaction_point_is_answered():
+    result = _service(COMPACTED).get_stock_at(1, datetime(2025, 2, 1, tzinfo=timezone.utc))
+    assert result["quantity"] == 0
+    assert _service(None).get_stock_at(1, datetime(2000, 1, 1, tzinfo=timezone.utc))
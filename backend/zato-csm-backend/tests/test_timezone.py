@@ -0,0 +1,76 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, FastAPI
+
+from utils.timezone_utils import LocalTimeRoute, TimezoneMiddleware
+
+STAMP = datetime(2025, 1, 1, 3, 0, tzinfo=timezone.utc)
+
+
+def _app():
+    router = APIRouter(route_class=LocalTimeRoute)
+
+    @router.get("/rows")
+    def rows(limit: int = 2):
+        return {"rows": [{"id": i, "created_at": STAMP} for i in range(limit)]}
+
+    @router.get("/row")
+    async def row():
+        return {"created_at": STAMP, "naive": datetime(2025, 1, 1)}
+
+    plain = APIRouter()
+
+    @plain.get("/plain")
+    def untouched():
+        return {"created_at": STAMP}
+
+    app = FastAPI()
+    app.add_middleware(TimezoneMiddleware)
+    app.include_router(router)
+    app.include_router(plain)
+    return app
+
+
+def _get(app, path, query=b"", zone=b"America/Guayaquil"):
+    """Minimal ASGI round trip (no HTTP client needed)"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query,
+        "headers": [(b"x-timezone", zone)],
+        "client": ("test", 1),
+        "server": ("test", 80),
+    }
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    asyncio.run(app(scope, receive, send))
+    return json.loads(b"".join(body))
+
+
+def test_list_payload_in_request_zone():
+    payload = _get(_app(), "/rows", b"limit=3")
+    assert [r["created_at"] for r in payload["rows"]] == ["2024-12-31T22:00:00-05:00"] * 3
+
+
+def test_async_route_keeps_naive_values():
+    payload = _get(_app(), "/row")
+    assert payload == {"created_at": "2024-12-31T22:00:00-05:00", "naive": "2025-01-01T00:00:00"}
+
+
+def test_other_routes_keep_default_encoding():
+    assert _get(_app(), "/plain") == {"created_at": "2025-01-01T03:00:00+00:00"}
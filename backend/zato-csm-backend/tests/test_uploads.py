@@ -0,0 +1,56 @@
+import asyncio
+import io
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from services import product_service
+from services.product_service import ProductService
+from utils.static_files import UploadStaticFiles
+
+
+class _Upload:
+    def __init__(self, filename, data=b"\x89PNG", fail=False):
+        self.filename = filename
+        self.file = io.BytesIO(data)
+        if fail:
+            self.file.read = self._fail
+
+    def _fail(self, size):
+        raise OSError("client went away")
+
+
+def _files(tmp_path):
+    return os.listdir(tmp_path / "products")
+
+
+def test_images_stored_by_content_hash(tmp_path, monkeypatch):
+    monkeypatch.setattr(product_service, "UPLOAD_DIR", str(tmp_path))
+    paths = ProductService(None)._process_images([_Upload("photo.PNG")])
+    assert paths[0].startswith("/uploads/products/product-") and paths[0].endswith(".png")
+    assert _files(tmp_path) == [os.path.basename(paths[0])]
+
+
+@pytest.mark.parametrize("filename", ["page.html", "logo.svg", "noext", None])
+def test_non_images_rejected(tmp_path, monkeypatch, filename):
+    monkeypatch.setattr(product_service, "UPLOAD_DIR", str(tmp_path))
+    with pytest.raises(HTTPException) as error:
+        ProductService(None)._process_images([_Upload("ok.jpg"), _Upload(filename)])
+    assert error.value.status_code == 400
+    assert not os.path.exists(tmp_path / "products")
+
+
+def test_failed_upload_leaves_no_temp_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(product_service, "UPLOAD_DIR", str(tmp_path))
+    with pytest.raises(OSError):
+        ProductService(None)._process_images([_Upload("photo.jpg", fail=True)])
+    assert _files(tmp_path) == []
+
+
+def test_mount_serves_only_images(tmp_path):
+    (tmp_path / "page.html").write_text("<script>alert(1)</script>")
+    mount = UploadStaticFiles(directory=str(tmp_path))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(mount.get_response("page.html", {"method": "GET", "headers": []}))
+    assert error.value.status_code == 404
@@ -0,0 +1,18 @@
+import threading
+import time
+
+
+def start_periodic(name: str, interval_seconds: float, task):
+    """Run `task()` every `interval_seconds` on a daemon thread, logging failures"""
+
+    def run():
+        while True:
+            try:
+                task()
+            except Exception as e:
+                print(f"{name} error: {e}")
+            time.sleep(interval_seconds)
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,68 @@
+import threading
+import time
+
+
+class TTLCache:
+    """
+    Small thread-safe in-process cache.
+
+    Entries expire after `ttl` seconds as a safety net; callers are expected
+    to invalidate explicitly on writes (and via EventBroker listeners for
+    writes made by other workers).
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+
+class ScopedCache:
+    """
+    One TTLCache per store: a write in one store only drops that store's
+    entries, and a busy store never evicts another one's.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def scope(self, store_id) -> TTLCache:
+        with self._lock:
+            cache = self._caches.get(store_id)
+            if cache is None:
+                cache = self._caches[store_id] = TTLCache(self.ttl)
+            return cache
+
+    def invalidate(self, store_id=None):
+        """Drop one store's entries; None (a write not tied to a store) drops all"""
+        with self._lock:
+            if store_id is None:
+                caches = list(self._caches.values())
+            else:
+                caches = [self._caches[store_id]] if store_id in self._caches else []
+        for cache in caches:
+            cache.invalidate()
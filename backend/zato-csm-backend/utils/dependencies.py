@@ -1,8 +1,14 @@
 from fastapi import HTTPException, Depends, Request
-from config.database import get_db_connection
+from config.database import connect_postgres, get_db_connection, use_store_schema
+from repositories.base_repository import DEFAULT_STORE_ID
+from repositories.store_repositories import StoreRepository
 from repositories.user_repositories import UserRepository
 import jwt
 from config.settings import SECRET_KEY, ALGORITHM
+from utils.cache import TTLCache
+
+# Stores rarely change; spares a lookup per request
+_store_cache = TTLCache(ttl=60)
 
 
 def verify_token(token: str):
@@ -15,7 +21,7 @@ def verify_token(token: str):
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
-def get_current_user(request: Request, db=Depends(get_db_connection)):
+def _load_user(request: Request, db):
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing token")
@@ -23,7 +29,6 @@ def get_current_user(request: Request, db=Depends(get_db_connection)):
     payload = verify_token(token)
     user_id = payload.get("user_id")
 
-    # Use the provided PostgreSQL connection
     user_repo = UserRepository(db)
     user = user_repo.find_by_user_id(user_id)
 
@@ -32,6 +37,50 @@ def get_current_user(request: Request, db=Depends(get_db_connection)):
     return user
 
 
+def _load_store(user: dict, db) -> dict:
+    store_id = user.get("store_id") or DEFAULT_STORE_ID
+    store = _store_cache.get(store_id)
+    if store is None:
+        store = StoreRepository(db).find_by_id(store_id)
+        if not store:
+            raise HTTPException(status_code=403, detail="Store not found")
+        store = dict(store)
+        _store_cache.set(store_id, store)
+    return store
+
+
+def get_current_user(request: Request, db=Depends(get_db_connection)):
+    # Use the provided PostgreSQL connection
+    return _load_user(request, db)
+
+
+def get_current_store(user=Depends(get_current_user), db=Depends(get_db_connection)):
+    """
+    Store of the signed-in user. For stores kept in their own schema, the
+    request's connection is switched to that schema before any repository
+    uses it.
+    """
+    store = _load_store(user, db)
+    if store["schema_name"]:
+        use_store_schema(db, store["schema_name"])
+    return store
+
+
+def get_streaming_store(request: Request):
+    """
+    Store of the signed-in user, for routes that stream their body. FastAPI
+    closes yield dependencies such as get_db_connection only once the body
+    has been sent, so the user and store are looked up on a connection of
+    their own, closed before the route runs. The stream opens its own
+    connection if it needs one.
+    """
+    conn = connect_postgres()
+    try:
+        return _load_store(_load_user(request, conn), conn)
+    finally:
+        conn.close()
+
+
 def get_current_token(request: Request) -> str:
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
@@ -0,0 +1,125 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from config.database import connect_postgres
+from utils.timezone_utils import to_request_timezone
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# Flush to the client roughly every 64KB instead of once per row
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def json_default(value):
+    """json.dumps fallback matching how FastAPI encodes DB values"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return to_request_timezone(value).isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def _encode_rows(rows, fmt: str):
+    buffer = io.StringIO()
+    writer = None
+    for row in rows:
+        if fmt == "csv":
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(row.keys()))
+                writer.writeheader()
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row, default=json_default))
+            buffer.write("\n")
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(iter_rows, filename: str, fmt: str = "csv", compress: bool = False):
+    """
+    Build a chunked StreamingResponse for a large table export.
+
+    :param iter_rows: callable receiving a fresh connection and returning an
+        iterator of dict rows (normally a repository method using a named cursor)
+    :param filename: download name without extension
+    :param fmt: "csv" or "ndjson"
+    :param compress: gzip the stream and serve it as a .gz attachment
+
+    FastAPI keeps yield dependencies (get_db_connection) open until the body
+    has been sent, so streaming routes resolve their store with
+    get_streaming_store and the generator opens and closes the only
+    connection used while streaming.
+    """
+    fmt = fmt.lower()
+    if fmt not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {fmt}")
+
+    def generate():
+        conn = connect_postgres()
+        try:
+            chunks = _encode_rows(iter_rows(conn), fmt)
+            yield from _gzip_chunks(chunks) if compress else chunks
+        finally:
+            conn.close()
+
+    filename = f"{filename}.{fmt}"
+    media_type = EXPORT_MEDIA_TYPES[fmt]
+    if compress:
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def json_page_response(iter_rows, key: str, limit: int, make_cursor):
+    """
+    Stream one keyset page as {"success": true, key: [...], "nextCursor": ...}.
+
+    :param iter_rows: callable receiving a fresh connection and returning up
+        to limit + 1 rows; the extra row only signals that another page exists
+    :param make_cursor: builds the next-page cursor from the last row sent
+    """
+
+    def generate():
+        conn = connect_postgres()
+        try:
+            yield f'{{"success": true, "{key}": ['.encode("utf-8")
+            last = None
+            next_cursor = None
+            for count, row in enumerate(iter_rows(conn)):
+                if count == limit:
+                    next_cursor = make_cursor(last)
+                    break
+                prefix = "," if count else ""
+                yield (prefix + json.dumps(row, default=json_default)).encode("utf-8")
+                last = row
+            yield f'], "nextCursor": {json.dumps(next_cursor)}}}'.encode("utf-8")
+        finally:
+            conn.close()
+
+    return StreamingResponse(generate(), media_type="application/json")
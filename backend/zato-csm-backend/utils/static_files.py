@@ -0,0 +1,42 @@
+import os
+import re
+
+from fastapi import HTTPException
+from fastapi.staticfiles import StaticFiles
+
+# The only uploads served; anything a browser would run (.html, .svg, ...)
+# must not come from the API origin
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+
+# Files named "<prefix>-<sha256 prefix>.<ext>" never change once written,
+# so clients can keep them forever. Anything else must be revalidated.
+HASHED_FILENAME_RE = re.compile(r"^[\w-]+-[0-9a-f]{16,64}\.\w+$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+
+class UploadStaticFiles(StaticFiles):
+    """
+    StaticFiles mount for user uploads.
+
+    Starlette's FileResponse already streams from disk (using the ASGI
+    pathsend/zerocopysend extension when the server offers it), answers
+    If-None-Match/If-Modified-Since with 304 and serves Range requests.
+    This only adds Cache-Control depending on whether the name is
+    content-hashed, and refuses anything but images.
+    """
+
+    async def get_response(self, path, scope):
+        if os.path.splitext(path)[1].lower() not in IMAGE_EXTENSIONS:
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if HASHED_FILENAME_RE.match(os.path.basename(full_path)):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        return response